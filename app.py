@@ -1,23 +1,77 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
+from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-import json, os, re
-from datetime import datetime
+import base64, contextvars, json, os, re, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 # Updated import: added update_time_fields for updating time spent and time remaining
 from azure_devops import *
-from openai_utils import get_response, parse_task_suggestion, analyze_user_intent
+from openai_utils import get_response, stream_response
+from prompts import PROMPT_HISTORY_MESSAGES
+from intent_classifier import classify_intent
+from devops_client import is_throttled_error, is_transient_error
+from job_queue import JobQueue
+from response_cache import cache_key, error_signature, is_error_reply, response_cache, response_flights, task_snapshot
+from flow_control import Abandoned, UpstreamBusy
+from digests import DIGEST_MIN_INTERVAL, DigestScheduler, Pacer, describe_age
+from work_item import WorkItem
+import telemetry
 from dotenv import load_dotenv
-from sqlalchemy import inspect
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///users.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connection pool per worker process
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+}
+# SQLite pragmas: with WAL, readers no longer block on a writer (several worker processes share
+# users.db); writers wait up to the busy timeout for the write lock instead of failing
+app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'wal')
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'normal')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '10000'))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))
+app.config['HISTORY_PAGE_SIZE'] = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+# Task listings are sent this many items at a time; later pages come from /listing
+app.config['LISTING_PAGE_SIZE'] = int(os.getenv('LISTING_PAGE_SIZE', '50'))
+# Backlog queries: "high priority" horizon in days, and which states count as closed / completed
+app.config['PRIORITY_DUE_DAYS'] = int(os.getenv('PRIORITY_DUE_DAYS', '3'))
+app.config['CLOSED_STATES'] = [s.strip().lower() for s in
+                                os.getenv('CLOSED_STATES', 'closed,done,removed,resolved').split(',') if s.strip()]
+app.config['COMPLETED_STATES'] = [s.strip().lower() for s in
+                                   os.getenv('COMPLETED_STATES', 'done,removed').split(',') if s.strip()]
+# Most work items one bulk chat command may change
+app.config['BULK_UPDATE_MAX_ITEMS'] = int(os.getenv('BULK_UPDATE_MAX_ITEMS', '50'))
+# Azure DevOps writes run on the background job queue unless BACKGROUND_WRITES=0
+app.config['BACKGROUND_WRITES'] = os.getenv('BACKGROUND_WRITES', '1') != '0'
+app.config['JOB_QUEUE_DB'] = os.getenv('JOB_QUEUE_DB') or os.path.join(app.instance_path, 'jobs.db')
+# Priority digests (see digests.py): older ones are not shown; DIGEST_AI_SUMMARY=0 leaves out the GPT summary
+app.config['DIGEST_MAX_AGE'] = float(os.getenv('DIGEST_MAX_AGE', '7200'))
+app.config['DIGEST_AI_SUMMARY'] = os.getenv('DIGEST_AI_SUMMARY', '1') != '0'
 
-db = SQLAlchemy(app)
+# Rows stay loaded after commit(), so replies don't re-read the messages they just saved
+db = SQLAlchemy(app, session_options={"expire_on_commit": False})
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KB']}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
@@ -28,6 +82,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     azure_devops_email = db.Column(db.String(120))
+    # Legacy JSON history; moved into ChatMessage rows by migrate_chat_history()
     chat_history = db.Column(db.Text, default='[]')
 
     def set_password(self, password):
@@ -45,66 +100,254 @@ class User(UserMixin, db.Model):
     def chat_history_list(self, value):
         self.chat_history = json.dumps(value)
 
+# --- Chat Message Model ---
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(10), nullable=False)  # "user" or "bot"
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # History is always read per user, newest first, paging on id
+    __table_args__ = (db.Index('ix_chat_message_user_id_id', 'user_id', 'id'),)
+
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "text": self.text}
+
+# --- Priority Digest Model ---
+class PriorityDigest(db.Model):
+    """A user's precomputed high-priority tasks and summary (user_id NULL: the whole team's); see refresh_digests()."""
+    id = db.Column(db.Integer, primary_key=True)
+    # digest_key(user_id): unique also for the team's digest, whose user_id is NULL
+    key = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    tasks = db.Column(db.Text, nullable=False)  # JSON WorkItem rows of the listing's first page, earliest due first
+    total = db.Column(db.Integer, nullable=False)  # high-priority tasks
+    overdue = db.Column(db.Integer, nullable=False)
+    pending = db.Column(db.Integer, nullable=False)
+    summary = db.Column(db.Text)
+    summary_key = db.Column(db.String(64))  # response_cache key of the summarized tasks
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set by the user's writes and profile changes: not shown until rebuilt
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+
+def add_chat_message(user_id, type, text):
+    """Appends one message to a user's history (committed with the session)."""
+    message = ChatMessage(user_id=user_id, type=type, text=text)
+    db.session.add(message)
+    return message
+
+def chat_history_page(user_id, before=None, limit=None):
+    """
+    Returns (messages oldest-first, cursor) for the `limit` messages older than
+    the id `before` (newest page when None). cursor is the id to pass as
+    `before` for the next older page, or None when there is nothing older.
+    """
+    limit = limit or app.config['HISTORY_PAGE_SIZE']
+    query = ChatMessage.query.filter_by(user_id=user_id)
+    if before:
+        query = query.filter(ChatMessage.id < before)
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    page = rows[:limit][::-1]
+    return page, (page[0].id if len(rows) > limit else None)
+
+def conversation_context(user_id, message):
+    """
+    The user's recent chat history followed by message, as OpenAI messages.
+    get_response / stream_response trim it to the prompt token budget.
+    """
+    rows, _ = chat_history_page(user_id, limit=PROMPT_HISTORY_MESSAGES)
+    history = [{"role": "user" if row.type == "user" else "assistant",
+                "content": re.sub(r"<[^>]+>", "", re.sub(r"<br\s*/?>", "\n", row.text))} for row in rows]
+    # chat() stores the message before answering it
+    if history and history[-1] == {"role": "user", "content": message}:
+        history.pop()
+    return history + [{"role": "user", "content": message}]
+
+def migrate_chat_history():
+    """One-time move of the legacy User.chat_history JSON blobs into ChatMessage rows."""
+    users = User.query.filter(User.chat_history.isnot(None), User.chat_history != '[]').all()
+    for user in users:
+        db.session.bulk_insert_mappings(ChatMessage, [
+            {"user_id": user.id, "type": message.get("type", "bot"), "text": message.get("text", "")}
+            for message in user.chat_history_list
+        ])
+        user.chat_history = '[]'
+    db.session.commit()
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 # --- Helper Functions ---
-def format_tasks(tasks):
-    """Formats work items to an HTML list."""
-    lines = []
-    for task in tasks:
-        fields = task.get("fields", {})
-        title = fields.get("System.Title", "No Title")
-        state = fields.get("System.State", "Unknown")
-        due = fields.get("Microsoft.VSTS.Scheduling.DueDate", "No date")
-        lines.append(f"{title} (State: {state}, Due: {due})")
-    return "<br>".join(lines)
+def task_line(task):
+    """A WorkItem as "Title (State: ..., Due: ...)"."""
+    due = task.due_date.isoformat() if task.due is not None else "No date"
+    return f"{task.title or 'No Title'} (State: {task.state or 'Unknown'}, Due: {due})"
+
+def task_item(task):
+    """One work item of a listing page."""
+    return {"id": task.id, "title": task.title or "No Title", "state": task.state or "Unknown",
+            "due": task.due_date.isoformat() if task.due is not None else None, "text": task_line(task)}
 
-def analyze_high_priority_tasks(tasks, user_email=None):
+def priority_item(entry):
+    """A (task, days remaining) pair from analyze_high_priority_tasks as a listing item."""
+    task, dr = entry
+    item = task_item(task)
+    status = (
+        f"{abs(dr)} days overdue" if dr < 0 else
+        "due today" if dr == 0 else
+        "due tomorrow" if dr == 1 else
+        f"due in {dr} days"
+    )
+    item.update(days_remaining=dr, text=f"{item['title']} ({status})")
+    return item
+
+def analyze_high_priority_tasks(backlog, user_email=None):
     """
-    Returns tasks that are high priority:
+    Returns [(task, days_remaining)] for high-priority tasks, earliest due first:
       - Either tasks that are overdue (days_remaining < 0)
-      - Or tasks with deadlines within 3 days (threshold adjustable)
+      - Or tasks with deadlines within PRIORITY_DUE_DAYS days
     If user_email is provided, only tasks assigned to that email are returned.
+    backlog is the cached BacklogView or, while the cache is cold, a
+    WiqlBacklog that has Azure DevOps do the filtering.
     """
-    high_priority = []
-    today = datetime.now().date()
-    for task in tasks:
-        fields = task.get("fields", {})
-        due_date_str = fields.get("Microsoft.VSTS.Scheduling.DueDate")
-        days_remaining = None
-        if due_date_str:
-            try:
-                due_date = datetime.strptime(due_date_str, "%Y-%m-%dT00:00:00Z").date()
-                days_remaining = (due_date - today).days
-            except Exception:
-                pass
-        if days_remaining is not None and (days_remaining < 0 or days_remaining <= 3):
-            task["days_remaining"] = days_remaining
-            if user_email:
-                assigned = fields.get("System.AssignedTo", "")
-                if isinstance(assigned, dict):
-                    assigned = assigned.get("uniqueName", "")
-                if user_email.lower() in assigned.lower():
-                    high_priority.append(task)
-            else:
-                high_priority.append(task)
-    return high_priority
+    last_day = datetime.now().date() + timedelta(days=app.config['PRIORITY_DUE_DAYS'])
+    return backlog.due_before(last_day, user_email or None)
 
 def generate_ai_suggestion(context, tasks):
-    """Generates an AI suggestion using OpenAI based on tasks."""
-    task_context = "\n".join(
-        f"- {t['fields']['System.Title']} (State: {t['fields']['System.State']}, Due: {t['fields'].get('Microsoft.VSTS.Scheduling.DueDate', 'No date')})"
-        for t in tasks[:5]
-    )
+    """
+    Generates an AI suggestion using OpenAI based on tasks. Answers are cached
+    on the context and the tasks' (id, rev), so an unchanged backlog is only
+    summarized once; concurrent requests for the same summary share one call.
+    """
+    tasks = tasks[:5]
+    key = cache_key("summary", context, task_snapshot(tasks))
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    task_context = "\n".join(f"- {task_line(t)}" for t in tasks)
     prompt = f"""
 Based on these tasks:
 {task_context}
 
 Provide a concise summary regarding: {context}
 """
-    return get_response(prompt)
+
+    def summarize():
+        suggestion = get_response([{"role": "user", "content": prompt}])
+        if not is_error_reply(suggestion):
+            response_cache.put(key, suggestion)
+        return suggestion
+
+    return response_flights.do(key, summarize)
+
+# --- Priority digests ---
+# The answers to "show (my) priority tasks" and "summarize tasks", precomputed
+# per user and for the team by digest_scheduler (digests.py) and shown with
+# their age while younger than DIGEST_MAX_AGE.
+FOCUS_QUESTION = "which of these tasks to focus on first and why"
+
+def build_digest(backlog, digest, email, pacer):
+    """Fills in `digest` from the backlog for `email`'s tasks (all tasks when None)."""
+    entries = analyze_high_priority_tasks(backlog, email)
+    tasks = [task for task, _ in entries]
+    pending = backlog.assigned_to(email) if email else backlog.not_in_states([])
+    digest.tasks = json.dumps([task.to_row() for task in tasks[:app.config['LISTING_PAGE_SIZE']]])
+    digest.total = len(entries)
+    digest.overdue = sum(dr < 0 for _, dr in entries)
+    digest.pending = len(open_tasks(pending))
+    digest.computed_at = datetime.utcnow()
+    digest.stale = False
+    # generate_ai_suggestion's key: an unchanged top five keeps its summary without asking GPT again
+    key = cache_key("summary", FOCUS_QUESTION, task_snapshot(tasks[:5]))
+    if digest.summary_key == key and digest.summary:
+        return
+    digest.summary = digest.summary_key = None
+    if tasks and app.config['DIGEST_AI_SUMMARY']:
+        pacer.wait()
+        summary = generate_ai_suggestion(FOCUS_QUESTION, tasks)
+        if not is_error_reply(summary):
+            digest.summary, digest.summary_key = summary, key
+
+def refresh_digests(force=False, pacer=None):
+    """
+    Rebuilds the stored digests: the team's and one per user with an Azure
+    DevOps identity. Digests built less than DIGEST_MIN_INTERVAL seconds ago
+    (e.g. by another worker process) are kept unless `force` or stale. GPT
+    summaries are spaced by `pacer` (a digests.Pacer). Returns how many were
+    rebuilt.
+    """
+    pacer = pacer or Pacer()
+    with app.app_context(), telemetry.trace("digests") as root:
+        stored = {digest.key: digest for digest in PriorityDigest.query.all()}
+        users = User.query.filter(User.azure_devops_email.isnot(None), User.azure_devops_email != '').all()
+        cutoff = datetime.utcnow() - timedelta(seconds=DIGEST_MIN_INTERVAL)
+        due = [(user, stored.get(digest_key(user.id if user else None))) for user in [None, *users]]
+        due = [(user, digest) for user, digest in due
+               if force or digest is None or digest.stale or digest.computed_at < cutoff]
+        if due:
+            backlog = get_backlog_view()
+        rebuilt = 0
+        for user, digest in due:
+            if digest is None:
+                user_id = user.id if user else None
+                digest = PriorityDigest(key=digest_key(user_id), user_id=user_id)
+                db.session.add(digest)
+            build_digest(backlog, digest, user.azure_devops_email if user else None, pacer)
+            # One commit per digest, so chat requests don't wait on the whole run for the write lock
+            try:
+                db.session.commit()
+                rebuilt += 1
+            except IntegrityError:
+                # Another worker process added this digest first
+                db.session.rollback()
+        root.tags["status"] = "done"
+        return rebuilt
+
+def digest_key(user_id):
+    """PriorityDigest.key of a user's digest, or of the team's when user_id is None."""
+    return "team" if user_id is None else f"user:{user_id}"
+
+def mark_digest_stale(user_id, team=False):
+    """
+    Stops showing the user's digest, and with `team` the team's, until it is
+    rebuilt (committed with the session). Writes pass team=True, as the task
+    they changed may be on the team's list too.
+    """
+    keys = [digest_key(user_id)] + ([digest_key(None)] if team else [])
+    PriorityDigest.query.filter(PriorityDigest.key.in_(keys)).update({"stale": True}, synchronize_session=False)
+
+def stored_digest(mine):
+    """
+    The current user's digest (the team's unless `mine`), or None when there
+    is none younger than DIGEST_MAX_AGE or it was marked stale by a write
+    (the user's own, or anyone's for the team digest) or a profile change.
+    """
+    user_id = current_user.id if mine and current_user.azure_devops_email else None
+    digest = PriorityDigest.query.filter_by(key=digest_key(user_id)).first()
+    if digest is None:
+        telemetry.count_cache("digest", "miss")
+        return None
+    if digest.stale or (datetime.utcnow() - digest.computed_at).total_seconds() > app.config['DIGEST_MAX_AGE']:
+        telemetry.count_cache("digest", "stale")
+        return None
+    telemetry.count_cache("digest", "hit")
+    return digest
+
+def digest_entries(digest):
+    """The first page of the digest's tasks as [(task, days remaining)], like analyze_high_priority_tasks."""
+    today = date.today().toordinal()
+    return [(task, task.due - today) for task in map(WorkItem.from_row, json.loads(digest.tasks))]
+
+def digest_reply(digest, listing_params, data):
+    """The digest's listing (later pages come from /listing) and its counts and age."""
+    listing = listing_reply("priority", listing_params, data, "High-priority tasks", digest_entries(digest),
+                            digest.total)
+    age = describe_age((datetime.utcnow() - digest.computed_at).total_seconds())
+    return [listing or "No high-priority tasks.",
+            f"<br>{digest.overdue} overdue, {digest.total - digest.overdue} due soon, {digest.pending} pending "
+            f"(digest updated {age})."]
 
 # --- Authentication & Profile Routes ---
 @app.route("/register", methods=['GET', 'POST'])
@@ -163,6 +406,7 @@ def profile():
         user = User.query.filter_by(id=current_user.id).first()
         if user:
             user.azure_devops_email = new_email
+            mark_digest_stale(user.id)
             db.session.commit()
             flash('Profile updated!')
         else:
@@ -174,133 +418,429 @@ def profile():
 @app.route("/delete_history", methods=["POST"])
 @login_required
 def delete_history():
-    current_user.chat_history_list = []
+    ChatMessage.query.filter_by(user_id=current_user.id).delete(synchronize_session=False)
     db.session.commit()
     return jsonify({"status": "success", "message": "Chat history deleted."})
 
-@app.route("/", methods=["GET", "POST"])
-@login_required
-def chat():
-    if request.method == "POST":
-        message = request.form["message"].strip()
-        current_user.chat_history_list += [{"type": "user", "text": message}]
-        tasks = get_work_items()
-        response = ""
+# --- Chat Actions ---
+# Each handler declares the data it needs: "backlog" is the cached BacklogView
+# (also required by title lookups), "tasks" the full list of work items.
+# --- Background writes: job handlers take the queued payload and return the reply posted to the chat ---
+def run_create_task(payload):
+    task_id = create_work_item(payload["title"], payload.get("description", ""), payload.get("assignee"),
+                               payload.get("due_date"))
+    return f"Task '{payload['title']}' created with ID {task_id}."
+
+def run_update_time(payload):
+    update_time_fields(payload["work_item_id"], payload["time_spent"], payload["time_remaining"])
+    return (f"Updated '{payload['title']}' with time spent = {payload['time_spent']}, "
+            f"remaining = {payload['time_remaining']}.")
+
+def run_update_assignment(payload):
+    update_task_assignment(payload["work_item_id"], payload["assignee"])
+    return f"Task {payload['work_item_id']} assigned to {payload['assignee']}."
+
+def run_delete_task(payload):
+    delete_work_item(payload["work_item_id"])
+    return f"Task '{payload['title']}' has been deleted."
+
+def run_update_status(payload):
+    update_task_status(payload["work_item_id"], payload["status"])
+    return f"Task '{payload['title']}' status updated to {payload['status']}."
+
+def run_bulk_update(payload):
+    results = batch_update_work_items([tuple(update) for update in payload["updates"]])
+    return format_bulk_results(results, payload["titles"])
+
+WRITE_JOBS = {
+    "create_task": run_create_task,
+    "update_time": run_update_time,
+    "update_assignment": run_update_assignment,
+    "delete_task": run_delete_task,
+    "update_status": run_update_status,
+    "bulk_update": run_bulk_update,
+}
 
-        intent = analyze_user_intent(message)
-        action = intent.get("action")
-        params = intent.get("parameters", {})
+# A create that timed out or failed with a 5xx may already exist in Azure DevOps, so
+# retrying it could add a duplicate work item: creates are only retried when throttled.
+# So are bulk updates, whose retry would report the items it already changed as conflicts.
+WRITE_RETRY_POLICIES = {"create_task": is_throttled_error, "bulk_update": is_throttled_error}
 
+def is_retryable_write(exc, action):
+    return WRITE_RETRY_POLICIES.get(action, is_transient_error)(exc)
+
+def post_job_result(job):
+    """
+    Adds a finished job's outcome to its user's chat history (failures get a
+    GPT explanation) and returns it, so /jobs/<id> shows the same text.
+    """
+    if job["status"] == "done":
+        text = job["result"]
+    else:
+        with telemetry.span("explain_error"):
+            text = f"Job {job['id']} failed. " + "".join(explain_error(job["error"]))
+    with app.app_context():
+        add_chat_message(job["user_id"], "bot", text)
+        mark_digest_stale(job["user_id"], team=True)
+        with telemetry.span("db.commit"):
+            db.session.commit()
+    return text
+
+job_queue = JobQueue(WRITE_JOBS, path=app.config['JOB_QUEUE_DB'], retryable=is_retryable_write,
+                     on_finish=post_job_result)
+
+# Rebuilds the digests on schedule and after DIGEST_CHANGE_THRESHOLD backlog changes; with
+# WORK_ITEM_SHARED_DB in one worker process only
+digest_scheduler = DigestScheduler(refresh_digests, store=work_item_cache.store)
+work_item_cache.indexes.append(digest_scheduler)
+
+def queue_write(description, action, payload):
+    """
+    Queues a write job and returns the acknowledgement shown in the chat; the
+    job's result is posted to the history when it finishes. With
+    BACKGROUND_WRITES off the job runs inline and its result is returned.
+    """
+    if not app.config['BACKGROUND_WRITES']:
         try:
-            if action == "smalltalk":
-    # For small talk, send the original message directly to GPT for a human-like reply
-             response = get_response([{"role": "user", "content": message}])
-             
-            elif action == "create_task":
-                title = params.get("title")
-                description = params.get("description", "")
-                due_date = params.get("due_date")
-                assignee = current_user.azure_devops_email or current_user.email
-                task_id = create_work_item(title, description, assignee, due_date)
-                response = f"Task '{title}' created with ID {task_id}."
-
-            elif action == "update_time":
-                title = params.get("task_title", "").lower()
-                time_spent = params.get("time_spent")
-                time_remaining = params.get("time_remaining")
-                matched_task = next((t for t in tasks if title in t["fields"].get("System.Title", "").lower()), None)
-                if matched_task:
-                    task_id = int(matched_task["id"])
-                    update_time_fields(task_id, time_spent, time_remaining)
-                    response = f"Updated '{title}' with time spent = {time_spent}, remaining = {time_remaining}."
-                else:
-                    response = f"Task '{title}' not found."
-
-            elif action == "update_assignment":
-                task_id = int(params.get("task_id"))
-                assignee = params.get("assignee")
-                update_task_assignment(task_id, assignee)
-                response = f"Task {task_id} assigned to {assignee}."
-            
-            elif action == "delete_task":
-                title = params.get("task_title", "").lower()
-                matched_task = next((t for t in tasks if title in t["fields"].get("System.Title", "").lower()), None)
-                if matched_task:
-                    task_id = int(matched_task["id"])
-                    delete_work_item(task_id)
-                    response = f"Task '{title}' has been deleted."
-                else:
-                    response = f"Task '{title}' not found."
-
-            elif action == "list_all_tasks":
-                response = "All work items:<br>" + format_tasks(tasks)
-
-            elif action == "show_my_tasks":
-                email = (current_user.azure_devops_email or current_user.email).lower()
-                my_tasks = [
-                    t for t in tasks
-                    if email in str(t["fields"].get("System.AssignedTo", "")).lower()
-                ]
-                response = "Your tasks:<br>" + format_tasks(my_tasks) if my_tasks else "No tasks assigned to you."
-
-            elif action in ["show_priority_tasks", "summarize_tasks"]:
-                email = current_user.azure_devops_email
-                filtered = analyze_high_priority_tasks(tasks, email if "my" in message else None)
-                if filtered:
-                    summary = []
-                    for t in filtered:
-                        title = t["fields"].get("System.Title", "No Title")
-                        dr = t.get("days_remaining", "N/A")
-                        status = (
-                            f"{abs(dr)} days overdue" if dr < 0 else
-                            "due today" if dr == 0 else
-                            "due tomorrow" if dr == 1 else
-                            f"due in {dr} days"
-                        )
-                        summary.append(f"{title} ({status})")
-                    response = f"{len(filtered)} high-priority tasks: " + ", ".join(summary)
-                else:
-                    response = "No high-priority tasks."
-
-            elif action == "show_pending_tasks":
-                pending_tasks = [
-                    t for t in tasks
-                    if t["fields"].get("System.State", "").lower() not in ["closed", "done", "removed", "resolved"]
-                ]
-                if pending_tasks:
-                    response = "Pending tasks:<br>" + format_tasks(pending_tasks)
-                else:
-                    response = "No pending tasks found."
-            
-            elif action == "show_completed_tasks":
-                completed_tasks = [
-                     t for t in tasks
-                    if t["fields"].get("System.State", "").lower() in ["done", "removed"]
-             ]
-                if completed_tasks:
-                        response = "Completed tasks:<br>" + format_tasks(completed_tasks)
-                else:
-                        response = "No completed tasks found."
+            return WRITE_JOBS[action](payload)
+        finally:
+            mark_digest_stale(current_user.id, team=True)
+    job_id = job_queue.submit(action, payload, current_user.id)
+    return f'{description}… <span class="job-status" data-job-id="{job_id}">(job {job_id}: queued)</span>'
 
+# chat() fetches the backlog view (and revalidates a stale cache) while the
+# intent is being classified and drops it when the classified action does not
+# need it. Listings need the "view", which pushes their filter down to WIQL
+# while that cache is cold.
+CHAT_ACTIONS = {}
+DATA_LOADERS = {"backlog": get_backlog_view, "view": get_query_view, "tasks": get_cached_work_items}
+PREFETCH = ("backlog",)
+prefetch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CHAT_PREFETCH_WORKERS", "8")),
+                                   thread_name_prefix="chat-prefetch")
 
+def prefetch_needs():
+    """
+    The data to fetch during classification. While the backlog cache is cold
+    its first load is started in the background instead and nothing is
+    prefetched: actions that need the backlog wait for that load, the others
+    (smalltalk, creates, listings pushed down to WIQL) do not.
+    """
+    if not work_item_cache.loaded:
+        work_item_cache.load_in_background()
+        return ()
+    return PREFETCH
 
-            elif action == "update_status":
-                title = params.get("task_title", "").lower()
-                status = params.get("status", "")
-                matched_task = next((t for t in tasks if title in t["fields"].get("System.Title", "").lower()), None)
-                if matched_task:
-                    task_id = int(matched_task["id"])
-                    update_task_status(task_id, status)
-                    response = f"Task '{title}' status updated to {status}."
-                else:
-                    response = f"Task '{title}' not found."
+def chat_action(*names, needs=()):
+    """Registers a handler(message, params, data) for the given intent actions."""
+    def register(handler):
+        for name in names:
+            CHAT_ACTIONS[name] = (handler, frozenset(needs))
+        return handler
+    return register
 
-            else:
-                response = "Sorry, I didn’t understand that. Please rephrase."
+# --- Paginated listings ---
+# Listing actions reply with a placeholder holding the item count and a
+# cursor, plus the first page of items for the live response; the browser
+# fetches later pages from /listing. Chat history keeps only the placeholder.
+# Pages are recomputed from the listing's query on each request, so items
+# added or closed in between shift the later pages.
+LISTINGS = {}
+
+def listing(name, needs=(), item=task_item):
+    """Registers query(params, data) -> entries for a listing; item(entry) renders one entry."""
+    def register(query):
+        LISTINGS[name] = (query, item, frozenset(needs))
+        return query
+    return register
+
+def encode_cursor(name, params, offset):
+    raw = json.dumps([name, params, offset], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Returns (name, params, offset); raises ValueError for a malformed or unknown cursor."""
+    try:
+        name, params, offset = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if name not in LISTINGS or not isinstance(params, dict) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return name, params, offset
+
+def listing_page(name, params, entries, offset=0, total=None):
+    """
+    The LISTING_PAGE_SIZE items of `entries` from offset, with the cursor of
+    the next page (or None). `total` is the listing's length when `entries`
+    only holds the first page.
+    """
+    size = app.config['LISTING_PAGE_SIZE']
+    end = offset + size
+    total = len(entries) if total is None else total
+    return {"items": [LISTINGS[name][1](entry) for entry in entries[offset:end]], "offset": offset,
+            "total": total, "next_cursor": encode_cursor(name, params, end) if end < total else None}
+
+class ListingChunk(str):
+    """
+    A reply chunk holding a listing placeholder; `page` is the page at
+    `cursor` (the first one), sent along with the live reply.
+    """
+    cursor = page = None
+
+def listing_reply(name, params, data, title, entries=None, total=None):
+    """
+    The placeholder for a listing (its query is run unless `entries` are
+    given, see listing_page for `total`), or None when the listing is empty.
+    """
+    if entries is None:
+        entries = LISTINGS[name][0](params, data)
+    if not entries:
+        return None
+    cursor = encode_cursor(name, params, 0)
+    page = listing_page(name, params, entries, total=total)
+    chunk = ListingChunk(f'{title} ({page["total"]}):<div class="task-listing" data-cursor="{cursor}"></div>')
+    chunk.cursor, chunk.page = cursor, page
+    return chunk
 
-        except Exception as e:
-            error_message = str(e)
-            gpt_prompt = f"""
+def listing_pages(chunks):
+    """{cursor: first page} for the listings among the reply chunks."""
+    return {chunk.cursor: chunk.page for chunk in chunks if isinstance(chunk, ListingChunk)}
+
+def match_task(title):
+    """
+    Looks up the task a write applies to in the backlog's title index. Only an
+    exact or near-exact title is taken (see TitleIndex.lookup's strict mode).
+    Returns (TitleMatch, None) for a clear match, else (None, reply for the user).
+    """
+    result = title_index.lookup(title, strict=True)
+    if result.match:
+        return result.match, None
+    options = ", ".join(f"'{c.title}' (ID {c.id})" for c in result.candidates[:3])
+    if result.ambiguous:
+        return None, f"Several tasks match '{title}': {options}. Which one did you mean?"
+    if result.candidates:
+        return None, f"Task '{title}' not found. Did you mean {options}?"
+    return None, f"Task '{title}' not found."
+
+@chat_action("smalltalk")
+def smalltalk(message, params, data):
+    # For small talk, send the message with the recent conversation to GPT for a human-like reply
+    return stream_response(conversation_context(current_user.id, message))
+
+@chat_action("create_task")
+def create_task(message, params, data):
+    title = params.get("title")
+    return queue_write(f"Creating task '{title}'", "create_task", {
+        "title": title,
+        "description": params.get("description", ""),
+        "due_date": params.get("due_date"),
+        "assignee": current_user.azure_devops_email or current_user.email,
+    })
+
+@chat_action("update_time", needs=["backlog"])
+def update_time(message, params, data):
+    title = params.get("task_title", "").lower()
+    matched_task, reply = match_task(title)
+    if not matched_task:
+        return reply
+    return queue_write(f"Updating time on '{matched_task.title}'", "update_time", {
+        "work_item_id": matched_task.id,
+        "title": matched_task.title,
+        "time_spent": params.get("time_spent"),
+        "time_remaining": params.get("time_remaining"),
+    })
+
+@chat_action("update_assignment")
+def update_assignment(message, params, data):
+    task_id = int(params.get("task_id"))
+    assignee = params.get("assignee")
+    return queue_write(f"Assigning task {task_id} to {assignee}", "update_assignment",
+                       {"work_item_id": task_id, "assignee": assignee})
+
+@chat_action("delete_task", needs=["backlog"])
+def delete_task(message, params, data):
+    title = params.get("task_title", "").lower()
+    matched_task, reply = match_task(title)
+    if not matched_task:
+        return reply
+    return queue_write(f"Deleting '{matched_task.title}'", "delete_task",
+                       {"work_item_id": matched_task.id, "title": matched_task.title})
+
+@listing("all", needs=["tasks"])
+def all_tasks(params, data):
+    return data["tasks"]
+
+@listing("mine", needs=["view"])
+def my_tasks(params, data):
+    return data["view"].assigned_to(current_user.azure_devops_email or current_user.email)
+
+@listing("priority", needs=["view"], item=priority_item)
+def priority_tasks(params, data):
+    email = current_user.azure_devops_email
+    return analyze_high_priority_tasks(data["view"], email if params.get("mine") else None)
+
+@listing("pending", needs=["view"])
+def pending_tasks(params, data):
+    return data["view"].not_in_states(app.config['CLOSED_STATES'])
+
+@listing("completed", needs=["view"])
+def completed_tasks(params, data):
+    return data["view"].in_states(app.config['COMPLETED_STATES'])
+
+@chat_action("list_all_tasks", needs=["tasks"])
+def list_all_tasks(message, params, data):
+    return listing_reply("all", {}, data, "All work items") or "No work items found."
+
+@chat_action("show_my_tasks", needs=["view"])
+def show_my_tasks(message, params, data):
+    return listing_reply("mine", {}, data, "Your tasks") or "No tasks assigned to you."
+
+@chat_action("show_priority_tasks", needs=["view"])
+def show_priority_tasks(message, params, data):
+    """Answered from the stored digest while there is a recent one."""
+    listing_params = {"mine": "my" in message}
+    digest = stored_digest(listing_params["mine"])
+    if digest is not None:
+        return digest_reply(digest, listing_params, data)
+    return listing_reply("priority", listing_params, data, "High-priority tasks") or "No high-priority tasks."
+
+@chat_action("summarize_tasks", needs=["view"])
+def summarize_tasks(message, params, data):
+    """
+    The high-priority list followed by GPT's advice on it (cached until one of
+    the tasks changes), from the stored digest while there is a recent one.
+    """
+    listing_params = {"mine": "my" in message}
+    digest = stored_digest(listing_params["mine"])
+    if digest is not None:
+        if not digest.total:
+            return "No high-priority tasks."
+        listing, note = digest_reply(digest, listing_params, data)
+        summary = digest.summary or generate_ai_suggestion(FOCUS_QUESTION, [t for t, _ in digest_entries(digest)])
+        return [listing, "<br>" + summary, note]
+    filtered = priority_tasks(listing_params, data)
+    if not filtered:
+        return "No high-priority tasks."
+    suggestion = generate_ai_suggestion(FOCUS_QUESTION, [t for t, _ in filtered])
+    return [listing_reply("priority", listing_params, data, "High-priority tasks", filtered), "<br>" + suggestion]
+
+@chat_action("show_pending_tasks", needs=["view"])
+def show_pending_tasks(message, params, data):
+    return listing_reply("pending", {}, data, "Pending tasks") or "No pending tasks found."
+
+@chat_action("show_completed_tasks", needs=["view"])
+def show_completed_tasks(message, params, data):
+    return listing_reply("completed", {}, data, "Completed tasks") or "No completed tasks found."
+
+@chat_action("update_status", needs=["backlog"])
+def update_status(message, params, data):
+    title = params.get("task_title", "").lower()
+    status = params.get("status", "")
+    matched_task, reply = match_task(title)
+    if not matched_task:
+        return reply
+    return queue_write(f"Updating '{matched_task.title}' to {status}", "update_status",
+                       {"work_item_id": matched_task.id, "title": matched_task.title, "status": status})
+
+def open_tasks(tasks):
+    closed = {state.lower() for state in app.config['CLOSED_STATES']}
+    return [t for t in tasks if (t.state or "").lower() not in closed]
+
+def format_bulk_results(results, titles):
+    """Per-item summary of a batch_update_work_items() call; `titles` maps str(id) to title."""
+    updated = sum(result["ok"] for result in results)
+    lines = [f"Updated {updated} of {len(results)} tasks:"]
+    for result in results:
+        title = titles.get(str(result["id"]), f"ID {result['id']}")
+        if result["ok"]:
+            lines.append(f"✔ {title}")
+        elif result["status"] == 412:
+            lines.append(f"✘ {title}: changed by someone else since it was loaded, not updated")
+        else:
+            lines.append(f"✘ {title}: {result['error']}")
+    return "<br>".join(lines)
+
+def queue_bulk_update(description, updates, tasks):
+    """
+    Queues one batch_update_work_items() job for `updates` of `tasks` (see
+    queue_write); more than BULK_UPDATE_MAX_ITEMS updates are refused.
+    """
+    limit = app.config['BULK_UPDATE_MAX_ITEMS']
+    if len(updates) > limit:
+        return (f"That would change {len(updates)} tasks; bulk updates are limited to {limit} at a time. "
+                "Please narrow it down, e.g. to your own or to overdue tasks.")
+    return queue_write(description, "bulk_update", {
+        "updates": updates, "titles": {str(t.id): t.title or "No Title" for t in tasks}})
+
+@chat_action("bulk_update_status", needs=["backlog"])
+def bulk_update_status(message, params, data):
+    backlog = data["backlog"]
+    status = params.get("status", "")
+    mine = params.get("scope", "mine") == "mine"
+    me = current_user.azure_devops_email or current_user.email
+    if params.get("overdue"):
+        yesterday = datetime.now().date() - timedelta(days=1)
+        tasks = [t for t, _ in backlog.due_before(yesterday, me if mine else None)]
+    elif mine:
+        tasks = backlog.assigned_to(me)
+    else:
+        # Every open task in the project is never changed from one unfiltered message
+        return (f"I won't set every open task in the project to {status}. "
+                f"Try 'mark all my tasks as {status}' or 'mark all overdue tasks as {status}'.")
+    tasks = [t for t in open_tasks(tasks) if t.state != status]
+    if not tasks:
+        return "No matching tasks to update."
+    patch = [{"op": "add", "path": "/fields/System.State", "value": status}]
+    return queue_bulk_update(f"Setting {len(tasks)} tasks to {status}",
+                             [(t.id, t.rev, patch) for t in tasks], tasks)
+
+@chat_action("bulk_reassign", needs=["backlog"])
+def bulk_reassign(message, params, data):
+    backlog = data["backlog"]
+    from_name, to_name = params.get("from_assignee", ""), params.get("to_assignee", "")
+    sources, targets = backlog.find_assignees(from_name), backlog.find_assignees(to_name)
+    if not sources:
+        return f"No tasks are assigned to '{from_name}'."
+    if len(sources) > 1:
+        options = ", ".join(backlog.display_name(key) for key in sources[:3])
+        return f"Several people match '{from_name}': {options}. Which one did you mean?"
+    if len(targets) > 1:
+        options = ", ".join(backlog.display_name(key) for key in targets[:3])
+        return f"Several people match '{to_name}': {options}. Which one did you mean?"
+    assignee = targets[0] if targets else to_name
+    tasks = open_tasks(backlog.assigned_to(sources[0]))
+    if not tasks:
+        return f"{backlog.display_name(sources[0])} has no open tasks."
+    patch = [{"op": "add", "path": "/fields/System.AssignedTo", "value": assignee}]
+    return queue_bulk_update(f"Reassigning {len(tasks)} tasks to {backlog.display_name(assignee)}",
+                             [(t.id, t.rev, patch) for t in tasks], tasks)
+
+@chat_action("bulk_update_time", needs=["backlog"])
+def bulk_update_time(message, params, data):
+    backlog = data["backlog"]
+    hours = float(params.get("hours", 0))
+    tasks, replies = [], []
+    for title in params.get("task_titles", []):
+        matched_task, reply = match_task(title.lower())
+        if matched_task:
+            tasks.append(backlog.get(matched_task.id))
+        else:
+            replies.append(reply)
+    tasks = list(filter(None, tasks))
+    updates = []
+    for task in tasks:
+        completed = (task.completed or 0) + hours
+        remaining = max(0, (task.remaining or 0) - hours)
+        updates.append((task.id, task.rev, [
+            {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.CompletedWork", "value": completed},
+            {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.RemainingWork", "value": remaining},
+        ]))
+    if updates:
+        replies.insert(0, queue_bulk_update(f"Logging {hours:g} h on {len(updates)} tasks", updates, tasks))
+    return "<br>".join(replies) or "No tasks given."
+
+def error_explanation_messages(error_message):
+    """The OpenAI conversation asking for a plain-language explanation of an Azure DevOps error."""
+    gpt_prompt = f"""
             You're a helpful assistant. The following error occurred in an Azure DevOps integration while trying to update a task status:
 
             Error:
@@ -308,18 +848,233 @@ def chat():
 
             Please explain the issue in simple terms for a non-technical user and suggest what they could do next (if applicable).
             """
+    return [{"role": "user", "content": gpt_prompt}]
 
-            response = get_response([{"role": "user", "content": gpt_prompt}])
+def error_explanation_lookup(error_message):
+    """
+    Returns (cache key, cached explanation or None, OpenAI messages). GPT is
+    shown the error's signature (ids and URLs masked) so one explanation fits
+    every repeat of the same failure.
+    """
+    signature = error_signature(error_message)
+    key = cache_key("error_explanation", signature)
+    return key, response_cache.get(key), error_explanation_messages(signature)
 
+def explain_error(error_message):
+    """
+    Streams GPT's explanation of an Azure DevOps error for a non-technical
+    user. While the same error is already being explained for someone else,
+    waits for that explanation instead of asking again.
+    """
+    key, cached, messages = error_explanation_lookup(error_message)
+    if cached is not None:
+        yield cached
+        return
+    future, leader = response_flights.claim(key)
+    if not leader:
+        try:
+            yield future.result()
+            return
+        except Exception:
+            pass  # The other request gave up; explain it here
+    parts, explanation = [], None
+    try:
+        for chunk in stream_response(messages):
+            parts.append(chunk)
+            yield chunk
+        explanation = "".join(parts)
+        if not is_error_reply(explanation):
+            response_cache.put(key, explanation)
+    finally:
+        if leader:
+            response_flights.finish(key, future, explanation, None if explanation is not None else Abandoned())
 
-        current_user.chat_history_list += [{"type": "bot", "text": response}]
-        db.session.commit()
-        return jsonify({"status": "success", "response": response, "history": current_user.chat_history_list})
+def iter_chat_action(message):
+    """
+    Classifies the message, runs the matching action and yields its reply in chunks.
+    Handlers return either a string or an iterator of chunks (streamed LLM
+    tokens, listing pages). The backlog fetch (a cold cache's first load)
+    runs alongside the intent classification (see prefetch_needs) and is
+    only waited on if the chosen action declared it needs it.
+    """
+    # Copy the context so the prefetch's Azure DevOps calls show up in this request's trace
+    prefetched = {need: prefetch_pool.submit(contextvars.copy_context().run, DATA_LOADERS[need])
+                  for need in prefetch_needs()}
+    with telemetry.span("classify_intent") as span:
+        intent = classify_intent(message)
+        span.tags["source"] = intent.get("source")
+        telemetry.tag(action=intent.get("action") or "unknown")
+    action = intent.get("action")
+    params = intent.get("parameters", {})
+    handler, needs = CHAT_ACTIONS.get(action, (None, frozenset()))
+    for need, future in prefetched.items():
+        if need not in needs:
+            future.cancel()
 
-    return render_template("index.html", history=current_user.chat_history_list)
+    try:
+        if handler is None:
+            yield "Sorry, I didn’t understand that. Please rephrase."
+            return
+        with telemetry.span("get_work_items", needs=",".join(sorted(needs))):
+            data = {need: prefetched[need].result() if need in prefetched else DATA_LOADERS[need]()
+                    for need in needs}
+        with telemetry.span("action"):
+            result = handler(message, params, data)
+            if isinstance(result, str):
+                yield result
+            else:
+                yield from result
+    except UpstreamBusy as e:
+        # Overloaded: answer at once instead of queueing an OpenAI explanation as well
+        telemetry.count_error("action", e)
+        yield str(e)
+    except Exception as e:
+        telemetry.count_error("action", e)
+        telemetry.tag(error=type(e).__name__)
+        with telemetry.span("explain_error"):
+            yield from explain_error(str(e))
 
+def run_chat_action(message):
+    """Returns the complete reply to message (see iter_chat_action)."""
+    return "".join(iter_chat_action(message))
 
-if __name__ == "__main__":
+@app.route("/", methods=["GET", "POST"])
+@login_required
+def chat():
+    if request.method == "POST":
+        with telemetry.trace("POST /"):
+            message = request.form["message"].strip()
+            user_message = add_chat_message(current_user.id, "user", message)
+            parts = list(iter_chat_action(message))
+            response = "".join(parts)
+            bot_message = add_chat_message(current_user.id, "bot", response)
+            with telemetry.span("db.commit"):
+                db.session.commit()
+        return jsonify({"status": "success", "response": response, "listings": listing_pages(parts),
+                        "messages": [user_message.to_dict(), bot_message.to_dict()]})
+
+    history, next_cursor = chat_history_page(current_user.id)
+    return render_template("index.html", history=[m.to_dict() for m in history], next_cursor=next_cursor)
+
+@app.route("/history")
+@login_required
+def history():
+    """Older chat messages for lazy scroll-back: ?before=<message id>."""
+    before = request.args.get("before", type=int)
+    limit = min(request.args.get("limit", app.config['HISTORY_PAGE_SIZE'], type=int), 200)
+    messages, next_cursor = chat_history_page(current_user.id, before, limit)
+    return jsonify({"messages": [m.to_dict() for m in messages], "next_cursor": next_cursor})
+
+@app.route("/listing")
+@login_required
+def listing_next_page():
+    """One page of a task listing: ?cursor=<a listing's data-cursor or a page's next_cursor>."""
+    try:
+        name, params, offset = decode_cursor(request.args.get("cursor", ""))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid cursor."}), 400
+    query, _, needs = LISTINGS[name]
+    with telemetry.trace("GET /listing", action=name) as root:
+        try:
+            data = {need: DATA_LOADERS[need]() for need in needs}
+            return jsonify(listing_page(name, params, query(params, data), offset))
+        except UpstreamBusy as e:
+            root.tags["status"] = 503
+            return jsonify({"status": "error", "message": str(e)}), 503
+
+@app.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    """
+    Status of a queued write, for polling: queued, running, done or failed.
+    "message" is the reply saved to the chat history once the job finished.
+    """
+    job = job_queue.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        return jsonify({"status": "error", "message": "Job not found."}), 404
+    return jsonify({key: job[key] for key in ("id", "action", "status", "attempts", "result", "error", "message")})
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (text exposition format); counts are per process."""
+    return Response(telemetry.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/hooks/azure-devops", methods=["POST"])
+def azure_devops_hook():
+    """
+    Azure DevOps service-hook (Web Hooks) endpoint for workitem.created,
+    .updated, .deleted and .restored events. The subscription sends
+    AZURE_DEVOPS_HOOK_SECRET as the basic-auth password or in an
+    X-Hook-Secret header. Every accepted delivery is acknowledged with 200.
+    """
+    if not hook_receiver.enabled:
+        return jsonify({"status": "error", "message": "Service hooks are not enabled."}), 404
+    auth = request.authorization
+    if not hook_receiver.authorized(auth.password if auth else request.headers.get("X-Hook-Secret")):
+        return jsonify({"status": "error", "message": "Invalid service hook secret."}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "error", "message": "Expected a service hook JSON payload."}), 400
+    with telemetry.trace("POST /hooks/azure-devops", action=payload.get("eventType")):
+        result = hook_receiver.handle(payload)
+    return jsonify({"status": "success", "result": result})
+
+# Appended to a streamed reply saved after the client disconnected or the action failed mid-stream
+INTERRUPTED_REPLY = "(reply interrupted)"
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def listing_event(chunk):
+    """Payload of a `chunk` event; a listing placeholder carries its first page."""
+    if isinstance(chunk, ListingChunk):
+        return {"text": chunk, "listing": {"cursor": chunk.cursor, "page": chunk.page}}
+    return {"text": chunk}
+
+@app.route("/chat/stream", methods=["POST"])
+@login_required
+def chat_stream():
+    """
+    Server-Sent Events version of chat(): sends each chunk of the reply as a
+    `chunk` event as soon as it is produced, then a `done` event. The user's
+    message is saved before the first chunk and the reply once the stream
+    ends; a reply cut off by a disconnect or an error is saved as far as it
+    got.
+    """
+    message = request.form["message"].strip()
+
+    def generate():
+        # The trace covers the whole stream, so it is closed before the last event is sent
+        with telemetry.trace("POST /chat/stream"):
+            add_chat_message(current_user.id, "user", message)
+            with telemetry.span("db.commit"):
+                db.session.commit()
+            parts, response = [], None
+            try:
+                for chunk in iter_chat_action(message):
+                    parts.append(chunk)
+                    yield sse_event("chunk", listing_event(chunk))
+                response = "".join(parts)
+            finally:
+                if response is None:
+                    db.session.rollback()
+                    partial = "".join(parts).rstrip()
+                    add_chat_message(current_user.id, "bot", f"{partial} {INTERRUPTED_REPLY}".lstrip())
+                else:
+                    add_chat_message(current_user.id, "bot", response)
+                with telemetry.span("db.commit"):
+                    db.session.commit()
+        yield sse_event("done", {"status": "success", "response": response})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def init_db():
+    """
+    Creates missing tables and migrates legacy chat history, then warm-starts
+    the backlog cache and starts the background workers (run at startup).
+    """
     with app.app_context():
         db.create_all()
         inspector = inspect(db.engine)
@@ -328,4 +1083,26 @@ if __name__ == "__main__":
             with db.engine.connect() as connection:
                 connection.execute('ALTER TABLE user ADD COLUMN chat_history TEXT')
                 connection.execute("UPDATE user SET chat_history = '[]' WHERE chat_history IS NULL")
-        app.run(debug=True)
\ No newline at end of file
+        migrate_chat_history()
+        # Digests are rebuilt from the backlog, so a table from before the key/stale columns is recreated
+        digest_columns = {col['name'] for col in inspector.get_columns('priority_digest')}
+        if not {'key', 'stale'} <= digest_columns:
+            PriorityDigest.__table__.drop(db.engine)
+            PriorityDigest.__table__.create(db.engine)
+    # Serve the backlog saved before the last shutdown while it catches up in the background
+    work_item_cache.warm_start()
+    # Resume jobs queued before the last shutdown
+    job_queue.start()
+    digest_scheduler.start()
+
+@app.cli.command("build-digests")
+def build_digests_command():
+    """Rebuilds every priority digest once (e.g. from cron, with DIGEST_INTERVAL=0)."""
+    with app.app_context():
+        db.create_all()
+    print(f"Rebuilt {refresh_digests(force=True)} digests.")
+
+
+if __name__ == "__main__":
+    init_db()
+    app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,364 @@
+"""
+asyncio serving mode for the chatbot.
+
+Serves the chat endpoints (POST / and POST /chat/stream) from an aiohttp
+event loop: Azure DevOps and OpenAI calls are awaited instead of holding a
+thread, and the intent classification and backlog fetch run concurrently.
+Every other route (login, profile, history, static files) is handed to the
+regular Flask app on a small thread pool, so one process serves the whole
+site.
+
+    python async_app.py            # http://127.0.0.1:5000
+
+Actions without an async handler below, and writes while BACKGROUND_WRITES
+is on (they only queue a job), run their Flask handler on the same thread
+pool. app.py alone (`python app.py`) keeps working as before.
+"""
+import asyncio
+import contextvars
+import inspect
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from flask import g
+from itsdangerous import BadSignature
+from multidict import CIMultiDict
+
+from app import (app, db, User, CHAT_ACTIONS, INTERRUPTED_REPLY, WRITE_JOBS, add_chat_message,
+                 conversation_context, error_explanation_lookup, init_db, listing_event, listing_pages,
+                 mark_digest_stale, match_task, prefetch_needs, sse_event)
+from azure_devops import (async_client, create_work_item_async, delete_work_item_async, get_backlog_view_async,
+                          get_cached_work_items_async, get_query_view_async, update_task_assignment_async,
+                          update_task_status_async, update_time_fields_async)
+from intent_classifier import classify_intent_async
+from openai_utils import stream_response_async
+from flow_control import Abandoned, UpstreamBusy
+from response_cache import async_response_flights, is_error_reply, response_cache
+import telemetry
+
+ASYNC_HOST = os.getenv("ASYNC_HOST", "127.0.0.1")
+ASYNC_PORT = int(os.getenv("ASYNC_PORT", "5000"))
+# Threads for Flask routes, database writes and actions without an async handler
+ASYNC_SYNC_WORKERS = int(os.getenv("ASYNC_SYNC_WORKERS", "8"))
+
+sync_pool = ThreadPoolExecutor(max_workers=ASYNC_SYNC_WORKERS, thread_name_prefix="async-app-sync")
+
+ASYNC_CHAT_ACTIONS = {}
+ASYNC_DATA_LOADERS = {"backlog": get_backlog_view_async, "view": get_query_view_async, "tasks": get_cached_work_items_async}
+
+
+async def run_sync(fn, *args):
+    # Run in a copy of the current context so spans opened in the thread join the request's trace
+    return await asyncio.get_running_loop().run_in_executor(sync_pool, contextvars.copy_context().run, fn, *args)
+
+
+def async_chat_action(*names, needs=()):
+    """Registers an async handler(message, params, data, user) for the given intent actions."""
+    def register(handler):
+        for name in names:
+            ASYNC_CHAT_ACTIONS[name] = (handler, frozenset(needs))
+        return handler
+    return register
+
+
+@async_chat_action("smalltalk")
+async def smalltalk(message, params, data, user):
+    return stream_response_async(await run_sync(load_conversation, user.id, message))
+
+
+@async_chat_action("create_task")
+async def create_task(message, params, data, user):
+    title = params.get("title")
+    description = params.get("description", "")
+    due_date = params.get("due_date")
+    assignee = user.azure_devops_email or user.email
+    task_id = await create_work_item_async(title, description, assignee, due_date)
+    return f"Task '{title}' created with ID {task_id}."
+
+
+@async_chat_action("update_time", needs=["backlog"])
+async def update_time(message, params, data, user):
+    time_spent = params.get("time_spent")
+    time_remaining = params.get("time_remaining")
+    matched_task, reply = match_task(params.get("task_title", "").lower())
+    if not matched_task:
+        return reply
+    await update_time_fields_async(matched_task.id, time_spent, time_remaining)
+    return f"Updated '{matched_task.title}' with time spent = {time_spent}, remaining = {time_remaining}."
+
+
+@async_chat_action("update_assignment")
+async def update_assignment(message, params, data, user):
+    task_id = int(params.get("task_id"))
+    assignee = params.get("assignee")
+    await update_task_assignment_async(task_id, assignee)
+    return f"Task {task_id} assigned to {assignee}."
+
+
+@async_chat_action("delete_task", needs=["backlog"])
+async def delete_task(message, params, data, user):
+    matched_task, reply = match_task(params.get("task_title", "").lower())
+    if not matched_task:
+        return reply
+    await delete_work_item_async(matched_task.id)
+    return f"Task '{matched_task.title}' has been deleted."
+
+
+@async_chat_action("update_status", needs=["backlog"])
+async def update_status(message, params, data, user):
+    status = params.get("status", "")
+    matched_task, reply = match_task(params.get("task_title", "").lower())
+    if not matched_task:
+        return reply
+    await update_task_status_async(matched_task.id, status)
+    return f"Task '{matched_task.title}' status updated to {status}."
+
+
+def run_flask_handler(user_id, handler, message, params, data):
+    """Runs a Flask chat handler (which reads current_user) in a request context; returns its chunks."""
+    with app.test_request_context():
+        g._login_user = db.session.get(User, user_id)
+        result = handler(message, params, data)
+        return [result] if isinstance(result, str) else list(result)
+
+
+async def iter_chat_action_async(message, user):
+    """
+    Async counterpart of app.iter_chat_action: the intent classification and
+    the backlog prefetch (a cold cache's first load, see prefetch_needs) run
+    concurrently, and the reply is yielded in chunks.
+    """
+    prefetched = {need: asyncio.ensure_future(ASYNC_DATA_LOADERS[need]()) for need in prefetch_needs()}
+    with telemetry.span("classify_intent") as span:
+        intent = await classify_intent_async(message)
+        span.tags["source"] = intent.get("source")
+        telemetry.tag(action=intent.get("action") or "unknown")
+    action = intent.get("action")
+    params = intent.get("parameters", {})
+    # With BACKGROUND_WRITES the Flask write handlers only queue a job, so they are used as-is
+    use_async = action in ASYNC_CHAT_ACTIONS and not (app.config['BACKGROUND_WRITES'] and action in WRITE_JOBS)
+    handler, needs = ASYNC_CHAT_ACTIONS[action] if use_async else CHAT_ACTIONS.get(action, (None, frozenset()))
+    for need, future in prefetched.items():
+        if need not in needs:
+            future.cancel()
+
+    try:
+        if handler is None:
+            yield "Sorry, I didn’t understand that. Please rephrase."
+            return
+        with telemetry.span("get_work_items", needs=",".join(sorted(needs))):
+            loaded = await asyncio.gather(*(prefetched[need] if need in prefetched else ASYNC_DATA_LOADERS[need]()
+                                            for need in needs))
+        data = dict(zip(needs, loaded))
+        with telemetry.span("action"):
+            if not use_async:
+                for chunk in await run_sync(run_flask_handler, user.id, handler, message, params, data):
+                    yield chunk
+                return
+            try:
+                result = handler(message, params, data, user)
+                if inspect.isawaitable(result):
+                    result = await result
+            finally:
+                # Also after a failed write, which may have been applied anyway
+                if action in WRITE_JOBS:
+                    await run_sync(expire_digest, user.id)
+            if isinstance(result, str):
+                yield result
+            else:
+                async for chunk in result:
+                    yield chunk
+    except UpstreamBusy as e:
+        telemetry.count_error("action", e)
+        yield str(e)
+    except Exception as e:
+        telemetry.count_error("action", e)
+        telemetry.tag(error=type(e).__name__)
+        with telemetry.span("explain_error"):
+            async for chunk in explain_error_async(str(e)):
+                yield chunk
+
+
+async def explain_error_async(error_message):
+    """app.explain_error for coroutines; concurrent explanations of one error share a stream's result."""
+    key, cached, messages = error_explanation_lookup(error_message)
+    if cached is not None:
+        yield cached
+        return
+    future, leader = async_response_flights.claim(key)
+    if not leader:
+        try:
+            yield await asyncio.shield(future)
+            return
+        except Exception:
+            pass  # The other request gave up; explain it here
+    parts, explanation = [], None
+    try:
+        async for chunk in stream_response_async(messages):
+            parts.append(chunk)
+            yield chunk
+        explanation = "".join(parts)
+        if not is_error_reply(explanation):
+            response_cache.put(key, explanation)
+    finally:
+        if leader:
+            async_response_flights.finish(key, future, explanation,
+                                          None if explanation is not None else Abandoned())
+
+
+# --- Auth and persistence (Flask session cookie, Flask-SQLAlchemy models) ---
+
+def load_user(user_id):
+    with app.app_context():
+        return db.session.get(User, int(user_id))
+
+
+def load_conversation(user_id, message):
+    with app.app_context():
+        return conversation_context(user_id, message)
+
+
+def expire_digest(user_id):
+    """Marks the user's and the team's digest stale after an inline write, like app.queue_write."""
+    with app.app_context():
+        mark_digest_stale(user_id, team=True)
+        db.session.commit()
+
+
+def save_chat_messages(user_id, messages):
+    """Adds [(type, text)] to the user's history in one commit; returns their dicts."""
+    with app.app_context():
+        rows = [add_chat_message(user_id, type, text) for type, text in messages]
+        with telemetry.span("db.commit"):
+            db.session.commit()
+        return [row.to_dict() for row in rows]
+
+
+async def request_user(request):
+    """The logged-in User from Flask's signed session cookie; redirects to /login otherwise."""
+    cookie = request.cookies.get(app.config.get("SESSION_COOKIE_NAME", "session"))
+    user_id = None
+    if cookie:
+        try:
+            user_id = app.session_interface.get_signing_serializer(app).loads(cookie).get("_user_id")
+        except BadSignature:
+            pass
+    user = await run_sync(load_user, user_id) if user_id else None
+    if user is None:
+        raise web.HTTPFound(f"/login?next={request.path}")
+    return user
+
+
+# --- Routes ---
+
+async def chat(request):
+    user = await request_user(request)
+    message = (await request.post())["message"].strip()
+    with telemetry.trace("POST /"):
+        parts = [chunk async for chunk in iter_chat_action_async(message, user)]
+        response = "".join(parts)
+        saved = await run_sync(save_chat_messages, user.id, [("user", message), ("bot", response)])
+    return web.json_response({"status": "success", "response": response, "listings": listing_pages(parts),
+                              "messages": saved})
+
+
+async def chat_stream(request):
+    """
+    Server-Sent Events, same events as app.chat_stream; a reply cut off by a
+    disconnect or an error is saved as far as it got.
+    """
+    user = await request_user(request)
+    message = (await request.post())["message"].strip()
+    await run_sync(save_chat_messages, user.id, [("user", message)])
+    stream = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                         "X-Accel-Buffering": "no"})
+    await stream.prepare(request)
+    parts, response = [], None
+    with telemetry.trace("POST /chat/stream"):
+        try:
+            async for chunk in iter_chat_action_async(message, user):
+                parts.append(chunk)
+                await stream.write(sse_event("chunk", listing_event(chunk)).encode())
+            response = "".join(parts)
+        finally:
+            if response is None:
+                partial = "".join(parts).rstrip()
+                saved = f"{partial} {INTERRUPTED_REPLY}".lstrip()
+            else:
+                saved = response
+            # Shielded: a disconnect cancels this handler, the save still completes
+            await asyncio.shield(run_sync(save_chat_messages, user.id, [("bot", saved)]))
+    await stream.write(sse_event("done", {"status": "success", "response": response}).encode())
+    await stream.write_eof()
+    return stream
+
+
+def call_flask(environ):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured["status"], captured["headers"] = status, headers
+        return lambda data: None
+
+    result = app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return captured["status"], captured["headers"], body
+
+
+async def flask_fallback(request):
+    """Minimal WSGI bridge: runs the Flask app for every route not served above."""
+    body = await request.read()
+    host, _, port = (request.host or f"{ASYNC_HOST}:{ASYNC_PORT}").partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": request.path,
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": host,
+        "SERVER_PORT": port or ("443" if request.secure else "80"),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_TYPE": request.headers.get("Content-Type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in request.headers.items():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    status, headers, content = await run_sync(call_flask, environ)
+    code, _, reason = status.partition(" ")
+    headers = CIMultiDict((name, value) for name, value in headers
+                          if name.lower() not in ("content-length", "transfer-encoding"))
+    return web.Response(status=int(code), reason=reason or None, headers=headers, body=content)
+
+
+async def close_clients(web_app):
+    await async_client.close()
+
+
+def create_app():
+    web_app = web.Application()
+    web_app.on_cleanup.append(close_clients)
+    web_app.router.add_post("/", chat)
+    web_app.router.add_post("/chat/stream", chat_stream)
+    web_app.router.add_route("*", "/{tail:.*}", flask_fallback)
+    return web_app
+
+
+if __name__ == "__main__":
+    init_db()
+    web.run_app(create_app(), host=ASYNC_HOST, port=ASYNC_PORT)
@@ -1,8 +1,20 @@
+import asyncio
 import os
+import json
+import re
 import requests
-from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 from dotenv import load_dotenv
+from devops_client import AsyncDevOpsClient, DevOpsClient
+from backlog_view import BacklogView
+from title_index import TitleIndex
+from backlog_snapshot import BacklogSnapshot
+from backlog_store import BacklogStore
+from service_hooks import ServiceHookReceiver
+from wiql import WiqlBacklog
+from work_item import WorkItem
+from work_item_cache import WorkItemCache
 
 load_dotenv()
 
@@ -14,45 +26,168 @@ AZURE_PAT = os.getenv("AZURE_DEVOPS_PAT")      # Your Personal Access Token
 if not (AZURE_ORG and AZURE_PROJECT and AZURE_PAT):
     raise ValueError("Azure DevOps environment variables are missing.")
 
-BASE_URL = f"https://dev.azure.com/{AZURE_ORG}"
+BASE_URL = os.getenv("AZURE_DEVOPS_URL", f"https://dev.azure.com/{AZURE_ORG}")
 PROJECT_ENCODED = quote(AZURE_PROJECT)
 
-def get_work_items():
+# One pooled keep-alive session for every call below; see devops_client.DevOpsClient
+client = DevOpsClient(AZURE_PAT)
+# Same, for coroutines (async_app.py); see devops_client.AsyncDevOpsClient
+async_client = AsyncDevOpsClient(AZURE_PAT)
+
+# Azure DevOps limits: 200 IDs per work-item detail call, 20000 results per WIQL query,
+# 200 requests per $batch call
+DETAILS_BATCH_SIZE = 200
+WIQL_PAGE_SIZE = 20000
+BATCH_SIZE = 200
+FETCH_WORKERS = int(os.getenv("AZURE_DEVOPS_FETCH_WORKERS", "4"))
+BATCH_WORKERS = int(os.getenv("AZURE_DEVOPS_BATCH_WORKERS", "2"))
+# Listing queries: "auto" sends them to Azure DevOps as WIQL until the backlog cache is loaded,
+# "always" never answers them from the cache, "never" always waits for the cache
+QUERY_PUSHDOWN = os.getenv("AZURE_DEVOPS_QUERY_PUSHDOWN", "auto")
+# SQLite file through which worker processes share one backlog snapshot ("" = each fetches its own)
+WORK_ITEM_SHARED_DB = os.getenv("WORK_ITEM_SHARED_DB", "")
+# File the backlog cache is saved to and warm-started from after a restart ("" = always fetch on start)
+WORK_ITEM_SNAPSHOT = os.getenv("WORK_ITEM_SNAPSHOT", "")
+# Shared secret of the service-hook subscriptions posting to /hooks/azure-devops ("" = endpoint disabled)
+SERVICE_HOOK_SECRET = os.getenv("AZURE_DEVOPS_HOOK_SECRET", "")
+# With service hooks, seconds between the delta queries that reconcile missed events
+WORK_ITEM_RECONCILE_INTERVAL = float(os.getenv("WORK_ITEM_RECONCILE_INTERVAL", "900"))
+
+# The fields the chat actions actually read
+WORK_ITEM_FIELDS = [
+    "System.Title",
+    "System.State",
+    "System.AssignedTo",
+    "System.ChangedDate",
+    "Microsoft.VSTS.Scheduling.DueDate",
+    "Microsoft.VSTS.Scheduling.RemainingWork",
+    "Microsoft.VSTS.Scheduling.CompletedWork",
+]
+
+def _query_ids(condition: str, time_precision: bool = False):
+    """
+    Runs `SELECT [System.Id] ... WHERE <project> AND condition` and returns every matching ID.
+    Results are paged by ID so projects larger than the WIQL result limit still work.
+    """
+    params = f"$top={WIQL_PAGE_SIZE}&api-version=6.0"
+    if time_precision:
+        params = f"timePrecision=true&{params}"
+    where = f"[System.TeamProject] = '{AZURE_PROJECT}'"
+    if condition:
+        where += f" AND {condition}"
+    return _page_ids(f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/wiql?{params}",
+                     f"SELECT [System.Id] FROM WorkItems WHERE {where}")
+
+def _page_ids(wiql_url, select):
+    """
+    Runs `select` (SELECT [System.Id] FROM WorkItems WHERE ..., without
+    ORDER BY) one WIQL_PAGE_SIZE page at a time, keyed on [System.Id] > the
+    last ID seen; returns every matching ID in ID order.
+    """
+    work_item_ids, last_id = [], 0
+    while True:
+        wiql_query = {"query": f"{select} AND [System.Id] > {last_id} ORDER BY [System.Id]"}
+        response = client.post(wiql_url, json=wiql_query, coalesce=True)
+        response.raise_for_status()
+        page = [item["id"] for item in response.json().get("workItems", [])]
+        work_item_ids.extend(page)
+        if len(page) < WIQL_PAGE_SIZE:
+            return work_item_ids
+        last_id = page[-1]
+
+def get_work_items(fields=None):
     """
     Fetches all work items (by ID) from the specified Azure DevOps project.
-    In practice, you’d likely use a WIQL query to refine which work items you want.
+    Pass `fields` (e.g. WORK_ITEM_FIELDS) to download only those fields.
     """
-    wiql_query = {
-        "query": f"SELECT [System.Id] FROM WorkItems WHERE [System.TeamProject] = '{AZURE_PROJECT}'"
-    }
-    wiql_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/wiql?api-version=6.0"
-    response = requests.post(wiql_url, json=wiql_query, auth=HTTPBasicAuth('', AZURE_PAT))
+    return get_work_item_details(_query_ids(""), fields)
+
+def _fetch_details_batch(work_item_ids, fields=None):
+    batch_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitemsbatch?api-version=6.0"
+    # "omit" skips IDs deleted since the WIQL query instead of failing the whole batch
+    body = {"ids": [int(work_item_id) for work_item_id in work_item_ids], "errorPolicy": "omit"}
+    if fields:
+        body["fields"] = list(fields)
+    response = client.post(batch_url, json=body, coalesce=True)
     response.raise_for_status()
-    data = response.json()
-    work_item_ids = [str(item["id"]) for item in data.get("workItems", [])]
+    return [item for item in response.json().get("value", []) if item]
+
+def get_work_item_details(work_item_ids, fields=None):
+    """
+    Fetches the details of the given work item IDs through the workitemsbatch endpoint.
+    IDs are sent in batches of DETAILS_BATCH_SIZE, up to FETCH_WORKERS batches at a time.
+    Results keep the order of `work_item_ids`.
+    """
+    work_item_ids = list(work_item_ids)
     if not work_item_ids:
         return []
-    # Now fetch details of each work item
-    ids_str = ",".join(work_item_ids)
-    details_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems?ids={ids_str}&api-version=6.0"
-    items_resp = requests.get(details_url, auth=HTTPBasicAuth('', AZURE_PAT))
-    items_resp.raise_for_status()
-    return items_resp.json().get("value", [])
+    batches = [work_item_ids[i:i + DETAILS_BATCH_SIZE] for i in range(0, len(work_item_ids), DETAILS_BATCH_SIZE)]
+    if len(batches) == 1:
+        return _fetch_details_batch(batches[0], fields)
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(batches))) as executor:
+        results = executor.map(lambda batch: _fetch_details_batch(batch, fields), batches)
+        return [item for batch_items in results for item in batch_items]
+
+def get_work_item(work_item_id, fields=WORK_ITEM_FIELDS):
+    """One work item (REST shape), or None if it does not exist (anymore)."""
+    items = get_work_item_details([work_item_id], fields)
+    return items[0] if items else None
+
+def get_changed_work_items(since: str, fields=None):
+    """
+    Fetches the work items whose System.ChangedDate is later than `since`.
+    timePrecision=true makes WIQL compare the full timestamp instead of only the date.
+    """
+    return get_work_item_details(_query_ids(f"[System.ChangedDate] > '{since}'", time_precision=True), fields)
+
+def get_cached_work_items():
+    """
+    Returns the project's work items from the shared cache.
+    Only the first call downloads the whole project; later calls refresh
+    changed items in the background once the cache is older than WORK_ITEM_CACHE_TTL.
+    """
+    return work_item_cache.get()
+
+def get_backlog_view():
+    """
+    Returns the cached backlog's BacklogView (due date / assignee / state indexes),
+    loading or revalidating the cache the same way as get_cached_work_items().
+    """
+    work_item_cache.ensure_loaded()
+    return backlog_view
+
+def _push_down():
+    """Whether listings go to WIQL; a cold cache ("auto") also starts loading in the background meanwhile."""
+    if QUERY_PUSHDOWN == "auto" and not work_item_cache.loaded:
+        work_item_cache.load_in_background()
+        return True
+    return QUERY_PUSHDOWN == "always"
+
+def get_query_view():
+    """
+    Where listing queries are answered: the cached BacklogView, or (see
+    QUERY_PUSHDOWN) a wiql.WiqlBacklog that filters in Azure DevOps while
+    the cache is still cold and being loaded in the background.
+    """
+    return wiql_backlog if _push_down() else get_backlog_view()
 
 def query_work_items(wiql: str):
     """
-    Allows a custom WIQL query to retrieve work items.
+    Allows a custom WIQL query to retrieve work items: returns [{"id": ...}]
+    for every match, in ID order. The query is paged by ID like the full
+    loader, so its ORDER BY is replaced and its WHERE clause is bracketed.
     """
-    wiql_query = {"query": wiql}
-    wiql_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/wiql?api-version=6.0"
-    response = requests.post(wiql_url, json=wiql_query, auth=HTTPBasicAuth('', AZURE_PAT))
-    response.raise_for_status()
-    data = response.json()
-    return data.get("workItems", [])
+    select = re.split(r"\s+ORDER\s+BY\s+", wiql.strip(), flags=re.IGNORECASE)[0]
+    match = re.match(r"(.*?)\s+WHERE\s+(.*)", select, re.IGNORECASE | re.DOTALL)
+    head, where = match.groups() if match else (select, "[System.Id] > 0")
+    wiql_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/wiql?$top={WIQL_PAGE_SIZE}&api-version=6.0"
+    return [{"id": work_item_id} for work_item_id in _page_ids(wiql_url, f"{head} WHERE ({where})")]
 
-def create_work_item(title: str, description: str, assignee: str = None, due_date: str = None, status: str = "To Do"):
-    create_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/$Task?api-version=6.0"
-    headers = {"Content-Type": "application/json-patch+json"}
+def query_work_item_details(wiql: str, fields=WORK_ITEM_FIELDS):
+    """Runs a WIQL query (see query_work_items) and fetches the matching work items (only `fields`), by ID."""
+    return get_work_item_details([item["id"] for item in query_work_items(wiql)], fields)
+
+def _create_patch_document(title, description, assignee=None, due_date=None, status="To Do"):
     patch_document = [
         {"op": "add", "path": "/fields/System.Title", "value": title},
         {"op": "add", "path": "/fields/System.Description", "value": description},
@@ -66,10 +201,18 @@ def create_work_item(title: str, description: str, assignee: str = None, due_dat
     if due_date:
         due_date_iso = f"{due_date}T00:00:00Z"
         patch_document.append({"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.DueDate", "value": due_date_iso})
+    return patch_document
 
-    response = requests.patch(create_url, json=patch_document, headers=headers, auth=HTTPBasicAuth('', AZURE_PAT))
+def create_work_item(title: str, description: str, assignee: str = None, due_date: str = None, status: str = "To Do"):
+    create_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/$Task?api-version=6.0"
+    headers = {"Content-Type": "application/json-patch+json"}
+    patch_document = _create_patch_document(title, description, assignee, due_date, status)
+    # Not retried by the client on an ambiguous 503; the job queue's create_task policy decides
+    response = client.patch(create_url, json=patch_document, headers=headers, idempotent=False)
     response.raise_for_status()
-    return response.json().get("id")
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item.get("id")
 
 def update_task_assignment(work_item_id: int, assignee: str):
     """
@@ -78,9 +221,23 @@ def update_task_assignment(work_item_id: int, assignee: str):
     update_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
     headers = {"Content-Type": "application/json-patch+json"}
     patch_document = [{"op": "add", "path": "/fields/System.AssignedTo", "value": assignee}]
-    response = requests.patch(update_url, json=patch_document, headers=headers, auth=HTTPBasicAuth('', AZURE_PAT))
+    response = client.patch(update_url, json=patch_document, headers=headers)
     response.raise_for_status()
-    return response.json()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
+
+def _time_patch_documents(time_spent, time_remaining):
+    """The 'replace' patch tried first by update_time_fields and its 'add' fallback."""
+    replace_document = [
+        {"op": "replace", "path": "/fields/Microsoft.VSTS.Scheduling.TimeSpent", "value": time_spent},
+        {"op": "replace", "path": "/fields/Microsoft.VSTS.Scheduling.RemainingWork", "value": time_remaining}
+    ]
+    add_document = [
+        {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.CompletedWork", "value": time_spent},
+        {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.RemainingWork", "value": time_remaining}
+    ]
+    return replace_document, add_document
 
 def update_time_fields(work_item_id, time_spent, time_remaining):
     """
@@ -90,32 +247,18 @@ def update_time_fields(work_item_id, time_spent, time_remaining):
       - Microsoft.VSTS.Scheduling.RemainingWork (time remaining)
     It first attempts a 'replace' operation and, if that fails, falls back to 'add'.
     """
-    AZURE_ORG = os.getenv("AZURE_DEVOPS_ORG")
-    AZURE_PROJECT = os.getenv("AZURE_DEVOPS_PROJECT")
-    AZURE_PAT = os.getenv("AZURE_DEVOPS_PAT")
-    if not (AZURE_ORG and AZURE_PROJECT and AZURE_PAT):
-        raise ValueError("Missing Azure DevOps environment variables.")
-    base_url = f"https://dev.azure.com/{AZURE_ORG}"
-    project_encoded = quote(AZURE_PROJECT)
-    update_url = f"{base_url}/{project_encoded}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
+    update_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
     headers = {"Content-Type": "application/json-patch+json"}
-    patch_document = [
-        {"op": "replace", "path": "/fields/Microsoft.VSTS.Scheduling.TimeSpent", "value": time_spent},
-        {"op": "replace", "path": "/fields/Microsoft.VSTS.Scheduling.RemainingWork", "value": time_remaining}
-    ]
+    replace_document, add_document = _time_patch_documents(time_spent, time_remaining)
     try:
-        response = requests.patch(update_url, json=patch_document, headers=headers,
-                                  auth=HTTPBasicAuth('', AZURE_PAT))
+        response = client.patch(update_url, json=replace_document, headers=headers)
         response.raise_for_status()
     except requests.exceptions.HTTPError:
-        patch_document = [
-            {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.CompletedWork", "value": time_spent},
-            {"op": "add", "path": "/fields/Microsoft.VSTS.Scheduling.RemainingWork", "value": time_remaining}
-        ]
-        response = requests.patch(update_url, json=patch_document, headers=headers,
-                                  auth=HTTPBasicAuth('', AZURE_PAT))
+        response = client.patch(update_url, json=add_document, headers=headers)
         response.raise_for_status()
-    return response.json()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
 
 def update_task_status(work_item_id: int, status: str):
     update_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
@@ -123,12 +266,202 @@ def update_task_status(work_item_id: int, status: str):
     patch_document = [
         {"op": "add", "path": "/fields/System.State", "value": status}
     ]
-    response = requests.patch(update_url, json=patch_document, headers=headers, auth=HTTPBasicAuth('', AZURE_PAT))
+    response = client.patch(update_url, json=patch_document, headers=headers)
     response.raise_for_status()
-    return response.json()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
 
 def delete_work_item(work_item_id):
     delete_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
-    response = requests.delete(delete_url, auth=HTTPBasicAuth('', AZURE_PAT))
+    response = client.delete(delete_url)
+    response.raise_for_status()
+    work_item_cache.remove(work_item_id)
+    return True
+
+def _send_batch(requests_chunk):
+    batch_url = f"{BASE_URL}/_apis/wit/$batch?api-version=4.1"
+    response = client.post(batch_url, json=requests_chunk)
+    response.raise_for_status()
+    return response.json().get("value", [])
+
+def batch_update_work_items(updates):
+    """
+    Applies many JSON-patch updates through the /_apis/wit/$batch endpoint.
+    `updates` is a list of (work_item_id, rev, patch_document). Each patch is
+    prefixed with a `test /rev` op, so an item changed by someone else since
+    `rev` is rejected instead of overwritten. Requests are sent in chunks of
+    BATCH_SIZE, up to BATCH_WORKERS chunks at a time.
+
+    Returns one {"id", "ok", "status", "error", "item"} dict per update, in order.
+    Updates missing from a $batch reply are reported as failed (status None).
+    """
+    requests_list = [
+        {
+            "method": "PATCH",
+            "uri": f"/_apis/wit/workitems/{work_item_id}?api-version=4.1",
+            "headers": {"Content-Type": "application/json-patch+json"},
+            "body": [{"op": "test", "path": "/rev", "value": rev}] + list(patch_document),
+        }
+        for work_item_id, rev, patch_document in updates
+    ]
+    chunks = [requests_list[i:i + BATCH_SIZE] for i in range(0, len(requests_list), BATCH_SIZE)]
+    if not chunks:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(chunks))) as executor:
+        replies = list(executor.map(_send_batch, chunks))
+
+    results = []
+    for n, (work_item_id, _, _) in enumerate(updates):
+        # Responses are matched to requests per chunk, so a short reply cannot shift later chunks
+        chunk_responses = replies[n // BATCH_SIZE]
+        if n % BATCH_SIZE >= len(chunk_responses):
+            results.append({"id": int(work_item_id), "ok": False, "status": None,
+                            "error": "no response in the $batch reply", "item": None})
+            continue
+        response = chunk_responses[n % BATCH_SIZE]
+        status = response.get("code", 0)
+        try:
+            body = json.loads(response.get("body") or "{}")
+        except ValueError:
+            body = {"message": response.get("body")}
+        ok = 200 <= status < 300
+        if ok:
+            work_item_cache.upsert(body)
+        results.append({
+            "id": int(work_item_id),
+            "ok": ok,
+            "status": status,
+            "error": None if ok else body.get("message", f"HTTP {status}"),
+            "item": body if ok else None,
+        })
+    return results
+
+# --- asyncio variants for the async chat server (async_app.py); same behaviour as the functions above ---
+
+async def _query_ids_async(condition: str):
+    wiql_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/wiql?$top={WIQL_PAGE_SIZE}&api-version=6.0"
+    where = f"[System.TeamProject] = '{AZURE_PROJECT}'"
+    if condition:
+        where += f" AND {condition}"
+    work_item_ids, last_id = [], 0
+    while True:
+        wiql_query = {
+            "query": f"SELECT [System.Id] FROM WorkItems WHERE {where} AND [System.Id] > {last_id} ORDER BY [System.Id]"
+        }
+        response = await async_client.post(wiql_url, json=wiql_query, coalesce=True)
+        response.raise_for_status()
+        page = [item["id"] for item in response.json().get("workItems", [])]
+        work_item_ids.extend(page)
+        if len(page) < WIQL_PAGE_SIZE:
+            return work_item_ids
+        last_id = page[-1]
+
+async def _fetch_details_batch_async(work_item_ids, fields=None):
+    batch_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitemsbatch?api-version=6.0"
+    body = {"ids": [int(work_item_id) for work_item_id in work_item_ids], "errorPolicy": "omit"}
+    if fields:
+        body["fields"] = list(fields)
+    response = await async_client.post(batch_url, json=body, coalesce=True)
+    response.raise_for_status()
+    return [item for item in response.json().get("value", []) if item]
+
+async def get_work_item_details_async(work_item_ids, fields=None):
+    """Like get_work_item_details; at most FETCH_WORKERS batches are in flight at once."""
+    work_item_ids = list(work_item_ids)
+    batches = [work_item_ids[i:i + DETAILS_BATCH_SIZE] for i in range(0, len(work_item_ids), DETAILS_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(FETCH_WORKERS)
+
+    async def fetch(batch):
+        async with semaphore:
+            return await _fetch_details_batch_async(batch, fields)
+
+    results = await asyncio.gather(*(fetch(batch) for batch in batches))
+    return [item for batch_items in results for item in batch_items]
+
+async def get_work_items_async(fields=None):
+    return await get_work_item_details_async(await _query_ids_async(""), fields)
+
+async def get_backlog_view_async():
+    """
+    get_backlog_view() for coroutines. Once the cache is loaded this returns
+    immediately (revalidation runs in the cache's own thread); only the very
+    first load is handed to a thread so it does not block the event loop.
+    """
+    if work_item_cache.refreshed_at is None:
+        return await asyncio.to_thread(get_backlog_view)
+    return get_backlog_view()
+
+async def get_query_view_async():
+    # WiqlBacklog queries run in the thread that executes the (sync) listing handler
+    return wiql_backlog if _push_down() else await get_backlog_view_async()
+
+async def get_cached_work_items_async():
+    if work_item_cache.refreshed_at is None:
+        return await asyncio.to_thread(get_cached_work_items)
+    return get_cached_work_items()
+
+async def _patch_work_item_async(work_item_id, patch_document):
+    update_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
+    headers = {"Content-Type": "application/json-patch+json"}
+    return await async_client.patch(update_url, json=patch_document, headers=headers)
+
+async def create_work_item_async(title: str, description: str, assignee: str = None, due_date: str = None,
+                                 status: str = "To Do"):
+    create_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/$Task?api-version=6.0"
+    headers = {"Content-Type": "application/json-patch+json"}
+    patch_document = _create_patch_document(title, description, assignee, due_date, status)
+    response = await async_client.patch(create_url, json=patch_document, headers=headers, idempotent=False)
+    response.raise_for_status()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item.get("id")
+
+async def update_task_assignment_async(work_item_id: int, assignee: str):
+    response = await _patch_work_item_async(
+        work_item_id, [{"op": "add", "path": "/fields/System.AssignedTo", "value": assignee}])
+    response.raise_for_status()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
+
+async def update_time_fields_async(work_item_id, time_spent, time_remaining):
+    replace_document, add_document = _time_patch_documents(time_spent, time_remaining)
+    try:
+        response = await _patch_work_item_async(work_item_id, replace_document)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response = await _patch_work_item_async(work_item_id, add_document)
+        response.raise_for_status()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
+
+async def update_task_status_async(work_item_id: int, status: str):
+    response = await _patch_work_item_async(work_item_id, [{"op": "add", "path": "/fields/System.State", "value": status}])
+    response.raise_for_status()
+    work_item = response.json()
+    work_item_cache.upsert(work_item)
+    return work_item
+
+async def delete_work_item_async(work_item_id):
+    delete_url = f"{BASE_URL}/{PROJECT_ENCODED}/_apis/wit/workitems/{work_item_id}?api-version=6.0"
+    response = await async_client.delete(delete_url)
     response.raise_for_status()
-    return True 
\ No newline at end of file
+    work_item_cache.remove(work_item_id)
+    return True
+
+# Shared by every request in this process; see work_item_cache.WorkItemCache
+title_index = TitleIndex()
+backlog_view = BacklogView()
+work_item_cache = WorkItemCache(
+    lambda: get_work_items(WORK_ITEM_FIELDS),
+    lambda since: get_changed_work_items(since, WORK_ITEM_FIELDS),
+    indexes=[title_index, backlog_view],
+    store=BacklogStore(WORK_ITEM_SHARED_DB) if WORK_ITEM_SHARED_DB else None,
+    sync_interval=WORK_ITEM_RECONCILE_INTERVAL if SERVICE_HOOK_SECRET else None,
+    snapshot=BacklogSnapshot(WORK_ITEM_SNAPSHOT, f"{BASE_URL}/{AZURE_PROJECT}") if WORK_ITEM_SNAPSHOT else None,
+)
+hook_receiver = ServiceHookReceiver(work_item_cache, get_work_item, AZURE_PROJECT, SERVICE_HOOK_SECRET)
+wiql_backlog = WiqlBacklog(lambda wiql: [WorkItem.from_json(item) for item in query_work_item_details(wiql)],
+                           AZURE_PROJECT)
@@ -0,0 +1,179 @@
+"""
+On-disk snapshot of the cached backlog for fast restarts.
+
+Without it a restarted worker downloads the whole project again before it
+can answer. WorkItemCache writes its items to a compact columnar file after
+refreshes that changed something; on a cold start it loads the file and
+only asks Azure DevOps for what changed since the saved watermark.
+
+File layout (little-endian):
+
+  header   magic b"WIBACKLG", FORMAT_VERSION (uint16), meta length and
+           CRC-32 of everything after the header (uint32 each)
+  meta     JSON: item and string counts, watermark, full sync time, store
+           version, source (organization/project) and the WorkItem slots
+  strings  the distinct strings as one UTF-8 text, then their end offsets
+  columns  one array per WorkItem slot: id, rev and due as int64 (due 0 =
+           none), remaining and completed as float64 (NaN = none), the
+           string slots as int32 string numbers (-1 = none)
+
+Numbers are read with array.frombytes and strings are decoded once, so a
+load costs little more than creating the WorkItem records. Files are
+written to a temporary name and renamed over the old one, so readers never
+see a partial snapshot.
+"""
+import gc
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+from work_item import WorkItem
+
+MAGIC = b"WIBACKLG"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHII")
+
+INT_SLOTS = ("id", "rev", "due")
+FLOAT_SLOTS = ("remaining", "completed")
+STRING_SLOTS = ("title", "state", "assignee", "assignee_name", "changed")
+COLUMNS = [(slot, "q") for slot in INT_SLOTS] + [(slot, "d") for slot in FLOAT_SLOTS] + \
+          [(slot, "i") for slot in STRING_SLOTS]
+
+# full_synced_at and saved_at are wall-clock times; version is the BacklogStore version the items match
+Snapshot = namedtuple("Snapshot", "items watermark full_synced_at version saved_at")
+
+
+class SnapshotError(Exception):
+    """The file is truncated, corrupt, from another format version or for another project."""
+
+
+def _to_disk(column):
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode(items, watermark, full_synced_at=None, version=0, source=""):
+    """The snapshot file's bytes for `items` (work_item.WorkItem)."""
+    strings, numbers = [], {}
+
+    def number(value):
+        if value is None:
+            return -1
+        n = numbers.get(value)
+        if n is None:
+            n = numbers[value] = len(strings)
+            strings.append(value)
+        return n
+
+    columns = []
+    for slot, typecode in COLUMNS:
+        values = (getattr(item, slot) for item in items)
+        if slot == "due":
+            values = (value or 0 for value in values)
+        elif typecode == "d":
+            values = (float("nan") if value is None else value for value in values)
+        elif typecode == "i":
+            values = map(number, values)
+        columns.append(_to_disk(array(typecode, values)))
+    text = "".join(strings).encode("utf-8", "surrogatepass")
+    meta = json.dumps({
+        "count": len(items), "strings": len(strings), "text_bytes": len(text), "watermark": watermark,
+        "full_synced_at": full_synced_at, "version": version, "source": source, "saved_at": time.time(),
+        "slots": list(WorkItem.__slots__),
+    }).encode()
+    body = b"".join([meta, text, _to_disk(array("q", accumulate(map(len, strings)))), *columns])
+    return HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), zlib.crc32(body)) + body
+
+
+def decode(data, source=""):
+    """Snapshot from encode()'s bytes; raises SnapshotError when they can't be used."""
+    if len(data) < HEADER.size:
+        raise SnapshotError("truncated header")
+    magic, format_version, meta_length, checksum = HEADER.unpack_from(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotError(f"not a version {FORMAT_VERSION} backlog snapshot")
+    view = memoryview(data)[HEADER.size:]
+    if zlib.crc32(view) != checksum:
+        raise SnapshotError("checksum mismatch")
+    meta = json.loads(bytes(view[:meta_length]))
+    if meta["source"] != source or meta["slots"] != list(WorkItem.__slots__):
+        raise SnapshotError("snapshot of another project or work-item layout")
+    offset = meta_length + meta["text_bytes"]
+    text = bytes(view[meta_length:offset]).decode("utf-8", "surrogatepass")
+
+    def read(typecode, count):
+        nonlocal offset
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(view[offset:offset + size])
+        if sys.byteorder == "big":
+            column.byteswap()
+        offset += size
+        return column
+
+    ends = read("q", meta["strings"])
+    # A trailing None, so string number -1 reads as None
+    strings = [text[start:end] for start, end in zip([0, *ends], ends)] + [None]
+    count = meta["count"]
+    columns = {slot: read(typecode, count) for slot, typecode in COLUMNS}
+    if offset != len(view):
+        raise SnapshotError("unexpected length")
+    for slot in STRING_SLOTS:
+        columns[slot] = [strings[n] for n in columns[slot]]
+    for slot in FLOAT_SLOTS:
+        columns[slot] = [None if value != value else value for value in columns[slot]]
+    columns["due"] = [value or None for value in columns["due"]]
+    # The cyclic GC would otherwise scan the growing heap many times while the records are created
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        items = list(map(WorkItem, *(columns[slot] for slot in WorkItem.__slots__)))
+    finally:
+        if collecting:
+            gc.enable()
+    return Snapshot(items, meta["watermark"], meta["full_synced_at"], meta["version"], meta["saved_at"])
+
+
+class BacklogSnapshot:
+    """
+    The snapshot file at `path`, for the backlog of `source` (e.g. the
+    organization URL and project): a file written for another source is
+    not loaded.
+    """
+
+    def __init__(self, path, source=""):
+        self.path = path
+        self.source = source
+
+    def load(self):
+        """The saved Snapshot, or None when there is no file. Raises SnapshotError for unusable files."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return decode(data, self.source)
+
+    def save(self, items, watermark, full_synced_at=None, version=0):
+        """Atomically replaces the file with a snapshot of `items`."""
+        data = encode(items, watermark, full_synced_at, version, self.source)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(prefix=".backlog-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
@@ -0,0 +1,195 @@
+"""
+Backlog snapshot shared by the worker processes of one deployment.
+
+With several workers (gunicorn, uwsgi, ...) each process keeps its own
+WorkItemCache. Backed by a BacklogStore, only one of them fetches from Azure
+DevOps per refresh: it takes a lease, loads the items and publishes them to
+a SQLite (WAL) table under a new version number. The other workers copy the
+rows changed since the version they hold instead of calling Azure DevOps.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from work_item import WorkItem
+
+# Seconds a worker may hold the refresh lease before another one takes over
+WORK_ITEM_LEASE_TIMEOUT = float(os.getenv("WORK_ITEM_LEASE_TIMEOUT", "120"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_item (
+    id INTEGER PRIMARY KEY,
+    rev INTEGER NOT NULL,
+    data TEXT,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_work_item_version ON work_item (version);
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    full_version INTEGER NOT NULL,
+    watermark TEXT,
+    refreshed_at REAL,
+    full_synced_at REAL,
+    lease_owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO snapshot (id, version, full_version) VALUES (1, 0, 0);
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+# refreshed_at / full_synced_at are wall-clock times of the last publish and full publish
+SnapshotState = namedtuple("SnapshotState", "version full_version watermark refreshed_at full_synced_at")
+
+
+class BacklogStore:
+    """
+    Versioned work items (work_item.WorkItem rows) in SQLite. Each
+    publish() bumps the version and stamps the rows it writes with it; a
+    full publish replaces all rows, so a reader older than `full_version`
+    has to reload everything. Deletions are kept as rows without data until
+    the next full publish.
+    """
+
+    def __init__(self, path, lease_timeout=WORK_ITEM_LEASE_TIMEOUT):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    @property
+    def owner(self):
+        # Per process, also for workers forked from a master that imported the app
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _state(self, conn):
+        row = conn.execute("SELECT version, full_version, watermark, refreshed_at, full_synced_at "
+                           "FROM snapshot WHERE id = 1").fetchone()
+        return SnapshotState(*row)
+
+    def state(self):
+        return self._state(self._connect())
+
+    def acquire_lease(self):
+        """Claims the right to refresh from Azure DevOps; False while another worker holds it."""
+        conn = self._connect()
+        now = time.time()
+        cursor = conn.execute("UPDATE snapshot SET lease_owner = ?, lease_until = ? "
+                              "WHERE id = 1 AND (lease_until < ? OR lease_owner = ?)",
+                              (self.owner, now + self.lease_timeout, now, self.owner))
+        return cursor.rowcount == 1
+
+    def release_lease(self):
+        self._connect().execute("UPDATE snapshot SET lease_owner = NULL, lease_until = 0 "
+                                "WHERE id = 1 AND lease_owner = ?", (self.owner,))
+
+    def claim(self, name, seconds):
+        """
+        Claims or renews the lease `name` (other periodic work than the
+        refresh, e.g. "digests") for `seconds`; False while another worker
+        holds it.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR IGNORE INTO lease (name) VALUES (?)", (name,))
+        cursor = conn.execute("UPDATE lease SET owner = ?, lease_until = ? "
+                              "WHERE name = ? AND (lease_until < ? OR owner = ?)",
+                              (self.owner, now + seconds, name, now, self.owner))
+        return cursor.rowcount == 1
+
+    def release(self, name):
+        self._connect().execute("UPDATE lease SET owner = NULL, lease_until = 0 WHERE name = ? AND owner = ?",
+                                (name, self.owner))
+
+    def publish(self, items, watermark, full=False):
+        """Stores items fetched from Azure DevOps (all of them when full) as a new version."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = self._state(conn).version + 1
+            if full:
+                conn.execute("DELETE FROM work_item")
+            conn.executemany("INSERT OR REPLACE INTO work_item (id, rev, data, version) VALUES (?, ?, ?, ?)",
+                             ((item.id, item.rev, json.dumps(item.to_row()), version) for item in items))
+            if full:
+                conn.execute("UPDATE snapshot SET version = ?, full_version = ?, watermark = ?, refreshed_at = ?, "
+                             "full_synced_at = ? WHERE id = 1", (version, version, watermark, now, now))
+            else:
+                conn.execute("UPDATE snapshot SET version = ?, watermark = ?, refreshed_at = ? WHERE id = 1",
+                             (version, watermark, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def put(self, item=None, deleted_id=None, rev=0):
+        """
+        Shares a local write (the item a write call returned, or a deleted
+        id and its last revision) with the other workers without touching the
+        watermark. Items older than the stored row are not written.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = self._state(conn).version + 1
+            if item is not None:
+                conn.execute("INSERT INTO work_item (id, rev, data, version) VALUES (?, ?, ?, ?) "
+                             "ON CONFLICT (id) DO UPDATE SET rev = excluded.rev, data = excluded.data, "
+                             "version = excluded.version WHERE excluded.rev >= work_item.rev",
+                             (item.id, item.rev, json.dumps(item.to_row()), version))
+            else:
+                conn.execute("INSERT OR REPLACE INTO work_item (id, rev, data, version) VALUES (?, ?, NULL, ?)",
+                             (int(deleted_id), rev, version))
+            conn.execute("UPDATE snapshot SET version = ? WHERE id = 1", (version,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def changes_since(self, version):
+        """
+        Returns (state, full, items, deleted ids) for a reader holding
+        `version`: every item when a full publish happened since (full=True),
+        otherwise the items written and deleted after it. Read in one
+        transaction, so the rows match the state.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            state = self._state(conn)
+            full = state.full_version > version
+            rows = conn.execute("SELECT id, data FROM work_item WHERE version > ?",
+                                (0 if full else version,)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        items = [WorkItem.from_row(json.loads(data)) for _, data in rows if data is not None]
+        deleted = [work_item_id for work_item_id, data in rows if data is None]
+        return state, full, items, deleted
+
+    def wait_for(self, version, timeout):
+        """Polls until the snapshot is newer than `version`; returns whether it is."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.state().version > version:
+                return True
+            time.sleep(0.05)
+        return False
@@ -0,0 +1,165 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date
+
+
+def assignee_key(value):
+    """
+    Normalizes an assignee to a lowercase email for bucketing.
+    Accepts the System.AssignedTo identity dict, "Display Name <email>" or a bare email.
+    """
+    if isinstance(value, dict):
+        value = value.get("uniqueName") or value.get("displayName") or ""
+    value = str(value or "").strip()
+    match = re.search(r"<([^>]+)>", value)
+    return (match.group(1) if match else value).strip().lower()
+
+
+def assignee_name(value):
+    """Display name of an assignee, falling back to the email."""
+    if isinstance(value, dict):
+        return value.get("displayName") or value.get("uniqueName") or ""
+    value = str(value or "").strip()
+    return re.sub(r"\s*<[^>]*>", "", value) or value
+
+
+def due_ordinal(item):
+    """Microsoft.VSTS.Scheduling.DueDate as a date ordinal, or None when missing or invalid."""
+    value = item.get("fields", {}).get("Microsoft.VSTS.Scheduling.DueDate")
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class BacklogView:
+    """
+    Query-ready indexes over the cached backlog.
+
+    Due dates are parsed once and kept sorted as (ordinal, id) pairs, overall
+    and per assignee, so "due within N days" is a bisect; items are also
+    bucketed by assignee email and lowercase state. Queries therefore cost the
+    size of their result instead of a scan. Kept current by WorkItemCache
+    through rebuild/add/remove, with work_item.WorkItem items.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._items = {}
+        self._by_due = []
+        self._by_assignee_due = defaultdict(list)
+        self._by_assignee = defaultdict(set)
+        self._by_state = defaultdict(set)
+        self._names = {}  # assignee key -> display name
+
+    def __len__(self):
+        return len(self._items)
+
+    def rebuild(self, items):
+        with self._lock:
+            self._reset()
+            for item in items:
+                self._add(item)
+
+    def add(self, item):
+        with self._lock:
+            self._remove(item.id)
+            self._add(item)
+
+    def remove(self, work_item_id):
+        with self._lock:
+            self._remove(int(work_item_id))
+
+    def _add(self, item):
+        work_item_id, due, assignee, state = item.id, item.due, item.assignee, (item.state or "").lower()
+        self._items[work_item_id] = item
+        if due is not None:
+            insort(self._by_due, (due, work_item_id))
+            insort(self._by_assignee_due[assignee], (due, work_item_id))
+        self._by_assignee[assignee].add(work_item_id)
+        self._by_state[state].add(work_item_id)
+        if assignee:
+            self._names[assignee] = item.assignee_name
+
+    def _remove(self, work_item_id):
+        item = self._items.pop(work_item_id, None)
+        if item is None:
+            return
+        due, assignee, state = item.due, item.assignee, (item.state or "").lower()
+        if due is not None:
+            for entries in (self._by_due, self._by_assignee_due[assignee]):
+                position = bisect_left(entries, (due, work_item_id))
+                if position < len(entries) and entries[position] == (due, work_item_id):
+                    del entries[position]
+        self._by_assignee[assignee].discard(work_item_id)
+        self._by_state[state].discard(work_item_id)
+
+    def get(self, work_item_id):
+        return self._items.get(int(work_item_id))
+
+    def due_before(self, last_day, assignee=None):
+        """
+        Returns [(item, days_remaining)] for items due on or before `last_day`
+        (a date), earliest first, optionally only those assigned to `assignee`.
+        """
+        today = date.today().toordinal()
+        with self._lock:
+            entries = self._by_due if assignee is None else self._by_assignee_due.get(assignee_key(assignee), [])
+            end = bisect_right(entries, (last_day.toordinal(), float("inf")))
+            return [(self._items[work_item_id], due - today) for due, work_item_id in entries[:end]]
+
+    def assigned_to(self, assignee):
+        """Items assigned to the given email / "Name <email>", by ID."""
+        with self._lock:
+            return [self._items[n] for n in sorted(self._by_assignee.get(assignee_key(assignee), ()))]
+
+    def find_assignees(self, name):
+        """
+        Assignee keys matching `name`: an exact email or display name, else
+        those whose name has all its words, else those with words starting with them.
+        """
+        key = assignee_key(name)
+        words = re.findall(r"[a-z0-9]+", key)
+        if not words:
+            return []
+        with self._lock:
+            assignees = {assignee: self._names.get(assignee, "").lower()
+                         for assignee, ids in self._by_assignee.items() if ids and assignee}
+            if key in assignees:
+                return [key]
+            tokens = {assignee: re.findall(r"[a-z0-9]+", f"{display} {assignee.split('@')[0]}")
+                      for assignee, display in assignees.items()}
+            for matches in (
+                lambda a: assignees[a] == key,
+                lambda a: all(word in tokens[a] for word in words),
+                lambda a: all(any(token.startswith(word) for token in tokens[a]) for word in words),
+            ):
+                found = sorted(a for a in assignees if matches(a))
+                if found:
+                    return found
+            return []
+
+    def display_name(self, assignee):
+        with self._lock:
+            return self._names.get(assignee_key(assignee)) or assignee
+
+    def in_states(self, states):
+        """Items whose state is one of `states` (case-insensitive), by ID."""
+        wanted = {state.lower() for state in states}
+        with self._lock:
+            ids = set().union(*(self._by_state.get(state, ()) for state in wanted))
+            return [self._items[n] for n in sorted(ids)]
+
+    def not_in_states(self, states):
+        """Items whose state is not one of `states` (case-insensitive), by ID."""
+        excluded = {state.lower() for state in states}
+        with self._lock:
+            ids = set().union(*(ids for state, ids in self._by_state.items() if state not in excluded))
+            return [self._items[n] for n in sorted(ids)]
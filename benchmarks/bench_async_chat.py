@@ -0,0 +1,194 @@
+"""
+Load test: chat requests per second for one worker, Flask (sync) vs async_app.
+
+Starts the Azure DevOps stub (stub_devops.py) and a fake OpenAI with fixed
+latencies, then has `--users` concurrent users post a mix of chat messages
+(small talk, a status update, a backlog listing, a question only GPT can
+classify) for `--duration` seconds against:
+
+  sync      app.py on one single-threaded WSGI server (a gunicorn sync worker)
+  threaded  app.py on werkzeug's thread-per-request server
+  async     async_app.py on one aiohttp event loop
+
+    python benchmarks/bench_async_chat.py --users 50 --devops-latency 0.3 --llm-latency 0.8
+
+Uses a throwaway SQLite database; nothing is sent to Azure DevOps or OpenAI.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+from stub_devops import PROJECT, StubDevOps  # noqa: E402
+
+MESSAGES = [
+    "hello",
+    "mark {title} as In Progress",
+    "show my tasks",
+    "what should I focus on this week",
+]
+
+
+def install_fake_openai(latency):
+    import openai
+
+    def reply(kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        content = json.dumps({"action": "smalltalk", "parameters": {}}) if "Classify this user message" in prompt \
+            else "Sure, happy to help with that."
+        return {"choices": [{"message": {"content": content}}]}
+
+    def chunks(text):
+        return [{"choices": [{"delta": {"content": word + " "}}]} for word in text.split()]
+
+    def create(**kwargs):
+        time.sleep(latency)
+        result = reply(kwargs)
+        return iter(chunks(result["choices"][0]["message"]["content"])) if kwargs.get("stream") else result
+
+    async def acreate(**kwargs):
+        await asyncio.sleep(latency)
+        result = reply(kwargs)
+        if not kwargs.get("stream"):
+            return result
+
+        async def stream():
+            for chunk in chunks(result["choices"][0]["message"]["content"]):
+                yield chunk
+        return stream()
+
+    openai.ChatCompletion.create = staticmethod(create)
+    openai.ChatCompletion.acreate = staticmethod(acreate)
+
+
+def serve_wsgi(app, port, threaded):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", port, app, threaded=threaded)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def serve_async(web_app, port):
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(web_app)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    return stop
+
+
+async def load(base_url, cookie, users, duration, titles):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    messages = itertools.cycle(MESSAGES)
+    titles = itertools.cycle(titles)
+
+    async def user(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            message = next(messages).format(title=next(titles))
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{base_url}/", data={"message": message}) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, cookies={"session": cookie}) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(session) for _ in range(users)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--devops-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--modes", default="sync,threaded,async")
+    args = parser.parse_args()
+
+    stub = StubDevOps(args.items, latency=args.devops_latency)
+    stub_url = stub.start()
+    database = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    os.environ.update({
+        "AZURE_DEVOPS_ORG": "bench", "AZURE_DEVOPS_PROJECT": PROJECT, "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": stub_url, "SECRET_KEY": "bench", "DATABASE_URL": f"sqlite:///{database}",
+        "OPENAI_API_KEY": "bench", "DIGEST_INTERVAL": "0",
+    })
+    install_fake_openai(args.llm_latency)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    import app as flask_app
+    import async_app
+
+    flask_app.init_db()
+    with flask_app.app.app_context():
+        user = flask_app.User(username="bench", email="bench@example.com",
+                              azure_devops_email="User 1 <user1@example.com>")
+        user.set_password("bench")
+        flask_app.db.session.add(user)
+        flask_app.db.session.commit()
+    client = flask_app.app.test_client()
+    client.post("/login", data={"email": "bench@example.com", "password": "bench"})
+    cookie = client.get_cookie("session").value
+    flask_app.get_backlog_view()  # warm the shared backlog cache for every mode
+    titles = [item["fields"]["System.Title"] for item in list(stub.items.values())[:50]]
+
+    print(f"{args.users} users, {args.duration:.0f}s per mode, Azure DevOps {args.devops_latency * 1000:.0f} ms, "
+          f"OpenAI {args.llm_latency * 1000:.0f} ms, backlog {args.items} items")
+    for port, mode in enumerate(args.modes.split(","), start=5301):
+        if mode == "async":
+            stop = serve_async(async_app.create_app(), port)
+        else:
+            stop = serve_wsgi(flask_app.app, port, threaded=mode == "threaded")
+        stub.reset_stats()
+        latencies, errors, elapsed = asyncio.run(load(f"http://127.0.0.1:{port}", cookie, args.users,
+                                                      args.duration, titles))
+        stop()
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+        print(f"  {mode:<9} {len(latencies) / elapsed:7.1f} req/s  p50 {p50:7.0f} ms  p95 {p95:7.0f} ms  "
+              f"errors {errors}  upstream calls {stub.totals().get('requests', 0)}")
+    stub.stop()
+    os.unlink(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Burst benchmark: N users send a chat message at the same instant, right
+after a restart (cold backlog and reply caches), with Azure DevOps and
+OpenAI replaced by rate-limited local stubs (stub_devops.py, stub_openai.py).
+Most of the messages are the same few questions, as after a stand-up.
+
+Each configuration runs in a fresh interpreter:
+
+  baseline  no coalescing, no concurrency limits
+  coalesce  identical calls in flight are shared (flow_control.SingleFlight)
+  limits    coalescing plus the per-upstream concurrency limits
+            (AZURE_DEVOPS_MAX_CONCURRENCY / OPENAI_MAX_CONCURRENCY and the
+            matching queue settings)
+
+Reports reply latency, "busy" replies, upstream calls and 429s.
+
+    python benchmarks/bench_burst.py --users 50 --items 5000
+    python benchmarks/bench_burst.py --devops-rate-limit 20 --llm-rate-limit 5 --openai-concurrency 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from stub_devops import PEOPLE, PROJECT, StubDevOps  # noqa: E402
+from stub_openai import StubOpenAI  # noqa: E402
+
+# A few questions most people ask, plus one only the LLM can classify
+MESSAGES = ["show pending tasks", "summarize tasks", "show high priority tasks", "how is the release looking?"]
+CONFIGS = ["baseline", "coalesce", "limits"]
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))] if sorted_samples else 0.0
+
+
+def run(config, args, results):
+    devops = StubDevOps(args.items, latency=args.devops_latency, rate_limit=args.devops_rate_limit)
+    openai_stub = StubOpenAI(latency=args.llm_latency, rate_limit=args.llm_rate_limit)
+    workdir = tempfile.mkdtemp(prefix="bench-burst-")
+    limited = config == "limits"
+    os.environ.update({
+        "AZURE_DEVOPS_ORG": "bench", "AZURE_DEVOPS_PROJECT": PROJECT, "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": devops.start(), "SECRET_KEY": "bench", "OPENAI_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'users.db')}",
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"), "DIGEST_INTERVAL": "0",
+        "AZURE_DEVOPS_MAX_CONCURRENCY": str(args.devops_concurrency if limited else 0),
+        "OPENAI_MAX_CONCURRENCY": str(args.openai_concurrency if limited else 0),
+    })
+    openai_base = openai_stub.start() + "/v1"
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    import openai
+    import app as app_module
+    import azure_devops
+    import intent_classifier
+    import response_cache
+    openai.api_base = openai_base
+
+    if config == "baseline":
+        # Every caller leads its own call
+        for flights in (azure_devops.client.flights, intent_classifier.intent_flights,
+                        response_cache.response_flights):
+            flights.claim = lambda key: (Future(), True)
+
+    app_module.init_db()
+    flask_app, db, User = app_module.app, app_module.db, app_module.User
+    with flask_app.app_context():
+        for n in range(args.users):
+            user = User(username=f"bench{n}", email=f"bench{n}@example.com", azure_devops_email=PEOPLE[n % len(PEOPLE)])
+            user.set_password("bench")
+            db.session.add(user)
+        db.session.commit()
+    clients = []
+    for n in range(args.users):
+        client = flask_app.test_client()
+        client.post("/login", data={"email": f"bench{n}@example.com", "password": "bench"})
+        clients.append(client)
+    devops.reset_stats()
+    openai_stub.reset_stats()
+
+    latencies, busy = [], 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.users)
+
+    def send(n):
+        nonlocal busy
+        barrier.wait()
+        start = time.perf_counter()
+        response = clients[n].post("/", data={"message": MESSAGES[n % len(MESSAGES)]})
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            busy += "busy right now" in response.get_data(as_text=True)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    upstream = {**{f"devops {k}": v for k, v in devops.snapshot().items()},
+                **{f"openai {k}": v for k, v in openai_stub.snapshot().items()}}
+    devops.stop()
+    openai_stub.stop()
+    app_module.job_queue.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+    latencies.sort()
+    results.put({
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "max": latencies[-1] * 1000,
+        "elapsed": elapsed,
+        "busy": busy,
+        "upstream": {endpoint: (row.get("requests", 0), row.get("throttled", 0))
+                     for endpoint, row in upstream.items()},
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--items", type=int, default=5000, help="synthetic backlog size")
+    parser.add_argument("--devops-latency", type=float, default=0.05)
+    parser.add_argument("--devops-rate-limit", type=float, default=30.0, help="requests/s before 429s (0 = off)")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-rate-limit", type=float, default=10.0)
+    parser.add_argument("--devops-concurrency", type=int, default=10, help="AZURE_DEVOPS_MAX_CONCURRENCY (limits)")
+    parser.add_argument("--openai-concurrency", type=int, default=8, help="OPENAI_MAX_CONCURRENCY (limits)")
+    parser.add_argument("--configs", nargs="+", default=CONFIGS, choices=CONFIGS)
+    args = parser.parse_args()
+
+    # A fresh interpreter per configuration, as the app reads its configuration on import
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.users} users at once, backlog {args.items} items, Azure DevOps {args.devops_latency * 1000:.0f} ms "
+          f"/ {args.devops_rate_limit:g} rps, OpenAI {args.llm_latency * 1000:.0f} ms / {args.llm_rate_limit:g} rps")
+    rows = {}
+    for config in args.configs:
+        results = ctx.Queue()
+        process = ctx.Process(target=run, args=(config, args, results))
+        process.start()
+        rows[config] = results.get()
+        process.join()
+
+    print(f"{'config':<10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'busy':>5}")
+    for config, row in rows.items():
+        print(f"{config:<10} {row['p50']:>8.0f} {row['p95']:>8.0f} {row['max']:>8.0f} {row['busy']:>5}")
+    endpoints = sorted({endpoint for row in rows.values() for endpoint in row["upstream"]})
+    print(f"\n{'calls (429s)':<28}" + "".join(f"{config:>14}" for config in rows))
+    for endpoint in endpoints:
+        cells = [row["upstream"].get(endpoint, (0, 0)) for row in rows.values()]
+        print(f"{endpoint:<28}" + "".join(f"{f'{calls} ({throttled})':>14}" for calls, throttled in cells))
+
+
+if __name__ == "__main__":
+    main()
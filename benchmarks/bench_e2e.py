@@ -0,0 +1,232 @@
+"""
+Offline end-to-end benchmark: replays chat transcripts against chat() with
+N concurrent users, with Azure DevOps and OpenAI replaced by local stubs
+(stub_devops.py, stub_openai.py).
+
+Reports p50/p95/p99 latency per classified action, plus calls, throttled
+responses, bytes and OpenAI tokens per upstream endpoint. `--json` writes
+the report; `--baseline` compares against an earlier report and exits 1
+when a p95 or an upstream call count regressed by more than `--tolerance`,
+so the run can gate CI.
+
+    python benchmarks/bench_e2e.py --users 10 --items 10000 --devops-latency 0.05 --llm-latency 0.3
+    python benchmarks/bench_e2e.py --json baseline.json
+    python benchmarks/bench_e2e.py --digests   # priority/summary requests answered from digests
+    python benchmarks/bench_e2e.py --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from stub_devops import PEOPLE, PROJECT, StubDevOps  # noqa: E402
+from stub_openai import StubOpenAI  # noqa: E402
+
+# Absolute slack (ms) under which a p95 change is never called a regression
+NOISE_MS = 5.0
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def load_transcripts(paths):
+    messages = []
+    for path in paths:
+        with open(path) as f:
+            messages.extend(m["text"] for m in json.load(f) if m.get("type") == "user" and m.get("text"))
+    return messages
+
+
+def summarize(samples, errors):
+    report = {}
+    for action in sorted(set(samples) | set(errors)):
+        values = sorted(samples.get(action, []))
+        report[action] = {
+            "count": len(values),
+            "errors": errors.get(action, 0),
+            "p50_ms": round(statistics.median(values) * 1000, 2) if values else 0.0,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Returns a list of regression descriptions (empty when none)."""
+    regressions = []
+    for action, before in baseline.get("actions", {}).items():
+        after = report["actions"].get(action)
+        if not after or not before["count"]:
+            continue
+        limit = before["p95_ms"] * (1 + tolerance)
+        if after["p95_ms"] > limit and after["p95_ms"] - before["p95_ms"] > NOISE_MS:
+            regressions.append(f"{action}: p95 {before['p95_ms']:.1f} -> {after['p95_ms']:.1f} ms")
+    for service in ("devops", "openai"):
+        for endpoint, before in baseline.get("upstream", {}).get(service, {}).items():
+            after = report["upstream"].get(service, {}).get(endpoint, {})
+            if after.get("requests", 0) > before.get("requests", 0) * (1 + tolerance):
+                regressions.append(f"{service} {endpoint}: {before.get('requests', 0)} -> "
+                                   f"{after.get('requests', 0)} calls")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcript", nargs="+", default=[os.path.join(ROOT, "chat_history.json")],
+                        help="chat history JSON files; their user messages are replayed")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--passes", type=int, default=1, help="times each user replays the transcripts")
+    parser.add_argument("--items", type=int, default=10000, help="synthetic backlog size (1k-100k)")
+    parser.add_argument("--devops-latency", type=float, default=0.05)
+    parser.add_argument("--devops-rate-limit", type=float, default=0.0, help="requests/s before 429s (0 = off)")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit", type=float, default=0.0)
+    parser.add_argument("--inline-writes", action="store_true", help="BACKGROUND_WRITES=0")
+    parser.add_argument("--cold", action="store_true", help="don't pre-load the backlog cache")
+    parser.add_argument("--digests", action="store_true",
+                        help="build the priority digests first, so priority and summary requests are answered from them")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    devops = StubDevOps(args.items, latency=args.devops_latency)
+    openai_stub = StubOpenAI(latency=args.llm_latency, chunk_delay=args.llm_chunk_delay)
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    os.environ.update({
+        "AZURE_DEVOPS_ORG": "bench", "AZURE_DEVOPS_PROJECT": PROJECT, "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": devops.start(), "SECRET_KEY": "bench", "OPENAI_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'users.db')}",
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"), "DIGEST_INTERVAL": "0",
+        "BACKGROUND_WRITES": "0" if args.inline_writes else "1",
+    })
+    openai_base = openai_stub.start() + "/v1"
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    import openai
+    import app as app_module
+    openai.api_base = openai_base
+
+    # Remember which action each request was classified as (requests run on the calling thread)
+    current = threading.local()
+    classify_intent = app_module.classify_intent
+
+    def recording_classify_intent(message, *a, **kw):
+        result = classify_intent(message, *a, **kw)
+        current.action = result.get("action") or "unknown"
+        return result
+
+    app_module.classify_intent = recording_classify_intent
+
+    app_module.init_db()
+    flask_app, db, User = app_module.app, app_module.db, app_module.User
+    with flask_app.app_context():
+        for n in range(args.users):
+            user = User(username=f"bench{n}", email=f"bench{n}@example.com", azure_devops_email=PEOPLE[n % len(PEOPLE)])
+            user.set_password("bench")
+            db.session.add(user)
+        db.session.commit()
+
+    if not args.cold:
+        app_module.get_backlog_view()
+    if args.digests:
+        app_module.refresh_digests(force=True, pacer=app_module.Pacer(0))
+    messages = load_transcripts(args.transcript) * args.passes
+    # Throttling starts after the warm-up so the initial backlog load is not what gets measured
+    devops.set_rate_limit(args.devops_rate_limit)
+    openai_stub.set_rate_limit(args.llm_rate_limit)
+    devops.reset_stats()
+    openai_stub.reset_stats()
+
+    samples, errors = defaultdict(list), defaultdict(int)
+    lock = threading.Lock()
+
+    def replay(n):
+        client = flask_app.test_client()
+        client.post("/login", data={"email": f"bench{n}@example.com", "password": "bench"})
+        # Stagger users through the transcript so they don't send the same message at once
+        offset = n * len(messages) // max(1, args.users)
+        for message in messages[offset:] + messages[:offset]:
+            current.action = "unclassified"
+            start = time.perf_counter()
+            response = client.post("/", data={"message": message})
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    samples[current.action].append(elapsed)
+                else:
+                    errors[current.action] += 1
+
+    print(f"{args.users} users x {len(messages)} messages, backlog {args.items} items, "
+          f"Azure DevOps {args.devops_latency * 1000:.0f} ms, OpenAI {args.llm_latency * 1000:.0f} ms")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=replay, args=(n,)) for n in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Let queued writes finish so their upstream calls are counted
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        counts = app_module.job_queue.counts()
+        if not counts.get("queued") and not counts.get("running"):
+            break
+        time.sleep(0.1)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(sum(len(v) for v in samples.values()) / elapsed, 2),
+        "actions": summarize(samples, errors),
+        "upstream": {"devops": devops.snapshot(), "openai": openai_stub.snapshot()},
+        "jobs": app_module.job_queue.counts(),
+    }
+
+    print(f"{'action':<22} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for action, row in report["actions"].items():
+        print(f"{action:<22} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f}")
+    print(f"{report['requests_per_s']} requests/s over {report['elapsed_s']} s; jobs {report['jobs']}")
+    print(f"{'upstream':<30} {'calls':>7} {'429s':>6} {'KB up':>9} {'KB down':>9} {'tokens':>8}")
+    for service, endpoints in report["upstream"].items():
+        for endpoint, row in sorted(endpoints.items()):
+            tokens = row.get("prompt_tokens", 0) + row.get("completion_tokens", 0)
+            print(f"{service + ' ' + endpoint:<30} {row.get('requests', 0):>7} {row.get('throttled', 0):>6} "
+                  f"{row.get('bytes_in', 0) / 1e3:>9.1f} {row.get('bytes_out', 0) / 1e3:>9.1f} {tokens:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    devops.stop()
+    openai_stub.stop()
+    app_module.job_queue.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
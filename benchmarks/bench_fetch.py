@@ -0,0 +1,73 @@
+"""
+Benchmarks work-item detail fetching against the local Azure DevOps stub.
+
+Compares the old single `workitems?ids=...` request with the batched
+`workitemsbatch` fetch, with and without field projection, and prints wall
+time, request count and bytes transferred for each backlog size.
+
+    python benchmarks/bench_fetch.py --sizes 1000 10000 50000 --latency 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stub_devops import PROJECT, StubDevOps  # noqa: E402
+
+
+def legacy_fetch(azure_devops, ids):
+    """The pre-batching implementation: every ID in one GET URL."""
+    import requests
+    from requests.auth import HTTPBasicAuth
+
+    ids_str = ",".join(str(n) for n in ids)
+    details_url = f"{azure_devops.BASE_URL}/{azure_devops.PROJECT_ENCODED}/_apis/wit/workitems?ids={ids_str}&api-version=6.0"
+    items_resp = requests.get(details_url, auth=HTTPBasicAuth('', azure_devops.AZURE_PAT))
+    items_resp.raise_for_status()
+    return items_resp.json().get("value", [])
+
+
+def run(label, stub, fetch):
+    stub.reset_stats()
+    start = time.perf_counter()
+    try:
+        items = fetch()
+        outcome = f"{len(items)} items"
+    except Exception as e:
+        outcome = f"failed: {str(e)[:60]}"
+    elapsed = time.perf_counter() - start
+    totals = stub.totals()
+    print(f"  {label:<22} {elapsed * 1000:>9.0f} ms {totals.get('requests', 0):>6} req "
+          f"{totals.get('bytes_out', 0) / 1e6:>9.2f} MB down {totals.get('bytes_in', 0) / 1e6:>7.2f} MB up  {outcome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every stub response")
+    args = parser.parse_args()
+
+    stub = StubDevOps(item_count=max(args.sizes), latency=args.latency)
+    os.environ.update({
+        "AZURE_DEVOPS_ORG": "bench",
+        "AZURE_DEVOPS_PROJECT": PROJECT,
+        "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": stub.start(),
+    })
+    import azure_devops
+
+    try:
+        for size in args.sizes:
+            ids = list(range(1, size + 1))
+            print(f"{size} work items (latency {args.latency * 1000:.0f} ms, {azure_devops.FETCH_WORKERS} workers)")
+            run("single GET (old)", stub, lambda: legacy_fetch(azure_devops, ids))
+            run("batched, all fields", stub, lambda: azure_devops.get_work_item_details(ids))
+            run("batched, projected", stub, lambda: azure_devops.get_work_item_details(ids, azure_devops.WORK_ITEM_FIELDS))
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
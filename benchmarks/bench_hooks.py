@@ -0,0 +1,203 @@
+"""
+Service hooks versus polling. While the backlog in the Azure DevOps stub is
+edited at a fixed rate (state changes, new and deleted tasks), the app keeps
+reading its cached backlog; the benchmark measures how long each edit takes
+to show up in the cache and how many WIQL queries the app sends.
+
+  polling  the cache revalidates every WORK_ITEM_CACHE_TTL seconds with a
+           ChangedDate delta query
+  hooks    each edit's service-hook payload is posted to /hooks/azure-devops,
+           with every 7th delivered twice and every 5th held back behind the
+           next one; reconciling only happens every --reconcile seconds
+
+At the end the cached (id, rev) pairs are compared with the stub's.
+
+Payloads can be saved with --record and replayed with --replay, also ones
+captured from a real subscription: replay posts them to an app loaded with
+the stub backlog and prints each outcome and the resulting cached items.
+
+    python benchmarks/bench_hooks.py --items 5000 --duration 10 --rate 20
+    python benchmarks/bench_hooks.py --modes hooks --record hooks.jsonl
+    python benchmarks/bench_hooks.py --replay hooks.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from stub_devops import PROJECT, STATES, StubDevOps  # noqa: E402
+
+SECRET = "bench-hook-secret"
+
+
+def start_app(stub, args, hooks):
+    workdir = tempfile.mkdtemp(prefix="bench-hooks-")
+    os.environ.update({
+        "AZURE_DEVOPS_ORG": "bench", "AZURE_DEVOPS_PROJECT": PROJECT, "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": stub.start(), "SECRET_KEY": "bench", "OPENAI_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'users.db')}",
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"),
+        "WORK_ITEM_CACHE_TTL": str(args.ttl),
+        "WORK_ITEM_RECONCILE_INTERVAL": str(args.reconcile),
+        "AZURE_DEVOPS_HOOK_SECRET": SECRET if hooks else "",
+    })
+    import app as app_module
+    app_module.get_cached_work_items()
+    return app_module, workdir
+
+
+def post_hook(client, payload):
+    response = client.post("/hooks/azure-devops", json=payload, headers={"X-Hook-Secret": SECRET})
+    return response.get_json().get("result", response.status_code)
+
+
+def edit(stub, rng, last=None):
+    """
+    One edit like a user of the Azure DevOps UI would make, every 4th or so
+    to the item edited last; returns (id, deleted).
+    """
+    roll = rng.random()
+    if roll < 0.1:
+        _, item = stub.create([{"op": "add", "path": "/fields/System.Title", "value": "Bench hook task"}])
+        return item["id"], False
+    work_item_id = last if roll > 0.75 and last in stub.items else rng.choice(list(stub.items))
+    if roll < 0.15:
+        stub.delete(work_item_id)
+        return work_item_id, True
+    stub.patch(work_item_id, [{"op": "add", "path": "/fields/System.State", "value": rng.choice(STATES)}])
+    return work_item_id, False
+
+
+def observe(app_module, pending, lags):
+    """Moves the edits now visible in the cache from pending to lags (seconds since the edit)."""
+    cached = {item.id: item.rev for item in app_module.get_cached_work_items()}
+    seen_at = time.monotonic()
+    for work_item_id, (rev, edited_at) in list(pending.items()):
+        if (work_item_id not in cached) if rev is None else cached.get(work_item_id, -1) >= rev:
+            lags.append(seen_at - edited_at)
+            del pending[work_item_id]
+    return cached
+
+
+def run(mode, args, results):
+    hooks = mode == "hooks"
+    stub = StubDevOps(args.items, latency=args.devops_latency, record_events=hooks)
+    app_module, workdir = start_app(stub, args, hooks)
+    client = app_module.app.test_client()
+    rng = random.Random(42)
+    stub.reset_stats()
+
+    delivered, outcomes, held, work_item_id = [], {}, None, None
+    pending, lags = {}, []  # id -> (wanted rev or None when deleted, edited at)
+    deadline = time.monotonic() + args.duration
+    next_edit = time.monotonic()
+    while time.monotonic() < deadline:
+        now = time.monotonic()
+        if now >= next_edit:
+            next_edit += 1 / args.rate
+            work_item_id, deleted = edit(stub, rng, work_item_id)
+            pending[work_item_id] = (None if deleted else stub.items[work_item_id]["rev"], now)
+            while hooks and stub.events:
+                payload = stub.events.pop(0)
+                batch = [payload, payload] if payload["notificationId"] % 7 == 0 else [payload]
+                if held is not None:
+                    batch, held = batch + [held], None
+                elif payload["notificationId"] % 5 == 0:
+                    batch, held = [], payload
+                for event in batch:
+                    delivered.append(event)
+                    result = post_hook(client, event)
+                    outcomes[result] = outcomes.get(result, 0) + 1
+        observe(app_module, pending, lags)
+        time.sleep(0.005)
+    if held is not None:
+        delivered.append(held)
+        result = post_hook(client, held)
+        outcomes[result] = outcomes.get(result, 0) + 1
+
+    upstream = stub.snapshot()
+    cached = observe(app_module, pending, lags)
+    expected = {work_item_id: item["rev"] for work_item_id, item in stub.items.items()}
+    stub.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+    if args.record and hooks:
+        with open(args.record, "w") as f:
+            f.writelines(json.dumps(payload) + "\n" for payload in delivered)
+    lags.sort()
+    results.put({
+        "wiql": upstream.get("wiql", {}).get("requests", 0),
+        "batch": upstream.get("workitemsbatch", {}).get("requests", 0),
+        "lag_p50": statistics.median(lags) * 1000 if lags else 0.0,
+        "lag_p95": lags[int(len(lags) * 0.95)] * 1000 if lags else 0.0,
+        "unseen": len(pending),
+        "mismatched": sum(cached.get(n) != rev for n, rev in expected.items()) + len(cached.keys() - expected.keys()),
+        "outcomes": outcomes,
+    })
+
+
+def replay(args):
+    stub = StubDevOps(args.items, latency=args.devops_latency)
+    app_module, workdir = start_app(stub, args, hooks=True)
+    client = app_module.app.test_client()
+    ids = []
+    with open(args.replay) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            payload = json.loads(line)
+            resource = payload.get("resource") or {}
+            work_item_id = resource.get("workItemId", resource.get("id"))
+            ids.append(work_item_id)
+            print(f"{payload.get('eventType', '?'):<18} #{work_item_id:<8} rev {resource.get('rev', '?'):<4} "
+                  f"{post_hook(client, payload)}")
+    cached = {item.id: item for item in app_module.get_cached_work_items()}
+    print("\nCached afterwards:")
+    for work_item_id in dict.fromkeys(ids):
+        item = cached.get(work_item_id)
+        print(f"  #{work_item_id}: " + (f"rev {item.rev}, {item.state}, {item.title}" if item else "not cached"))
+    stub.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000, help="synthetic backlog size")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds each mode runs")
+    parser.add_argument("--rate", type=float, default=20.0, help="edits per second")
+    parser.add_argument("--ttl", type=float, default=5.0, help="WORK_ITEM_CACHE_TTL")
+    parser.add_argument("--reconcile", type=float, default=900.0, help="WORK_ITEM_RECONCILE_INTERVAL (hooks mode)")
+    parser.add_argument("--devops-latency", type=float, default=0.02)
+    parser.add_argument("--modes", nargs="+", default=["polling", "hooks"], choices=["polling", "hooks"])
+    parser.add_argument("--record", help="write the hooks mode's deliveries to this JSONL file")
+    parser.add_argument("--replay", help="post the payloads of this JSONL file instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.replay:
+        return replay(args)
+    # A fresh interpreter per mode, as the app reads its configuration on import
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.rate:g} edits/s for {args.duration:g} s on {args.items} items, TTL {args.ttl:g} s")
+    print(f"{'mode':<8} {'wiql':>5} {'batch':>6} {'lag p50':>9} {'lag p95':>9} {'unseen':>7} {'mismatched':>11}  outcomes")
+    for mode in args.modes:
+        results = ctx.Queue()
+        process = ctx.Process(target=run, args=(mode, args, results))
+        process.start()
+        row = results.get()
+        process.join()
+        outcomes = ", ".join(f"{name} {count}" for name, count in sorted(row["outcomes"].items()))
+        print(f"{mode:<8} {row['wiql']:>5} {row['batch']:>6} {row['lag_p50']:>7.0f}ms {row['lag_p95']:>7.0f}ms "
+              f"{row['unseen']:>7} {row['mismatched']:>11}  {outcomes or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Replays the user messages from chat_history.json through the intent pipeline
+and reports how many are answered by the local fast path, the intent cache,
+or the OpenAI fallback (simulated with a fixed latency).
+
+    python benchmarks/bench_intents.py --passes 2 --llm-latency 0.6
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import intent_classifier  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default=os.path.join(ROOT, "chat_history.json"))
+    parser.add_argument("--passes", type=int, default=2, help="replays of the transcript (later passes hit the cache)")
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="seconds per simulated OpenAI classification")
+    parser.add_argument("--verbose", action="store_true", help="print the local result for every message")
+    args = parser.parse_args()
+
+    def fake_llm(message):
+        time.sleep(args.llm_latency)
+        return {"action": "unknown", "parameters": {}, "raw_response": "{}"}
+
+    intent_classifier.analyze_user_intent = fake_llm
+    with open(args.history) as f:
+        messages = [m["text"] for m in json.load(f) if m.get("type") == "user"]
+
+    elapsed = Counter()
+    for _ in range(args.passes):
+        for message in messages:
+            start = time.perf_counter()
+            result = intent_classifier.classify_intent(message)
+            elapsed[result["source"]] += time.perf_counter() - start
+            if args.verbose and result["source"] != "cache":
+                print(f"  {result['source']:<5} {result['action']:<20} {message!r}")
+
+    stats = intent_classifier.intent_stats()
+    print(f"{stats['messages']} messages ({len(messages)} per pass, {args.passes} passes)")
+    for source, key in (("rules", "fast_path"), ("cache", "cache_hits"), ("llm", "llm")):
+        count = stats[key]
+        avg = elapsed[source] / count * 1000 if count else 0.0
+        print(f"  {source:<6} {count:>5}  {count / stats['messages']:>6.1%}  avg {avg:8.3f} ms")
+    print(f"  answered without OpenAI: {stats['local_rate']:.1%} (fast path {stats['fast_path_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Memory used by the cached backlog per representation, for each backlog size:
+
+  full REST     the complete work-item payloads (all fields, _links, identities)
+  projected     the REST dicts the cache used to keep (WORK_ITEM_FIELDS only)
+  WorkItem      the compact work_item.WorkItem records it keeps now
+
+Items are parsed from JSON like the API responses, so strings are not
+shared between items unless the representation interns them. Sizes are
+measured with tracemalloc, so they include every nested object.
+
+    python benchmarks/bench_memory.py --sizes 1000 10000 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from stub_devops import _project, make_work_item  # noqa: E402
+from work_item import WorkItem  # noqa: E402
+
+# Same list as azure_devops.WORK_ITEM_FIELDS (importing azure_devops needs its environment variables)
+WORK_ITEM_FIELDS = ["System.Title", "System.State", "System.AssignedTo", "System.ChangedDate",
+                    "Microsoft.VSTS.Scheduling.DueDate", "Microsoft.VSTS.Scheduling.RemainingWork",
+                    "Microsoft.VSTS.Scheduling.CompletedWork"]
+
+
+def measure(build):
+    """Returns (bytes retained by build()'s result, seconds to build it)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'representation':<14} {'MB':>9} {'bytes/item':>11} {'build ms':>9}")
+    for size in args.sizes:
+        full = json.dumps([make_work_item(n) for n in range(1, size + 1)])
+        projected = json.dumps([_project(make_work_item(n), WORK_ITEM_FIELDS) for n in range(1, size + 1)])
+        rows = (
+            ("full REST", lambda: json.loads(full)),
+            ("projected", lambda: json.loads(projected)),
+            # The parsed payload is dropped once converted, as in WorkItemCache
+            ("WorkItem", lambda: [WorkItem.from_json(item) for item in json.loads(projected)]),
+        )
+        for label, build in rows:
+            used, elapsed = measure(build)
+            print(f"{size:>8} {label:<14} {used / 1e6:>9.1f} {used / size:>11.0f} {elapsed * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares intent prompt versions offline: prompt tokens per message for each
+version over the user messages of a transcript (no OpenAI calls). With
+--call-log it also summarizes an OPENAI_CALL_LOG file recorded while the app
+ran, per purpose and prompt variant (calls, tokens, latency).
+
+The function schema is counted as compact JSON, an upper bound: OpenAI
+bills functions in a terser internal rendering.
+
+    python benchmarks/bench_prompts.py
+    OPENAI_CALL_LOG=calls.jsonl python app.py   # ... then:
+    python benchmarks/bench_prompts.py --call-log calls.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from prompts import INTENT_FUNCTION, count_tokens, intent_request, message_tokens, tiktoken  # noqa: E402
+
+
+def schema_tokens(function):
+    return count_tokens(json.dumps(function, separators=(",", ":")))
+
+
+def prompt_tokens(message, version):
+    messages, options = intent_request(message, version)
+    return message_tokens(messages) + sum(schema_tokens(function) for function in options.get("functions", []))
+
+
+def summarize_call_log(path):
+    groups = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                groups[(record["purpose"], record["variant"])].append(record)
+    print(f"{'purpose':<10} {'variant':<8} {'calls':>6} {'prompt':>8} {'completion':>11} {'p50 ms':>8} {'max ms':>8}")
+    for (purpose, variant), records in sorted(groups.items()):
+        prompt = [r["prompt_tokens"] or r["estimated_prompt_tokens"] for r in records]
+        completion = [r["completion_tokens"] or 0 for r in records]
+        latency = [r["latency_ms"] for r in records]
+        print(f"{purpose:<10} {variant:<8} {len(records):>6} {statistics.mean(prompt):>8.0f} "
+              f"{statistics.mean(completion):>11.0f} {statistics.median(latency):>8.0f} {max(latency):>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default=os.path.join(ROOT, "chat_history.json"))
+    parser.add_argument("--versions", nargs="+", default=["v1", "v2"])
+    parser.add_argument("--call-log", help="OPENAI_CALL_LOG file to summarize")
+    args = parser.parse_args()
+
+    with open(args.history) as f:
+        messages = [m["text"] for m in json.load(f) if m.get("type") == "user" and m.get("text")]
+    print(f"{len(messages)} messages; token counts {'from tiktoken' if tiktoken else 'estimated (4 chars/token)'}; "
+          f"function schema {schema_tokens(INTENT_FUNCTION)} tokens")
+    print(f"{'version':<8} {'mean':>8} {'min':>6} {'max':>6} {'total':>9}")
+    for version in args.versions:
+        counts = [prompt_tokens(message, version) for message in messages]
+        print(f"{version:<8} {statistics.mean(counts):>8.0f} {min(counts):>6} {max(counts):>6} {sum(counts):>9}")
+
+    if args.call_log:
+        print()
+        summarize_call_log(args.call_log)
+
+
+if __name__ == "__main__":
+    main()
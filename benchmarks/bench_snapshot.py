@@ -0,0 +1,102 @@
+"""
+Cold start of the backlog cache, for each backlog size:
+
+  json      parse the projected REST payloads and build the WorkItem
+            records, as after downloading the backlog again (the download
+            itself is not counted, so this is a lower bound)
+  snapshot  load the file written by backlog_snapshot.BacklogSnapshot
+
+Each load runs in a fresh interpreter and reports its time, the peak RSS
+it added (VmHWM, Linux) and, for the snapshot, the file size and the time
+to save it.
+
+    python benchmarks/bench_snapshot.py --sizes 10000 100000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from backlog_snapshot import BacklogSnapshot  # noqa: E402
+from stub_devops import _project, make_work_item  # noqa: E402
+from work_item import WorkItem  # noqa: E402
+
+# Same list as azure_devops.WORK_ITEM_FIELDS (importing azure_devops needs its environment variables)
+WORK_ITEM_FIELDS = ["System.Title", "System.State", "System.AssignedTo", "System.ChangedDate",
+                    "Microsoft.VSTS.Scheduling.DueDate", "Microsoft.VSTS.Scheduling.RemainingWork",
+                    "Microsoft.VSTS.Scheduling.CompletedWork"]
+SOURCE = "https://dev.azure.com/bench/Bench"
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (0 where /proc is missing)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def load(mode, path, results):
+    if mode == "json":
+        with open(path, "rb") as f:
+            payload = f.read()
+        before = peak_rss()
+        start = time.perf_counter()
+        items = [WorkItem.from_json(item) for item in json.loads(payload)]
+    else:
+        before = peak_rss()
+        start = time.perf_counter()
+        items = BacklogSnapshot(path, SOURCE).load().items
+    elapsed = time.perf_counter() - start
+    results.put((len(items), elapsed, peak_rss() - before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    workdir = tempfile.mkdtemp(prefix="bench-snapshot-")
+    print(f"{'items':>8} {'mode':<9} {'load ms':>9} {'peak RSS MB':>12} {'file MB':>8} {'save ms':>8}")
+    try:
+        for size in args.sizes:
+            payloads = [_project(make_work_item(n), WORK_ITEM_FIELDS) for n in range(1, size + 1)]
+            json_path = os.path.join(workdir, f"{size}.json")
+            with open(json_path, "w") as f:
+                json.dump(payloads, f)
+            items = [WorkItem.from_json(item) for item in payloads]
+            snapshot_path = os.path.join(workdir, f"{size}.snap")
+            start = time.perf_counter()
+            BacklogSnapshot(snapshot_path, SOURCE).save(items, max(item.changed for item in items), time.time())
+            saved = time.perf_counter() - start
+            del payloads, items
+
+            for mode, path in (("json", json_path), ("snapshot", snapshot_path)):
+                results = ctx.Queue()
+                process = ctx.Process(target=load, args=(mode, path, results))
+                process.start()
+                count, elapsed, rss = results.get()
+                process.join()
+                assert count == size
+                extra = (f" {os.path.getsize(path) / 1e6:>8.1f} {saved * 1000:>8.0f}" if mode == "snapshot"
+                         else f" {os.path.getsize(path) / 1e6:>8.1f} {'':>8}")
+                print(f"{size:>8} {mode:<9} {elapsed * 1000:>9.0f} {rss / 1e6:>12.1f}" + extra)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares the old linear title scan with title_index.TitleIndex.
+
+Builds a synthetic backlog (100k titles by default) that also contains the
+titles from data/misspelled_titles.json, then reports lookup latency for both
+approaches and how many misspelled queries each resolves to the right item,
+also with the strict lookup used to pick the target of a write.
+
+    python benchmarks/bench_title_lookup.py --items 100000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from title_index import TitleIndex, normalize_title  # noqa: E402
+from work_item import WorkItem  # noqa: E402
+
+VERBS = ["Fix", "Create", "Implement", "Refactor", "Test", "Document", "Review", "Optimize", "Migrate", "Update",
+         "Design", "Deploy", "Investigate", "Remove", "Add", "Configure", "Upgrade", "Write", "Build", "Support"]
+ADJECTIVES = ["new", "legacy", "broken", "slow", "mobile", "admin", "public", "internal", "shared", "nightly",
+              "customer", "billing", "user", "team", "project", "sprint", "release", "security", "search", "data"]
+NOUNS = ["login", "page", "payment", "report", "dashboard", "export", "notification", "profile", "service", "pipeline",
+         "api", "database", "parser", "cache", "queue", "form", "button", "email", "backlog", "integration",
+         "chatbot", "session", "token", "upload", "importer", "scheduler", "widget", "metrics", "alerts", "workflow"]
+AREAS = ["website", "backend", "frontend", "ios app", "android app", "staging", "production", "reports module",
+         "auth service", "admin portal", "ci", "data warehouse", "search cluster", "mobile client", "docs"]
+
+
+def synthetic_titles(count, exclude, seed=7):
+    rng = random.Random(seed)
+    combos = [f"{v} {a} {n} for {area}" for v, a, n, area in itertools.product(VERBS, ADJECTIVES, NOUNS, AREAS)]
+    rng.shuffle(combos)
+    titles = [t for t in combos if normalize_title(t) not in exclude]
+    while len(titles) < count:
+        titles.extend(f"{t} {len(titles)}" for t in combos[:count - len(titles)])
+    return titles[:count]
+
+
+def linear_lookup(items, query):
+    """The previous chat() lookup: first title containing the lowercased query."""
+    title = query.lower()
+    return next((t for t in items if title in t["fields"].get("System.Title", "").lower()), None)
+
+
+def timed(fn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", default=os.path.join(HERE, "data", "misspelled_titles.json"))
+    parser.add_argument("--verbose", action="store_true", help="print every query with its result")
+    args = parser.parse_args()
+
+    with open(args.cases) as f:
+        cases = json.load(f)
+    targets = sorted({case["expected"] for case in cases})
+    titles = synthetic_titles(args.items - len(targets), {normalize_title(t) for t in targets}) + targets
+    random.Random(3).shuffle(titles)
+    items = [{"id": n, "rev": 1, "fields": {"System.Title": title}} for n, title in enumerate(titles, start=1)]
+
+    start = time.perf_counter()
+    index = TitleIndex()
+    index.rebuild(WorkItem(item["id"], item["rev"], item["fields"]["System.Title"]) for item in items)
+    print(f"{len(items)} titles, index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = [case["query"] for case in cases]
+    exact_queries = [title.lower() for title in targets]
+    for label, batch in (("misspelled queries", queries), ("exact titles", exact_queries)):
+        scan_p50, scan_p95 = timed(lambda q: linear_lookup(items, q), batch, args.repeat)
+        index_p50, index_p95 = timed(index.lookup, batch, args.repeat)
+        print(f"{label}:")
+        print(f"  linear scan   p50 {scan_p50:8.3f} ms  p95 {scan_p95:8.3f} ms")
+        print(f"  title index   p50 {index_p50:8.3f} ms  p95 {index_p95:8.3f} ms")
+
+    scan_correct = index_correct = ambiguous = strict_correct = strict_wrong = 0
+    for case in cases:
+        found = linear_lookup(items, case["query"])
+        scan_correct += bool(found and found["fields"]["System.Title"] == case["expected"])
+        result = index.lookup(case["query"])
+        top = result.match or (result.candidates[0] if result.candidates else None)
+        index_correct += bool(result.match and result.match.title == case["expected"])
+        ambiguous += result.ambiguous
+        strict = index.lookup(case["query"], strict=True).match
+        strict_correct += bool(strict and strict.title == case["expected"])
+        strict_wrong += bool(strict and strict.title != case["expected"])
+        if args.verbose:
+            print(f"  {case['query']!r:<45} -> {top.title if top else None!r} "
+                  f"({top.score if top else 0:.2f}{', ambiguous' if result.ambiguous else ''})")
+    print(f"accuracy on {len(cases)} misspelled titles: linear scan {scan_correct}/{len(cases)}, "
+          f"title index {index_correct}/{len(cases)} ({ambiguous} flagged ambiguous)")
+    print(f"strict lookups (write targets): {strict_correct} right, {strict_wrong} wrong, "
+          f"{len(cases) - strict_correct - strict_wrong} asked to confirm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Multi-process contention benchmark: N worker processes (as under gunicorn)
+each import the app and, for a fixed time, read the cached backlog, save a
+chat exchange and read back their history, against the Azure DevOps stub.
+
+It runs two configurations on fresh databases:
+  default  every worker fetches its own backlog; users.db in rollback-journal
+           mode with synchronous=FULL
+  shared   backlog snapshot shared through WORK_ITEM_SHARED_DB; users.db in
+           WAL mode with synchronous=NORMAL
+
+and reports Azure DevOps calls, chat exchanges per second, commit latency and
+"database is locked" errors for each. The backlog TTL is short so that
+several refresh rounds happen during the run.
+
+    python benchmarks/bench_workers.py --workers 8 --items 5000 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from stub_devops import PEOPLE, PROJECT, StubDevOps  # noqa: E402
+
+CONFIGS = {
+    "default": {"SQLITE_JOURNAL_MODE": "delete", "SQLITE_SYNCHRONOUS": "full", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+    "shared": {"SQLITE_JOURNAL_MODE": "wal", "SQLITE_SYNCHRONOUS": "normal"},
+}
+# A listing-sized bot reply, so commits carry a realistic amount of text
+REPLY = "Pending tasks:<br>" + "<br>".join(f"Task {n} (State: To Do, Due: 2024-01-01)" for n in range(40))
+
+
+def setup(env, users):
+    os.environ.update(env)
+    import app as app_module
+    flask_app, db, User = app_module.app, app_module.db, app_module.User
+    with flask_app.app_context():
+        db.create_all()
+        for n in range(users):
+            user = User(username=f"bench{n}", email=f"bench{n}@example.com", azure_devops_email=PEOPLE[n % len(PEOPLE)])
+            user.set_password("bench")
+            db.session.add(user)
+        db.session.commit()
+
+
+def worker(n, env, duration, barrier, results):
+    os.environ.update(env)
+    from sqlalchemy.exc import OperationalError
+
+    import app as app_module
+    flask_app, db = app_module.app, app_module.db
+    user_id = n + 1
+    commits, backlog_reads, errors = [], [], 0
+    barrier.wait()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        app_module.get_cached_work_items()
+        backlog_reads.append(time.perf_counter() - start)
+        with flask_app.app_context():
+            try:
+                start = time.perf_counter()
+                app_module.add_chat_message(user_id, "user", "show pending tasks")
+                app_module.add_chat_message(user_id, "bot", REPLY)
+                db.session.commit()
+                commits.append(time.perf_counter() - start)
+                app_module.chat_history_page(user_id, limit=20)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    results.put({"commits": commits, "backlog_reads": backlog_reads, "errors": errors})
+
+
+def run(name, args, devops, ctx):
+    workdir = tempfile.mkdtemp(prefix=f"bench-workers-{name}-")
+    env = {
+        "AZURE_DEVOPS_ORG": "bench", "AZURE_DEVOPS_PROJECT": PROJECT, "AZURE_DEVOPS_PAT": "bench",
+        "AZURE_DEVOPS_URL": devops.base_url, "SECRET_KEY": "bench", "OPENAI_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'users.db')}",
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"),
+        "WORK_ITEM_CACHE_TTL": str(args.ttl),
+        "WORK_ITEM_SHARED_DB": os.path.join(workdir, "backlog.db") if name == "shared" else "",
+        **CONFIGS[name],
+    }
+    process = ctx.Process(target=setup, args=(env, args.workers))
+    process.start()
+    process.join()
+
+    devops.reset_stats()
+    barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+    started = time.perf_counter()
+    processes = [ctx.Process(target=worker, args=(n, env, args.duration, barrier, results))
+                 for n in range(args.workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    commits = sorted(c for outcome in outcomes for c in outcome["commits"])
+    reads = sorted(r for outcome in outcomes for r in outcome["backlog_reads"])
+    upstream = devops.snapshot()
+    return {
+        "wiql": upstream.get("wiql", {}).get("requests", 0),
+        "batch": upstream.get("workitemsbatch", {}).get("requests", 0),
+        "mb_down": sum(row.get("bytes_out", 0) for row in upstream.values()) / 1e6,
+        "exchanges_per_s": len(commits) / elapsed,
+        "commit_p50": statistics.median(commits) * 1000 if commits else 0.0,
+        "commit_p95": commits[int(len(commits) * 0.95)] * 1000 if commits else 0.0,
+        "read_p95": reads[int(len(reads) * 0.95)] * 1000 if reads else 0.0,
+        "errors": sum(outcome["errors"] for outcome in outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--items", type=int, default=5000, help="synthetic backlog size")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds each configuration runs")
+    parser.add_argument("--ttl", type=float, default=2.0, help="WORK_ITEM_CACHE_TTL during the run")
+    parser.add_argument("--devops-latency", type=float, default=0.02)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    args = parser.parse_args()
+
+    devops = StubDevOps(args.items, latency=args.devops_latency)
+    devops.start()
+    # Fresh interpreters, like independent server workers
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.workers} workers x {args.duration:.0f} s, backlog {args.items} items, TTL {args.ttl:g} s")
+    print(f"{'config':<8} {'wiql':>6} {'batch':>6} {'MB down':>8} {'chats/s':>8} {'commit p50':>11} "
+          f"{'commit p95':>11} {'backlog p95':>12} {'locked':>7}")
+    for name in args.configs:
+        row = run(name, args, devops, ctx)
+        print(f"{name:<8} {row['wiql']:>6} {row['batch']:>6} {row['mb_down']:>8.1f} {row['exchanges_per_s']:>8.1f} "
+              f"{row['commit_p50']:>9.1f}ms {row['commit_p95']:>9.1f}ms {row['read_p95']:>10.1f}ms {row['errors']:>7}")
+    devops.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Local stand-in for the Azure DevOps work-item REST endpoints used by azure_devops.py.
+
+Serves a synthetic backlog of `item_count` work items over plain HTTP and
+counts requests and bytes per endpoint, so benchmarks can run without
+touching dev.azure.com: WIQL, workitems, workitemsbatch, JSON-patch
+create/update, delete and $batch. The same 200-ID and 20000-result limits
+as the real service are enforced; latency and throttling are configurable.
+With `record_events`, every write also produces the service-hook payload
+Azure DevOps would post for it (see service_hook_event).
+"""
+import copy
+import json
+import re
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from stub_server import StubHandler, StubServer
+
+PROJECT = "BenchProject"
+MAX_IDS = 200
+MAX_WIQL_RESULTS = 20000
+STATES = ["To Do", "In Progress", "Blocked", "Done", "Removed"]
+PEOPLE = [f"User {n} <user{n}@example.com>" for n in range(25)]
+TOPICS = ["login", "payment", "search", "export", "dashboard", "notification", "profile", "report", "sync", "upload"]
+VERBS = ["Fix", "Implement", "Refactor", "Test", "Document", "Review", "Optimize", "Migrate"]
+
+
+def make_work_item(work_item_id, base_url="https://dev.azure.com/bench"):
+    """Builds a work item shaped like the full REST payload (fields, _links, url)."""
+    person = PEOPLE[work_item_id % len(PEOPLE)]
+    name, email = person[:-1].split(" <")
+    identity = {
+        "displayName": name,
+        "uniqueName": email,
+        "id": f"00000000-0000-0000-0000-{work_item_id % len(PEOPLE):012d}",
+        "url": f"{base_url}/_apis/Identities/{email}",
+        "imageUrl": f"{base_url}/_apis/GraphProfile/MemberAvatars/{email}",
+        "descriptor": f"aad.{email.encode().hex()}",
+    }
+    changed = datetime(2024, 1, 1) + timedelta(minutes=work_item_id)
+    due = datetime(2024, 1, 1) + timedelta(days=work_item_id % 90)
+    item_url = f"{base_url}/{PROJECT}/_apis/wit/workItems/{work_item_id}"
+    return {
+        "id": work_item_id,
+        "rev": 1,
+        "fields": {
+            "System.AreaPath": PROJECT,
+            "System.TeamProject": PROJECT,
+            "System.IterationPath": f"{PROJECT}\\Sprint {work_item_id % 12 + 1}",
+            "System.WorkItemType": "Task",
+            "System.State": STATES[work_item_id % len(STATES)],
+            "System.Reason": "New",
+            "System.AssignedTo": identity,
+            "System.CreatedDate": changed.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "System.CreatedBy": identity,
+            "System.ChangedDate": changed.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "System.ChangedBy": identity,
+            "System.CommentCount": 0,
+            "System.Title": f"{VERBS[work_item_id % len(VERBS)]} {TOPICS[work_item_id // 7 % len(TOPICS)]} {work_item_id}",
+            "System.Description": "<div>Synthetic work item used for offline benchmarks. " * 4 + "</div>",
+            "Microsoft.VSTS.Common.Priority": work_item_id % 4 + 1,
+            "Microsoft.VSTS.Common.StateChangeDate": changed.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "Microsoft.VSTS.Scheduling.OriginalEstimate": 8.0,
+            "Microsoft.VSTS.Scheduling.RemainingWork": 2.0,
+            "Microsoft.VSTS.Scheduling.CompletedWork": 1.0,
+            "Microsoft.VSTS.Scheduling.DueDate": due.strftime("%Y-%m-%dT00:00:00Z"),
+        },
+        "_links": {
+            "self": {"href": item_url},
+            "workItemUpdates": {"href": f"{item_url}/updates"},
+            "workItemRevisions": {"href": f"{item_url}/revisions"},
+            "workItemComments": {"href": f"{item_url}/comments"},
+            "html": {"href": f"{base_url}/web/wi.aspx?id={work_item_id}"},
+            "workItemType": {"href": f"{base_url}/{PROJECT}/_apis/wit/workItemTypes/Task"},
+            "fields": {"href": f"{base_url}/{PROJECT}/_apis/wit/fields"},
+        },
+        "url": item_url,
+    }
+
+
+def _project(item, fields):
+    if not fields:
+        return item
+    return {
+        "id": item["id"],
+        "rev": item["rev"],
+        "fields": {name: item["fields"][name] for name in fields if name in item["fields"]},
+        "url": item["url"],
+    }
+
+
+def service_hook_event(event_type, item, changes=None, notification_id=1):
+    """
+    A Web Hooks payload for a work-item event, shaped like the ones Azure
+    DevOps posts with "resource details to send: All". `changes` maps the
+    fields of a workitem.updated event to their (old, new) values.
+    """
+    item = copy.deepcopy(item)
+    if event_type == "workitem.updated":
+        changes = {"System.Rev": (item["rev"] - 1, item["rev"]), **(changes or {})}
+        resource = {
+            "id": item["rev"] - 1,
+            "workItemId": item["id"],
+            "rev": item["rev"],
+            "fields": {name: {"oldValue": old, "newValue": new} for name, (old, new) in changes.items()},
+            "revision": item,
+            "url": f"{item['url']}/updates/{item['rev'] - 1}",
+        }
+    else:
+        resource = item
+    return {
+        "subscriptionId": "00000000-0000-0000-0000-00000000b0b0",
+        "notificationId": notification_id,
+        "id": str(uuid.uuid4()),
+        "eventType": event_type,
+        "publisherId": "tfs",
+        "message": {"text": f"Task #{item['id']} ({item['fields'].get('System.Title')}) {event_type.split('.')[1]}"},
+        "resource": resource,
+        "resourceVersion": "1.0",
+        "createdDate": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    }
+
+
+class StubDevOps(StubServer):
+    """
+    Stub server holding the synthetic backlog (see stub_server.StubServer for
+    `latency`, `rate_limit` and `stats`).
+    """
+
+    def __init__(self, item_count=1000, latency=0.0, rate_limit=0.0, record_events=False):
+        super().__init__(latency, rate_limit)
+        self.handler_class = _StubHandler
+        self.items = {n: make_work_item(n) for n in range(1, item_count + 1)}
+        self.next_id = item_count + 1
+        # Service-hook payloads of the writes so far, oldest first (None = not recorded)
+        self.events = [] if record_events else None
+        self.notifications = 0
+
+    def _event(self, event_type, item, changes=None):
+        if self.events is not None:
+            self.notifications += 1
+            self.events.append(service_hook_event(event_type, item, changes, self.notifications))
+
+    # --- Endpoint implementations: return (status, payload) ---
+
+    def wiql(self, query, params):
+        top = int(params.get("$top", [MAX_WIQL_RESULTS + 1])[0])
+        ids = sorted(self.items)
+        match = re.search(r"\[System\.Id\]\s*>\s*(\d+)", query)
+        if match:
+            ids = [n for n in ids if n > int(match.group(1))]
+        match = re.search(r"\[System\.ChangedDate\]\s*>\s*'([^']+)'", query)
+        if match:
+            since = match.group(1)
+            ids = [n for n in ids if self.items[n]["fields"]["System.ChangedDate"] > since]
+        match = re.search(r"\[System\.AssignedTo\]\s*=\s*'([^']*)'", query)
+        if match:
+            ids = [n for n in ids if self.items[n]["fields"]["System.AssignedTo"]["uniqueName"].lower() == match.group(1)]
+        match = re.search(r"\[System\.State\]\s*(NOT IN|IN)\s*\(([^)]*)\)", query)
+        if match:
+            states = {state.lower() for state in re.findall(r"'([^']*)'", match.group(2))}
+            ids = [n for n in ids if (self.items[n]["fields"]["System.State"].lower() in states) == (match.group(1) == "IN")]
+        match = re.search(r"\[Microsoft\.VSTS\.Scheduling\.DueDate\]\s*<\s*'([^']+)'", query)
+        if match:
+            ids = [n for n in ids if self.items[n]["fields"]["Microsoft.VSTS.Scheduling.DueDate"] < match.group(1)]
+        if re.search(r"ORDER BY \[Microsoft\.VSTS\.Scheduling\.DueDate\]", query):
+            ids.sort(key=lambda n: (self.items[n]["fields"]["Microsoft.VSTS.Scheduling.DueDate"], n))
+        if len(ids) > MAX_WIQL_RESULTS and top > MAX_WIQL_RESULTS:
+            return 400, {"message": f"VS402337: The number of work items returned exceeds the size limit of {MAX_WIQL_RESULTS}."}
+        ids = ids[:top]
+        return 200, {"queryType": "flat", "workItems": [{"id": n, "url": self.items[n]["url"]} for n in ids]}
+
+    def details(self, ids, fields=None):
+        if len(ids) > MAX_IDS:
+            return 400, {"message": f"VS402337: The maximum number of work items that can be requested is {MAX_IDS}."}
+        return 200, {"count": len(ids), "value": [_project(self.items[n], fields) for n in ids if n in self.items]}
+
+
+    def patch(self, work_item_id, operations, event_type="workitem.updated"):
+        """Applies a JSON-patch document; `test /rev` mismatches fail with 412 like the real service."""
+        with self.lock:
+            item = self.items.get(work_item_id)
+            if item is None:
+                return 404, {"message": f"TF401232: Work item {work_item_id} does not exist."}
+            for op in operations:
+                if op["op"] == "test" and op["path"] == "/rev" and op["value"] != item["rev"]:
+                    return 412, {"message": "TF26071: This work item has been changed by someone else since you opened it."}
+            changes = {}
+            for op in operations:
+                if op["op"] in ("add", "replace") and op["path"].startswith("/fields/"):
+                    name = op["path"][len("/fields/"):]
+                    changes[name] = (item["fields"].get(name), op["value"])
+                    item["fields"][name] = op["value"]
+            item["rev"] += 1
+            changed = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            changes["System.ChangedDate"] = (item["fields"]["System.ChangedDate"], changed)
+            item["fields"]["System.ChangedDate"] = changed
+            self._event(event_type, item, changes)
+            return 200, item
+
+    def create(self, operations):
+        with self.lock:
+            work_item_id = self.next_id
+            self.next_id += 1
+            item = make_work_item(work_item_id)
+            self.items[work_item_id] = item
+        return self.patch(work_item_id, operations, event_type="workitem.created")
+
+    def delete(self, work_item_id):
+        with self.lock:
+            item = self.items.pop(work_item_id, None)
+            if item is not None:
+                self._event("workitem.deleted", item)
+        if item is None:
+            return 404, {"message": f"TF401232: Work item {work_item_id} does not exist."}
+        return 200, {"id": work_item_id, "code": 200}
+
+    def batch(self, requests_list):
+        if len(requests_list) > MAX_IDS:
+            return 400, {"message": f"VS402337: The maximum number of requests per batch is {MAX_IDS}."}
+        responses = []
+        for entry in requests_list:
+            match = re.search(r"/workitems/(\d+)", entry["uri"])
+            status, payload = self.patch(int(match.group(1)), entry.get("body") or [])
+            responses.append({"code": status, "headers": {"Content-Type": "application/json"},
+                              "body": json.dumps(payload)})
+        return 200, {"count": len(responses), "value": responses}
+
+
+class _StubHandler(StubHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        bytes_in = self._bytes_in()
+        if url.path.endswith("/_apis/wit/workitems") and "ids" in params:
+            if self._throttled("workitems", bytes_in):
+                return
+            ids = [int(n) for n in params["ids"][0].split(",") if n]
+            fields = params["fields"][0].split(",") if "fields" in params else None
+            status, payload = self.stub.details(ids, fields)
+            return self._reply("workitems", status, payload, bytes_in)
+        self._reply("unknown", 404, {"message": f"No stub for GET {url.path}"}, bytes_in)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        raw, body = self._read_body()
+        bytes_in = self._bytes_in(raw)
+        for suffix, endpoint in (("/_apis/wit/wiql", "wiql"), ("/_apis/wit/workitemsbatch", "workitemsbatch"),
+                                 ("/_apis/wit/$batch", "$batch")):
+            if url.path.endswith(suffix):
+                break
+        else:
+            return self._reply("unknown", 404, {"message": f"No stub for POST {url.path}"}, bytes_in)
+        if self._throttled(endpoint, bytes_in):
+            return
+        if endpoint == "wiql":
+            status, payload = self.stub.wiql(body["query"], params)
+        elif endpoint == "workitemsbatch":
+            status, payload = self.stub.details([int(n) for n in body["ids"]], body.get("fields"))
+        else:
+            status, payload = self.stub.batch(body)
+        self._reply(endpoint, status, payload, bytes_in)
+
+    def do_PATCH(self):
+        url = urlsplit(self.path)
+        raw, body = self._read_body()
+        bytes_in = self._bytes_in(raw)
+        create = re.search(r"/_apis/wit/workitems/\$[^/]+$", url.path)
+        match = re.search(r"/_apis/wit/workitems/(\d+)$", url.path)
+        if not (create or match):
+            return self._reply("unknown", 404, {"message": f"No stub for PATCH {url.path}"}, bytes_in)
+        endpoint = "workitems create" if create else "workitems PATCH"
+        if self._throttled(endpoint, bytes_in):
+            return
+        status, payload = self.stub.create(body) if create else self.stub.patch(int(match.group(1)), body)
+        self._reply(endpoint, status, payload, bytes_in)
+
+    def do_DELETE(self):
+        url = urlsplit(self.path)
+        bytes_in = self._bytes_in()
+        if self._throttled("workitems DELETE", bytes_in):
+            return
+        match = re.search(r"/_apis/wit/workitems/(\d+)$", url.path)
+        if match:
+            status, payload = self.stub.delete(int(match.group(1)))
+            return self._reply("workitems DELETE", status, payload, bytes_in)
+        self._reply("unknown", 404, {"message": f"No stub for DELETE {url.path}"}, bytes_in)
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the OpenAI ChatCompletion endpoint (POST /v1/chat/completions).
+
+Point the openai library at it with `openai.api_base = stub.start() + "/v1"`.
+Replies after `latency` seconds; streamed replies (stream=true) are sent as
+server-sent events with `chunk_delay` seconds between chunks. Intent
+classification prompts (the v1 JSON prompt, or any request with `functions`)
+get `intent_reply` as their answer, as a function call when functions were
+offered (small talk by default, so they cost a second call like an
+unmatched message would).
+Usage tokens are estimated at four characters per token and summed in
+`stats[...]["prompt_tokens" / "completion_tokens"]`.
+"""
+import json
+import time
+
+from stub_server import StubHandler, StubServer
+
+DEFAULT_REPLY = ("Here is a short answer from the benchmark stub. It is long enough to stream in a few "
+                 "chunks, like a typical reply from the real model.")
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubOpenAI(StubServer):
+    def __init__(self, latency=0.5, chunk_delay=0.0, rate_limit=0.0, reply=DEFAULT_REPLY,
+                 intent_reply=None):
+        super().__init__(latency, rate_limit)
+        self.handler_class = _OpenAIHandler
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+        self.intent_reply = intent_reply or {"action": "smalltalk", "parameters": {}}
+
+    def answer(self, messages, functions=None):
+        """Returns (content, function_call)."""
+        if functions:
+            return None, {"name": functions[0]["name"], "arguments": json.dumps(self.intent_reply)}
+        prompt = (messages[-1].get("content") or "") if messages else ""
+        if "Classify this user message" in prompt:
+            return json.dumps(self.intent_reply), None
+        return self.reply, None
+
+    def count_tokens(self, endpoint, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.stats[endpoint]["prompt_tokens"] += prompt_tokens
+            self.stats[endpoint]["completion_tokens"] += completion_tokens
+
+
+class _OpenAIHandler(StubHandler):
+    def do_POST(self):
+        raw, body = self._read_body()
+        bytes_in = self._bytes_in(raw)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._reply("unknown", 404, {"error": {"message": f"No stub for POST {self.path}"}}, bytes_in)
+        endpoint = "chat/completions"
+        if self._throttled(endpoint, bytes_in):
+            return
+        messages = body.get("messages", [])
+        content, function_call = self.stub.answer(messages, body.get("functions"))
+        prompt_tokens = estimate_tokens("".join(json.dumps(m) if m.get("function_call") else m.get("content") or ""
+                                                for m in messages) + (json.dumps(body["functions"]) if body.get("functions") else ""))
+        completion_tokens = estimate_tokens(content or function_call["arguments"])
+        self.stub.count_tokens(endpoint, prompt_tokens, completion_tokens)
+        created = int(time.time())
+        if not body.get("stream"):
+            return self._reply(endpoint, 200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content,
+                                                     **({"function_call": function_call} if function_call else {})},
+                             "finish_reason": "function_call" if function_call else "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }, bytes_in)
+        self._stream(endpoint, body, content, created, bytes_in)
+
+    def _stream(self, endpoint, body, content, created, bytes_in):
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        words = content.split(" ")
+        pieces = [" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "") for i in range(0, len(words), 4)]
+        events = [{"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}]
+        events += [{"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]} for piece in pieces]
+        events.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        for event in events:
+            event.update({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                          "model": body.get("model")})
+            sent += self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            if self.stub.chunk_delay:
+                time.sleep(self.stub.chunk_delay)
+        sent += self._write_chunk(b"data: [DONE]\n\n")
+        self.stub.record(endpoint, bytes_in, sent)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+        return len(data)
@@ -0,0 +1,133 @@
+"""
+Shared plumbing for the local stub servers (stub_devops.py, stub_openai.py):
+a threaded HTTP server with per-endpoint request and byte counters, fixed
+added latency and optional token-bucket throttling (429 + Retry-After).
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Base class for the stubs. Subclasses set `handler_class` to a StubHandler
+    subclass. `latency` (seconds) is added to every response; `rate_limit`
+    (requests/second, 0 = unlimited) answers excess requests with 429 and a
+    Retry-After header. `stats[endpoint]` counts requests, throttled,
+    bytes_in and bytes_out.
+    """
+
+    handler_class = None
+
+    def __init__(self, latency=0.0, rate_limit=0.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        self._tokens = rate_limit
+        self._refilled_at = time.monotonic()
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, port=0):
+        Handler = type("Handler", (self.handler_class,), {"stub": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+    def totals(self):
+        with self.lock:
+            total = defaultdict(int)
+            for counters in self.stats.values():
+                for key, value in counters.items():
+                    total[key] += value
+            return dict(total)
+
+    def snapshot(self):
+        """Copy of the per-endpoint counters."""
+        with self.lock:
+            return {endpoint: dict(counters) for endpoint, counters in self.stats.items()}
+
+    def record(self, endpoint, bytes_in, bytes_out, throttled=False):
+        with self.lock:
+            counters = self.stats[endpoint]
+            counters["requests"] += 1
+            counters["throttled"] += int(throttled)
+            counters["bytes_in"] += bytes_in
+            counters["bytes_out"] += bytes_out
+
+    def set_rate_limit(self, rate_limit):
+        with self.lock:
+            self.rate_limit = rate_limit
+            self._tokens = rate_limit
+            self._refilled_at = time.monotonic()
+
+    def throttle(self):
+        """Takes a token from the bucket; returns seconds to wait when none is left, else None."""
+        if not self.rate_limit:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate_limit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    stub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, endpoint, status, payload, bytes_in, headers=None):
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        body = json.dumps(payload).encode()
+        # Record before replying so the client never sees a response that is not yet counted
+        self.stub.record(endpoint, bytes_in, len(body), throttled=status == 429)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self, endpoint, bytes_in):
+        """Sends a 429 and returns True when the stub's rate limit is exceeded."""
+        wait = self.stub.throttle()
+        if wait is None:
+            return False
+        self._reply(endpoint, 429, {"message": "TF400733: The request has been throttled."}, bytes_in,
+                    headers={"Retry-After": f"{max(1, round(wait))}"})
+        return True
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return raw, (json.loads(raw) if raw else None)
+
+    def _bytes_in(self, raw=b""):
+        return len(self.requestline) + len(str(self.headers)) + len(raw)
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+import telemetry
+from flow_control import AsyncConcurrencyLimit, AsyncSingleFlight, ConcurrencyLimit, SingleFlight, UpstreamBusy
+
+AZURE_DEVOPS_POOL_SIZE = int(os.getenv("AZURE_DEVOPS_POOL_SIZE", "10"))
+AZURE_DEVOPS_TIMEOUT = float(os.getenv("AZURE_DEVOPS_TIMEOUT", "30"))
+AZURE_DEVOPS_MAX_RETRIES = int(os.getenv("AZURE_DEVOPS_MAX_RETRIES", "4"))
+AZURE_DEVOPS_BACKOFF = float(os.getenv("AZURE_DEVOPS_BACKOFF", "0.5"))
+AZURE_DEVOPS_MAX_BACKOFF = float(os.getenv("AZURE_DEVOPS_MAX_BACKOFF", "30"))
+# Admission control: calls in flight per process (0 = unlimited), callers allowed to wait for
+# a slot, and seconds they wait before being answered with "busy"
+AZURE_DEVOPS_MAX_CONCURRENCY = int(os.getenv("AZURE_DEVOPS_MAX_CONCURRENCY", str(AZURE_DEVOPS_POOL_SIZE)))
+AZURE_DEVOPS_MAX_QUEUE = int(os.getenv("AZURE_DEVOPS_MAX_QUEUE", "50"))
+AZURE_DEVOPS_QUEUE_TIMEOUT = float(os.getenv("AZURE_DEVOPS_QUEUE_TIMEOUT", "10"))
+
+# Throttled / temporarily unavailable; Azure DevOps sends Retry-After with these
+RETRY_STATUSES = {429, 503}
+LATENCY_SAMPLES = 512
+
+
+def endpoint_name(method, url):
+    """Groups URLs by endpoint, e.g. 'PATCH wit/workitems/{id}'."""
+    path = urlsplit(url).path
+    if "/_apis/" in path:
+        path = path.split("/_apis/", 1)[1]
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+    return f"{method.upper()} {path}"
+
+
+def retry_after_seconds(response):
+    """Reads Retry-After as seconds or an HTTP date; None if missing or unparseable."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient_error(exc):
+    """
+    True for failures worth retrying later: network errors, timeouts,
+    throttling, 5xx responses and calls refused by admission control.
+    """
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status = getattr(exc.response, "status_code", None)
+        return status is None or status in RETRY_STATUSES or status >= 500
+    return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                            aiohttp.ClientError, asyncio.TimeoutError, UpstreamBusy))
+
+
+def is_throttled_response(response):
+    """True for a 429, or a 503 with Retry-After: the request was refused, not applied."""
+    status = getattr(response, "status_code", None)
+    return status == 429 or status == 503 and retry_after_seconds(response) is not None
+
+
+def is_throttled_error(exc):
+    """
+    True only when the request was certainly not applied: a throttled response
+    (see is_throttled_response) or a call refused by admission control before
+    it was sent. Retrying non-idempotent writes (creates) on anything else
+    could apply them twice.
+    """
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return is_throttled_response(exc.response)
+    return isinstance(exc, UpstreamBusy)
+
+
+def coalesce_key(method, url, kwargs):
+    """Identifies a request by method, URL and JSON body / query parameters."""
+    return method, url, json.dumps(kwargs.get("json"), sort_keys=True), json.dumps(kwargs.get("params"), sort_keys=True)
+
+
+class _ClientBase:
+    """Retry policy, admission limit and per-endpoint latency stats shared by the sync and async clients."""
+
+    def __init__(self, timeout, max_retries, backoff, max_backoff, limit):
+        self.limit = limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._latency = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "retries": 0,
+                                             "samples": deque(maxlen=LATENCY_SAMPLES)})
+        self._lock = threading.Lock()
+
+    def _retry_delay(self, response, attempt):
+        # Full jitter keeps workers that were throttled together from retrying together
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after + random.uniform(0, self.backoff))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _should_retry(self, response, attempt, idempotent):
+        # A 503 without Retry-After may have been applied, so non-idempotent calls leave it to their caller
+        if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+            return False
+        return idempotent or is_throttled_response(response)
+
+    def _record(self, endpoint, elapsed, retried=False, status=None):
+        telemetry.observe_upstream("azure_devops", endpoint, status, elapsed)
+        with self._lock:
+            stats = self._latency[endpoint]
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["retries"] += int(retried)
+            stats["samples"].append(elapsed)
+
+    def latency_stats(self):
+        """Returns {endpoint: {count, retries, avg_ms, p50_ms, p95_ms, max_ms}}."""
+        with self._lock:
+            report = {}
+            for endpoint, stats in self._latency.items():
+                samples = sorted(stats["samples"])
+                report[endpoint] = {
+                    "count": stats["count"],
+                    "retries": stats["retries"],
+                    "avg_ms": round(stats["total"] / stats["count"] * 1000, 2),
+                    "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                    "max_ms": round(stats["max"] * 1000, 2),
+                }
+            return report
+
+    def reset_stats(self):
+        with self._lock:
+            self._latency.clear()
+
+
+class DevOpsClient(_ClientBase):
+    """
+    Shared HTTP client for the Azure DevOps REST API.
+
+    Keeps one pooled keep-alive requests.Session for the whole process, applies
+    a default timeout, retries 429/503 responses with jittered exponential
+    backoff (or the server's Retry-After), and records per-endpoint latency.
+    Calls made with idempotent=False (creates) are only retried when
+    throttled (see is_throttled_response).
+
+    Each attempt holds a slot of `limit` (flow_control.ConcurrencyLimit), so
+    a burst raises UpstreamBusy instead of flooding Azure DevOps. Reads made
+    with coalesce=True (WIQL queries, workitemsbatch) share the response of
+    an identical request already in flight.
+    """
+
+    def __init__(self, pat, pool_size=AZURE_DEVOPS_POOL_SIZE, timeout=AZURE_DEVOPS_TIMEOUT,
+                 max_retries=AZURE_DEVOPS_MAX_RETRIES, backoff=AZURE_DEVOPS_BACKOFF,
+                 max_backoff=AZURE_DEVOPS_MAX_BACKOFF, max_concurrency=AZURE_DEVOPS_MAX_CONCURRENCY,
+                 max_queue=AZURE_DEVOPS_MAX_QUEUE, queue_timeout=AZURE_DEVOPS_QUEUE_TIMEOUT):
+        super().__init__(timeout, max_retries, backoff, max_backoff,
+                         ConcurrencyLimit("azure_devops", "Azure DevOps", max_concurrency, max_queue, queue_timeout))
+        self.flights = SingleFlight("azure_devops")
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth('', pat)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, coalesce=False, idempotent=True, **kwargs):
+        if coalesce:
+            return self.flights.do(coalesce_key(method, url, kwargs), lambda: self._request(method, url, **kwargs))
+        return self._request(method, url, idempotent, **kwargs)
+
+    def _request(self, method, url, idempotent=True, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = endpoint_name(method, url)
+        attempt = 0
+        while True:
+            with self.limit:
+                start = time.perf_counter()
+                with telemetry.span(endpoint, attempt=attempt) as span:
+                    response = self.session.request(method, url, **kwargs)
+                    span.tags["status"] = response.status_code
+            self._record(endpoint, time.perf_counter() - start, retried=attempt > 0, status=response.status_code)
+            if not self._should_retry(response, attempt, idempotent):
+                return response
+            time.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+
+class AsyncResponse:
+    """The parts of requests.Response that azure_devops.py uses, for AsyncDevOpsClient replies."""
+
+    def __init__(self, method, url, status_code, headers, content):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error: {self.text[:200]} for url: {self.url}", response=self)
+
+
+class AsyncDevOpsClient(_ClientBase):
+    """
+    asyncio counterpart of DevOpsClient built on aiohttp.
+
+    Same timeout, retry/backoff, admission control, coalescing and latency
+    stats; waiting on Azure DevOps does not hold a thread, so one event loop
+    can have many calls in flight. An aiohttp session is created on first
+    use in each event loop that makes calls; close() must be awaited before a
+    loop ends (async_app does so on cleanup).
+    """
+
+    def __init__(self, pat, pool_size=AZURE_DEVOPS_POOL_SIZE, timeout=AZURE_DEVOPS_TIMEOUT,
+                 max_retries=AZURE_DEVOPS_MAX_RETRIES, backoff=AZURE_DEVOPS_BACKOFF,
+                 max_backoff=AZURE_DEVOPS_MAX_BACKOFF, max_concurrency=AZURE_DEVOPS_MAX_CONCURRENCY,
+                 max_queue=AZURE_DEVOPS_MAX_QUEUE, queue_timeout=AZURE_DEVOPS_QUEUE_TIMEOUT):
+        super().__init__(timeout, max_retries, backoff, max_backoff,
+                         AsyncConcurrencyLimit("azure_devops", "Azure DevOps", max_concurrency, max_queue,
+                                               queue_timeout))
+        self.flights = AsyncSingleFlight("azure_devops")
+        self.pat = pat
+        self.pool_size = pool_size
+        # Event loop -> its session: a session only works in the loop it was created in
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                # Forget loops that are gone; their sessions were closed by close() or cannot be any more
+                for other in [other for other in self._sessions if other.is_closed()]:
+                    del self._sessions[other]
+                session = self._sessions[loop] = aiohttp.ClientSession(
+                    auth=aiohttp.BasicAuth('', self.pat or ''),
+                    connector=aiohttp.TCPConnector(limit=self.pool_size),
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                )
+        return session
+
+    async def request(self, method, url, coalesce=False, idempotent=True, **kwargs):
+        if coalesce:
+            return await self.flights.do(coalesce_key(method, url, kwargs),
+                                         lambda: self._request(method, url, **kwargs))
+        return await self._request(method, url, idempotent, **kwargs)
+
+    async def _request(self, method, url, idempotent=True, **kwargs):
+        session = self._get_session()
+        endpoint = endpoint_name(method, url)
+        attempt = 0
+        while True:
+            async with self.limit:
+                start = time.perf_counter()
+                with telemetry.span(endpoint, attempt=attempt) as span:
+                    async with session.request(method, url, **kwargs) as raw:
+                        response = AsyncResponse(method, url, raw.status, raw.headers, await raw.read())
+                    span.tags["status"] = response.status_code
+            self._record(endpoint, time.perf_counter() - start, retried=attempt > 0, status=response.status_code)
+            if not self._should_retry(response, attempt, idempotent):
+                return response
+            await asyncio.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
+
+    async def close(self):
+        """Closes the running loop's session, and those of other loops that are still running."""
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, {}
+        for other, session in sessions.items():
+            if session.closed:
+                continue
+            if other is loop:
+                await session.close()
+            elif other.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), other))
@@ -0,0 +1,147 @@
+"""
+Scheduling for the precomputed priority digests.
+
+"Show my priority tasks" and "summarize tasks" are what most people ask
+first thing in the morning. The digests (app.refresh_digests: each user's
+overdue and due-soon tasks, pending count and AI summary, plus the team's)
+are rebuilt in the background by DigestScheduler, on a fixed interval and
+early after a burst of backlog changes, so those questions are answered
+from what was stored. Summary calls are spaced out by a Pacer so a run
+over many users stays under the OpenAI rate limit. The first run waits
+DIGEST_START_DELAY seconds after startup, and with a shared BacklogStore
+only the worker process holding its "digests" lease builds them.
+"""
+import os
+import threading
+import time
+
+import telemetry
+
+# Seconds between scheduled runs (0 = no scheduler; `flask build-digests` still works)
+DIGEST_INTERVAL = float(os.getenv("DIGEST_INTERVAL", "3600"))
+# Backlog changes (updated, created or deleted items) that trigger an early run (0 = schedule only),
+# but never sooner than DIGEST_MIN_INTERVAL seconds after the previous one
+DIGEST_CHANGE_THRESHOLD = int(os.getenv("DIGEST_CHANGE_THRESHOLD", "25"))
+DIGEST_MIN_INTERVAL = float(os.getenv("DIGEST_MIN_INTERVAL", "300"))
+# Seconds after startup before the first run, so a (re)starting deployment loads its backlog first
+DIGEST_START_DELAY = float(os.getenv("DIGEST_START_DELAY", "120"))
+# Seconds between the OpenAI summary calls of a run
+DIGEST_OPENAI_INTERVAL = float(os.getenv("DIGEST_OPENAI_INTERVAL", "2"))
+
+
+def describe_age(seconds):
+    """'just now', '5 minutes ago', '2 hours ago', '3 days ago'."""
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        count = int(seconds // size)
+        if count:
+            return f"{count} {unit}{'s' if count > 1 else ''} ago"
+    return "just now"
+
+
+class Pacer:
+    """Spaces calls at least `interval` seconds apart: call wait() before each one."""
+
+    def __init__(self, interval=DIGEST_OPENAI_INTERVAL):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class DigestScheduler:
+    """
+    Calls run() on a daemon thread `start_delay` seconds after start() and
+    then every `interval` seconds, or `min_interval` seconds after the
+    previous run once `change_threshold` backlog changes were seen. It sees
+    the changes by being one of the WorkItemCache's indexes
+    (rebuild/add/remove). With a `store` (backlog_store.BacklogStore) a run
+    only happens in the process holding the store's "digests" lease, which
+    it keeps renewing. Failed runs are counted in chatbot_errors_total
+    (stage="digest").
+    """
+
+    def __init__(self, run, interval=DIGEST_INTERVAL, change_threshold=DIGEST_CHANGE_THRESHOLD,
+                 min_interval=DIGEST_MIN_INTERVAL, start_delay=DIGEST_START_DELAY, store=None):
+        self.run = run
+        self.interval = interval
+        self.change_threshold = change_threshold
+        self.min_interval = min_interval
+        self.start_delay = start_delay
+        self.store = store
+        self.changes = 0
+        self.last_run = None
+        self._first_run = None
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        """Starts the scheduler thread once per process (not at all when interval is 0)."""
+        with self._wakeup:
+            if self.interval <= 0 or self._thread is not None:
+                return
+            self._stopping = False
+            self._first_run = time.monotonic() + self.start_delay
+            self._thread = threading.Thread(target=self._loop, name="digest-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        if self.store is not None:
+            self.store.release("digests")
+
+    # WorkItemCache index interface. Full reloads mostly return what was already cached,
+    # so they wait for the schedule.
+    def rebuild(self, items):
+        pass
+
+    def add(self, item):
+        self._changed()
+
+    def remove(self, work_item_id):
+        self._changed()
+
+    def _changed(self):
+        with self._wakeup:
+            self.changes += 1
+            if self.changes == self.change_threshold:
+                self._wakeup.notify_all()
+
+    def _seconds_until_due(self):
+        if self.last_run is None:
+            return self._first_run - time.monotonic()
+        due = self.last_run + self.interval
+        if self.change_threshold and self.changes >= self.change_threshold:
+            due = min(due, self.last_run + self.min_interval)
+        return due - time.monotonic()
+
+    def _loop(self):
+        while True:
+            with self._wakeup:
+                wait = self._seconds_until_due()
+                if self._stopping:
+                    return
+                if wait > 0:
+                    self._wakeup.wait(wait)
+                    continue
+                self.changes = 0
+                self.last_run = time.monotonic()
+            # Held for two intervals, so another process takes over when the holder is gone
+            if self.store is not None and not self.store.claim("digests", 2 * self.interval):
+                continue
+            try:
+                self.run()
+            except Exception as exc:
+                telemetry.count_error("digest", exc)
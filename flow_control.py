@@ -0,0 +1,217 @@
+"""
+Flow control for the calls made to Azure DevOps and OpenAI.
+
+SingleFlight coalesces concurrent identical calls: the first caller of a
+key makes the call and everyone asking for the same key meanwhile waits
+for its result instead of making their own. ConcurrencyLimit admits a fixed
+number of calls to one upstream at a time; a bounded number of callers may
+wait for a slot, anyone beyond that (or waiting too long) gets UpstreamBusy
+right away, so a burst turns into quick "busy" answers instead of a pile of
+requests on a throttled service. Both come in a threading and an asyncio
+flavour.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import telemetry
+
+
+class UpstreamBusy(Exception):
+    """Raised instead of calling an upstream whose concurrency limit and wait queue are full."""
+
+    def __init__(self, service, label, reason):
+        super().__init__(f"{label} is busy right now; please try again in a moment.")
+        self.service = service
+        self.reason = reason
+
+
+class Abandoned(Exception):
+    """Result of a coalesced call whose leader stopped before finishing it (cancelled, closed generator)."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key (threads). Use do(key, fn),
+    or claim()/finish() when the leader produces its result piecemeal, e.g.
+    while streaming it. `name` labels chatbot_coalesced_calls_total.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Returns (future, leader): the leader must finish() the future, the others wait on it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                return future, True
+        telemetry.count_coalesced(self.name)
+        return future, False
+
+    def finish(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """fn()'s result, shared with every concurrent caller of the same key (its exception too)."""
+        while True:
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except Abandoned:
+                continue
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, future, error=e)
+            raise
+        except BaseException:
+            self.finish(key, future, error=Abandoned())
+            raise
+        self.finish(key, future, result)
+        return result
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines of one event loop: do(key, fn) awaits fn()."""
+
+    def claim(self, key):
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+            return future, True
+        telemetry.count_coalesced(self.name)
+        return future, False
+
+    def finish(self, key, future, result=None, error=None):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Nobody may be waiting; don't log it as an unretrieved exception
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def do(self, key, fn):
+        while True:
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                # shield: a follower being cancelled must not cancel the leader's call
+                return await asyncio.shield(future)
+            except Abandoned:
+                continue
+        try:
+            result = await fn()
+        except Exception as e:
+            self.finish(key, future, error=e)
+            raise
+        except BaseException:
+            self.finish(key, future, error=Abandoned())
+            raise
+        self.finish(key, future, result)
+        return result
+
+
+class ConcurrencyLimit:
+    """
+    At most `limit` concurrent calls to one upstream (threads); up to `queue`
+    more callers wait at most `timeout` seconds for a slot, the rest are
+    rejected with UpstreamBusy. A limit of 0 admits everything. Use as a
+    context manager around the call. Waits and rejections are recorded in
+    chatbot_upstream_wait_seconds and chatbot_upstream_rejected_total.
+    """
+
+    def __init__(self, service, label, limit, queue, timeout):
+        self.service = service
+        self.label = label
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self._lock = threading.Lock()
+
+    def _reject(self, reason):
+        telemetry.count_rejected(self.service, reason)
+        raise UpstreamBusy(self.service, self.label, reason)
+
+    def _enqueue(self):
+        with self._lock:
+            if self.waiting >= self.queue:
+                self._reject("queue_full")
+            self.waiting += 1
+
+    def _dequeue(self, start):
+        with self._lock:
+            self.waiting -= 1
+        telemetry.observe_wait(self.service, time.perf_counter() - start)
+
+    def __enter__(self):
+        if self._slots is None or self._slots.acquire(blocking=False):
+            return self
+        self._enqueue()
+        start = time.perf_counter()
+        try:
+            admitted = self._slots.acquire(timeout=self.timeout)
+        finally:
+            self._dequeue(start)
+        if not admitted:
+            self._reject("timeout")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._slots is not None:
+            self._slots.release()
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    """ConcurrencyLimit for coroutines (`async with`); the semaphore is created in the running loop."""
+
+    def __init__(self, service, label, limit, queue, timeout):
+        super().__init__(service, label, limit, queue, timeout)
+        self._slots = None
+        self._loop = None
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots, self._loop = asyncio.Semaphore(self.limit), loop
+        return self._slots
+
+    async def __aenter__(self):
+        if self.limit <= 0:
+            return self
+        slots = self._semaphore()
+        if not slots.locked():
+            await slots.acquire()
+            return self
+        self._enqueue()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._reject("timeout")
+        finally:
+            self._dequeue(start)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.limit > 0:
+            self._slots.release()
@@ -0,0 +1,317 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import telemetry
+from flow_control import AsyncSingleFlight, SingleFlight
+from openai_utils import analyze_user_intent, analyze_user_intent_async, parse_task_suggestion, VALID_STATUSES
+
+# Local results at or above this confidence skip the OpenAI classification
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "1024"))
+
+STATUS_ALIASES = {status.lower(): status for status in VALID_STATUSES}
+STATUS_ALIASES.update({"todo": "To Do", "to-do": "To Do", "in-progress": "In Progress", "doing": "In Progress",
+                       "complete": "Done", "completed": "Done", "finished": "Done", "closed": "Done"})
+STATUS_PATTERN = "|".join(sorted((re.escape(s) for s in STATUS_ALIASES), key=len, reverse=True))
+
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}|today|tomorrow"
+# "set up", "move over", "change back"...: the verb starts a title rather than a command
+PHRASAL_PARTICLES = r"(?!\s+(?:up|out|off|over|back|down|in|on|aside)\b)"
+ITEM_WORDS = r"(?:tasks?|work ?items?|items?|backlogs?|stories)"
+
+
+def clean_message(message):
+    """Collapses whitespace and drops trailing punctuation, keeping the original casing."""
+    return re.sub(r"\s+", " ", message.replace("\xa0", " ")).strip().rstrip("?!.").strip()
+
+
+def normalize_message(message):
+    """Cleaned, lowercased message; with the date, the intent cache key (see cache_key)."""
+    return clean_message(message).lower()
+
+
+def cache_key(message):
+    """
+    Intent cache key: the normalized message and today's date, since dates
+    resolved from "today", "tomorrow" or "next friday" are only right on the
+    day they were classified.
+    """
+    return f"{date.today().isoformat()} {normalize_message(message)}"
+
+
+def _parse_date(value):
+    value = value.lower()
+    if value == "today":
+        return date.today().isoformat()
+    if value == "tomorrow":
+        return (date.today() + timedelta(days=1)).isoformat()
+    return value
+
+
+def _number(value):
+    return float(value) if "." in value else int(value)
+
+
+# --- Rules: (action, case-insensitive pattern on the cleaned message, confidence, parameter extractor) ---
+
+def _create_task(match, message):
+    title = match.group("title").strip(" :;")
+    # Assignments, relative phrasing ("a task to ...") and inline deadlines are left to GPT
+    if re.search(rf"^(?:to|and|for)\b|\bassign|\band keep\b|\b(?:by|before|on)\s+(?:{DATE_PATTERN})", title, re.IGNORECASE):
+        return None
+    params = {"title": title, "description": ""}
+    # README form: "create task: Fix login bug; Critical bug in login flow; due: 2025-01-20"
+    parts = [part.strip() for part in title.split(";")]
+    if len(parts) > 1:
+        params["title"] = parts[0]
+        for part in parts[1:]:
+            due = re.match(rf"due:?\s*({DATE_PATTERN})$", part, re.IGNORECASE)
+            if due:
+                params["due_date"] = _parse_date(due.group(1))
+            elif part:
+                params["description"] = part
+    if match.group("due"):
+        params["due_date"] = _parse_date(match.group("due"))
+    return params if params["title"] else None
+
+
+def _update_time(match, message):
+    parsed = parse_task_suggestion(message)
+    if parsed["action"] == "update_time" and parsed["task_title"]:
+        return {"task_title": parsed["task_title"], "time_spent": parsed["time_spent"],
+                "time_remaining": parsed["time_remaining"]}
+    return {"task_title": match.group("title").strip(), "time_spent": _number(match.group("spent")),
+            "time_remaining": _number(match.group("remaining"))}
+
+
+def _update_status(match, message):
+    return {"task_title": match.group("title").strip(" :'\""), "status": STATUS_ALIASES[match.group("status").lower()]}
+
+
+def _bulk_update_status(match, message):
+    return {"status": STATUS_ALIASES[match.group("status").lower()], "scope": "mine" if match.group("mine") else "all",
+            "overdue": bool(match.group("overdue"))}
+
+
+def _bulk_reassign(match, message):
+    return {"from_assignee": match.group("source").strip(" '\""), "to_assignee": match.group("target").strip(" '\"")}
+
+
+def _bulk_update_time(match, message):
+    titles = [title.strip(" '\"") for title in re.split(r"\s*,\s*(?:and\s+)?|\s+and\s+", match.group("titles"))]
+    titles = [title for title in titles if title]
+    return {"task_titles": titles, "hours": _number(match.group("hours"))} if titles else None
+
+
+def _update_assignment(match, message):
+    return {"task_id": int(match.group("id")), "assignee": match.group("assignee").strip()}
+
+
+def _delete_task(match, message):
+    return {"task_title": match.group("title").strip(" :'\"")}
+
+
+def _no_params(match, message):
+    return {}
+
+
+RULES = [
+    ("bulk_update_status", re.compile(
+        rf"^(?:mark|set|move|change)\s+(?:all|every(?:thing)?)\s+(?:of\s+)?(?:(?P<mine>my)\s+)?(?:(?P<overdue>overdue)\s+)?"
+        rf"(?:{ITEM_WORDS}\s+)?(?:(?:status\s+)?(?:to|as)\s+)?(?P<status>{STATUS_PATTERN})$", re.IGNORECASE),
+        0.93, _bulk_update_status),
+    ("bulk_reassign", re.compile(
+        rf"^(?:re)?assign\s+(?:all|every(?:thing)?)\s+(?:(?:of\s+)?(?:the\s+)?{ITEM_WORDS}\s+)?"
+        rf"from\s+(?P<source>.+?)\s+to\s+(?P<target>.+)$", re.IGNORECASE), 0.93, _bulk_reassign),
+    ("bulk_update_time", re.compile(
+        r"^(?:log|add|record)\s+(?P<hours>\d+(?:\.\d+)?)\s*(?:h|hrs?|hours?)\s+(?:each\s+)?(?:on|to|against)\s+"
+        r"(?:(?:tasks?|each of)\s+)?(?P<titles>.+)$", re.IGNORECASE), 0.92, _bulk_update_time),
+    ("update_time", re.compile(
+        r"^(?:update|log) time:?\s*(?:task\s+)?(?P<title>.+?)\s+spent\s+(?P<spent>\d+(?:\.\d+)?)\s*h?\s+"
+        r"remaining\s+(?P<remaining>\d+(?:\.\d+)?)\s*h?$", re.IGNORECASE), 0.97, _update_time),
+    ("update_assignment", re.compile(
+        r"^(?:update assignment:?\s*|assign\s+|reassign\s+)(?:task\s+)?#?(?P<id>\d+)\s+to\s+(?P<assignee>.+)$", re.IGNORECASE),
+        0.95, _update_assignment),
+    ("update_status", re.compile(
+        rf"^(?:update status:?|(?:set|mark|move|change){PHRASAL_PARTICLES})\s+(?:task\s+)?(?P<title>.+?)\s+"
+        rf"(?:status\s+)?(?:to|as)\s+(?P<status>{STATUS_PATTERN})$", re.IGNORECASE), 0.92, _update_status),
+    ("delete_task", re.compile(r"^(?:please\s+)?(?:delete|remove)\s+(?:the\s+)?task:?\s+(?P<title>.+)$", re.IGNORECASE),
+        0.93, _delete_task),
+    ("create_task", re.compile(
+        rf"^(?:please\s+|can you\s+)?(?:create|add)\s+(?:a\s+)?(?:new\s+)?task(?:\s+for me)?:?\s*"
+        rf"(?:(?:called|named|titled)\s+)?(?P<title>[^;]+?(?:;.*)?)"
+        rf"(?:\s+(?:and keep|with)\s+(?:the\s+)?(?:due\s+)?(?:date|deadline)\s+(?:as|for|of)\s+(?P<due>{DATE_PATTERN}))?$", re.IGNORECASE),
+        0.9, _create_task),
+    ("summarize_tasks", re.compile(rf"^(?:please\s+)?summari[sz]e\b.*{ITEM_WORDS}|^(?:give me a\s+)?summary of\b", re.IGNORECASE),
+        0.9, _no_params),
+    ("show_priority_tasks", re.compile(
+        rf"\b(?:high(?:est)?[- ]priority|priority|urgent|overdue|due soon)\b.*{ITEM_WORDS}|"
+        rf"{ITEM_WORDS}.*\b(?:urgent|overdue|high priority|due soon)\b|^(?:what|which) tasks are (?:urgent|overdue)", re.IGNORECASE),
+        0.9, _no_params),
+    ("show_completed_tasks", re.compile(
+        rf"^(?:show|list|get|display|what are)\s+(?:me\s+)?(?:the\s+|all\s+)?(?:completed|finished|closed|done)\s+{ITEM_WORDS}$", re.IGNORECASE),
+        0.92, _no_params),
+    ("show_pending_tasks", re.compile(
+        rf"^(?:show|list|get|display|what are)\s+(?:me\s+)?(?:the\s+|all\s+)?(?:pending|open|remaining|outstanding|incomplete)\s+{ITEM_WORDS}$", re.IGNORECASE),
+        0.92, _no_params),
+    ("show_my_tasks", re.compile(
+        rf"^(?:show|list|get|display|what are)\s+(?:me\s+)?my\s+(?:(?:open|assigned)\s+)?{ITEM_WORDS}$|^my {ITEM_WORDS}$", re.IGNORECASE),
+        0.93, _no_params),
+    ("list_all_tasks", re.compile(
+        rf"^(?:show|list|get|display|fetch)\s+(?:me\s+)?(?:all|every)\s+(?:the\s+)?{ITEM_WORDS}$|^list {ITEM_WORDS}$", re.IGNORECASE),
+        0.95, _no_params),
+    ("smalltalk", re.compile(
+        r"^(?:hi|hello|hey|yo|thanks|thank you|thx|good (?:morning|afternoon|evening)|how are you|"
+        r"what's up|bye|goodbye)(?: there)?(?: bot)?$", re.IGNORECASE), 0.95, _no_params),
+]
+
+# Keyword-scored fallback for parameterless listing intents that no rule matched
+KEYWORDS = {
+    "list_all_tasks": {"all": 1.0, "every": 1.0, "list": 0.6, "backlog": 0.8, "show": 0.2, "task": 0.3, "item": 0.3},
+    "show_my_tasks": {"my": 1.2, "mine": 1.2, "assigned": 0.5, "me": 0.2, "task": 0.3},
+    "show_priority_tasks": {"priority": 1.2, "urgent": 1.2, "overdue": 1.2, "deadline": 0.6, "due": 0.5, "task": 0.3},
+    "summarize_tasks": {"summarize": 1.4, "summarise": 1.4, "summary": 1.4, "overview": 1.0, "progress": 0.4},
+    "show_pending_tasks": {"pending": 1.3, "open": 0.8, "outstanding": 1.0, "remaining": 0.6, "incomplete": 1.0},
+    "show_completed_tasks": {"completed": 1.2, "finished": 1.0, "closed": 0.8, "done": 0.6},
+}
+
+
+def keyword_scores(normalized):
+    tokens = {token[:-1] if token.endswith("s") and len(token) > 3 else token
+              for token in re.findall(r"[a-z]+", normalized)}
+    return {action: sum(weight for word, weight in words.items() if word in tokens)
+            for action, words in KEYWORDS.items()}
+
+
+def classify_locally(message):
+    """
+    Classifies a message without calling OpenAI.
+    Returns {"action", "parameters", "confidence"}; confidence is 0 when nothing matched.
+    """
+    cleaned = clean_message(message)
+    for action, pattern, confidence, extract in RULES:
+        match = pattern.search(cleaned)
+        if not match:
+            continue
+        try:
+            params = extract(match, message)
+        except (ValueError, KeyError, IndexError):
+            params = None
+        if params is not None:
+            return {"action": action, "parameters": params, "confidence": confidence}
+
+    scores = keyword_scores(cleaned.lower())
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score <= 0:
+        return {"action": "unknown", "parameters": {}, "confidence": 0.0}
+    # Share of the evidence for the winner, discounted when the evidence is thin
+    confidence = best_score / (best_score + second_score) * min(1.0, best_score / 2.0)
+    return {"action": best, "parameters": {}, "confidence": round(confidence, 3)}
+
+
+class IntentCache:
+    """Thread-safe LRU of classified intents keyed on cache_key(message)."""
+
+    def __init__(self, maxsize=INTENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+intent_cache = IntentCache()
+# Identical messages classified concurrently (e.g. "show my tasks" at standup) share one GPT call
+intent_flights = SingleFlight("intent")
+async_intent_flights = AsyncSingleFlight("intent")
+_stats = {"messages": 0, "cache_hits": 0, "fast_path": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats["messages"] += 1
+        _stats[key] += 1
+    telemetry.count_cache("intent", "hit" if key == "cache_hits" else "miss")
+
+
+def _classify_without_llm(message, threshold):
+    """Returns (cache key, result) with result None when GPT has to be asked."""
+    threshold = INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    key = cache_key(message)
+    cached = intent_cache.get(key)
+    if cached is not None:
+        _count("cache_hits")
+        return key, {**cached, "source": "cache"}
+
+    local = classify_locally(message)
+    if local["confidence"] >= threshold:
+        _count("fast_path")
+        result = {**local, "source": "rules"}
+        intent_cache.put(key, result)
+        return key, result
+    _count("llm")
+    return key, None
+
+
+def _remember_llm_result(key, message, response):
+    result = {**response, "source": "llm"}
+    if result.get("action") == "unknown" and str(result.get("raw_response", "")).startswith("Error"):
+        # Don't cache OpenAI failures; answer with the local guess, if there is one, while OpenAI is unavailable
+        local = classify_locally(message)
+        return {**local, "source": "rules"} if local["confidence"] > 0 else result
+    intent_cache.put(key, result)
+    return result
+
+
+def classify_intent(message, threshold=None):
+    """
+    Same contract as openai_utils.analyze_user_intent, but tries the intent cache
+    and the local classifier first and only asks GPT when local confidence is
+    below the threshold. The result's "source" is "cache", "rules" or "llm".
+    """
+    key, result = _classify_without_llm(message, threshold)
+    if result is None:
+        result = intent_flights.do(key, lambda: _remember_llm_result(key, message, analyze_user_intent(message)))
+    return result
+
+
+async def classify_intent_async(message, threshold=None):
+    """classify_intent for coroutines; the GPT fallback uses analyze_user_intent_async."""
+    key, result = _classify_without_llm(message, threshold)
+    if result is None:
+        async def classify():
+            return _remember_llm_result(key, message, await analyze_user_intent_async(message))
+        result = await async_intent_flights.do(key, classify)
+    return result
+
+
+def intent_stats():
+    """Counts per source plus the share of messages answered without an OpenAI call."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["messages"] or 1
+    stats["fast_path_rate"] = round(stats["fast_path"] / total, 3)
+    stats["cache_hit_rate"] = round(stats["cache_hits"] / total, 3)
+    stats["local_rate"] = round((stats["fast_path"] + stats["cache_hits"]) / total, 3)
+    return stats
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+import telemetry
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry; doubles per attempt, capped at JOB_MAX_BACKOFF
+JOB_BACKOFF = float(os.getenv("JOB_BACKOFF", "2"))
+JOB_MAX_BACKOFF = float(os.getenv("JOB_MAX_BACKOFF", "120"))
+# Seconds a claimed job stays leased to its worker process; renewed while it runs
+JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", "60"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    message TEXT,
+    claimed_by TEXT,
+    lease_until REAL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_job_status_run_after ON job (status, run_after);
+"""
+# Columns added after the first release, as (name, type)
+ADDED_COLUMNS = [("message", "TEXT"), ("claimed_by", "TEXT"), ("lease_until", "REAL")]
+
+log = logging.getLogger("chatbot.jobs")
+
+
+class JobQueue:
+    """
+    Persistent background queue for slow actions (Azure DevOps writes).
+
+    Jobs are rows in a SQLite table, so queued work survives a restart. A
+    claimed job is leased to its process for `lease_timeout` seconds and the
+    lease is renewed while it runs, so only jobs of a process that died (or
+    stalled past its lease) are re-queued, never those another live worker
+    process sharing the database is running. Worker threads claim the oldest
+    due job, call handlers[action](payload) and store the returned text. Exceptions for which `retryable(exc, action)`
+    is true are retried with jittered exponential backoff up to `max_attempts`.
+    `on_finish(job)` is called with the finished job dict (done or failed);
+    text it returns is stored as the job's "message" (the chat message
+    posted for it).
+    """
+
+    def __init__(self, handlers, path=JOB_QUEUE_DB, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS,
+                 backoff=JOB_BACKOFF, max_backoff=JOB_MAX_BACKOFF, retryable=lambda exc, action: True,
+                 on_finish=None, lease_timeout=JOB_LEASE_TIMEOUT):
+        self.handlers = handlers
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable = retryable
+        self.on_finish = on_finish
+        self.lease_timeout = lease_timeout
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def _connect(self):
+        # The database is only created on first use, so importing the app writes nothing
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(job)")}
+            for name, kind in ADDED_COLUMNS:
+                if name not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE job ADD COLUMN {name} {kind}")
+                    except sqlite3.OperationalError:
+                        pass  # added by another process in the meantime
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    @property
+    def owner(self):
+        # Per process, also for workers forked from a master that imported the app
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Starts the worker threads and the lease heartbeat once per process."""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping = False
+            self._stopped.clear()
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, action, payload, user_id=None):
+        """Queues a job and returns its id; the workers are started on first use."""
+        if action not in self.handlers:
+            raise KeyError(f"No job handler for {action!r}")
+        now = time.time()
+        with self._connect() as conn:
+            job_id = conn.execute(
+                "INSERT INTO job (user_id, action, payload, status, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, action, json.dumps(payload), QUEUED, now, now, now),
+            ).lastrowid
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job as a dict, or None."""
+        row = self._connect().conn.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone()
+        return _to_dict(row) if row else None
+
+    def counts(self):
+        """Number of jobs per status."""
+        rows = self._connect().conn.execute("SELECT status, COUNT(*) FROM job GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _claim(self):
+        """
+        Leases the oldest due queued job to this process and marks it running;
+        returns (job, seconds until the next one is due). Running jobs whose
+        lease has expired are re-queued first.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE job SET status = ?, claimed_by = NULL, updated_at = ? "
+                         "WHERE status = ? AND COALESCE(lease_until, 0) < ?", (QUEUED, now, RUNNING, now))
+            row = conn.execute("SELECT * FROM job WHERE status = ? ORDER BY run_after, id LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None, None
+            if row["run_after"] > now:
+                return None, row["run_after"] - now
+            conn.execute("UPDATE job SET status = ?, attempts = attempts + 1, claimed_by = ?, lease_until = ?, "
+                         "updated_at = ? WHERE id = ?", (RUNNING, self.owner, now + self.lease_timeout, now, row["id"]))
+        job = _to_dict(row)
+        job["attempts"] += 1
+        return job, None
+
+    def _work(self):
+        while not self._stopping:
+            try:
+                job, wait = self._claim()
+            except sqlite3.OperationalError:
+                job, wait = None, 1.0
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(min(wait, 5.0) if wait is not None else 5.0)
+                continue
+            self._run(job)
+
+    def _heartbeat(self):
+        """Renews the leases of the jobs this process is running, every third of the lease."""
+        while not self._stopping:
+            try:
+                with self._connect() as conn:
+                    conn.execute("UPDATE job SET lease_until = ? WHERE status = ? AND claimed_by = ?",
+                                 (time.time() + self.lease_timeout, RUNNING, self.owner))
+            except sqlite3.OperationalError:
+                pass  # database busy, renewed on the next beat
+            self._stopped.wait(self.lease_timeout / 3)
+
+    def _run(self, job):
+        # Traced like a request; the status tag is the job's outcome (done, retry or failed)
+        with telemetry.trace(f"job {job['action']}", action=job["action"]) as root:
+            try:
+                result = self.handlers[job["action"]](job["payload"])
+            except Exception as exc:
+                if job["attempts"] < self.max_attempts and self.retryable(exc, job["action"]):
+                    delay = random.uniform(0.5, 1.0) * min(self.max_backoff, self.backoff * 2 ** (job["attempts"] - 1))
+                    self._update(job, QUEUED, error=str(exc), run_after=time.time() + delay)
+                    root.tags["status"] = "retry"
+                    return
+                telemetry.count_error("job", exc)
+                job = self._update(job, FAILED, error=str(exc))
+            else:
+                job = self._update(job, DONE, result=result)
+            root.tags["status"] = job["status"]
+            if self.on_finish:
+                try:
+                    message = self.on_finish(job)
+                except Exception as exc:
+                    telemetry.count_error("job_finish", exc)
+                    log.exception("Posting the result of job %s (%s) failed", job["id"], job["action"])
+                    return
+                if message is not None:
+                    with self._connect() as conn:
+                        conn.execute("UPDATE job SET message = ? WHERE id = ?", (message, job["id"]))
+
+    def _update(self, job, status, result=None, error=None, run_after=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job SET status = ?, result = ?, error = ?, run_after = COALESCE(?, run_after), updated_at = ? "
+                "WHERE id = ?",
+                (status, result, error, run_after, now, job["id"]),
+            )
+        return {**job, "status": status, "result": result, "error": error, "updated_at": now}
+
+
+class _Transaction:
+    """`with` block running BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error) on an autocommit connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _to_dict(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
@@ -1,24 +1,125 @@
 import os
+import time
 import openai
 import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import telemetry
+from flow_control import AsyncConcurrencyLimit, ConcurrencyLimit, UpstreamBusy
+from prompts import (INTENT_PROMPT_VERSION, OPENAI_MODEL, PROMPT_TOKEN_BUDGET, VALID_STATUSES, fit_messages,
+                     intent_request, message_tokens, parse_intent_reply)
 
 openai.api_key = os.getenv("OPENAI_API_KEY")  # Must be defined in .env
+# Optional JSON-lines file with one record per OpenAI call (tokens, latency, prompt variant)
+OPENAI_CALL_LOG = os.getenv("OPENAI_CALL_LOG", "")
+# Admission control: OpenAI calls (streams included) in flight per process (0 = unlimited),
+# callers allowed to wait for a slot, and seconds they wait before getting a "busy" reply
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_QUEUE = int(os.getenv("OPENAI_MAX_QUEUE", "32"))
+OPENAI_QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10"))
+
+# Shared by the sync functions (threads) and, separately, the async ones (event loop)
+openai_limit = ConcurrencyLimit("openai", "OpenAI", OPENAI_MAX_CONCURRENCY, OPENAI_MAX_QUEUE, OPENAI_QUEUE_TIMEOUT)
+async_openai_limit = AsyncConcurrencyLimit("openai", "OpenAI", OPENAI_MAX_CONCURRENCY, OPENAI_MAX_QUEUE,
+                                           OPENAI_QUEUE_TIMEOUT)
+
+call_log = logging.getLogger("chatbot.openai")
+_call_log_lock = threading.Lock()
+
+def log_call(record):
+    """Logs one OpenAI call and appends it to OPENAI_CALL_LOG, for comparing prompt variants offline."""
+    call_log.info("%(purpose)s %(variant)s: %(prompt_tokens)s prompt + %(completion_tokens)s completion tokens "
+                  "in %(latency_ms)s ms", record)
+    if OPENAI_CALL_LOG:
+        with _call_log_lock, open(OPENAI_CALL_LOG, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+@contextmanager
+def openai_call(purpose, messages, variant="default"):
+    """
+    Times one ChatCompletion call as a request span and in the upstream
+    metrics, and logs its token usage. The caller stores the API response in
+    the yielded dict's "response".
+    """
+    call = {}
+    start = time.perf_counter()
+    with telemetry.span(f"openai {purpose}") as span:
+        try:
+            yield call
+            span.tags["status"] = 200
+        except Exception as e:
+            span.tags["status"] = getattr(e, "http_status", None) or "error"
+            telemetry.count_error("openai", e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            telemetry.observe_upstream("openai", purpose, span.tags["status"], elapsed)
+            usage = (call.get("response") or {}).get("usage") or {}
+            telemetry.count_usage(call.get("response") or {})
+            log_call({"purpose": purpose, "variant": variant, "model": OPENAI_MODEL, "status": span.tags["status"],
+                      "estimated_prompt_tokens": message_tokens(messages),
+                      "prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens"),
+                      "latency_ms": round(elapsed * 1000, 1)})
+
+def record_stream(start, messages, chunks, status=200):
+    """Metrics and call log for a streamed reply, recorded once it has been read to the end."""
+    elapsed = time.perf_counter() - start
+    telemetry.add_span("openai stream", elapsed, status=status, chunks=chunks)
+    telemetry.observe_upstream("openai", "stream", status, elapsed)
+    telemetry.count_tokens(completion=chunks)
+    # Streamed replies carry no usage: the prompt is estimated and each chunk counted as one token
+    log_call({"purpose": "stream", "variant": "default", "model": OPENAI_MODEL, "status": status,
+              "estimated_prompt_tokens": message_tokens(messages), "prompt_tokens": None,
+              "completion_tokens": chunks, "latency_ms": round(elapsed * 1000, 1)})
 
-def get_response(conversation_history):
+def get_response(conversation_history, budget=PROMPT_TOKEN_BUDGET):
     """
-    Calls the OpenAI API with the entire conversation context.
-    conversation_history should be a list of dicts: [{"role": "user"|"assistant", "content": "..."}].
+    Calls the OpenAI API with the conversation context, trimmed to `budget` prompt tokens (see prompts.fit_messages).
+    conversation_history should be a list of dicts: [{"role": "user"|"assistant", "content": "..."}] or a single prompt string.
     """
+    messages = fit_messages(conversation_history, budget)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=conversation_history,
-            temperature=0.7
-        )
-        return response["choices"][0]["message"]["content"]
+        with openai_limit, openai_call("reply", messages) as call:
+            call["response"] = openai.ChatCompletion.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7
+            )
+        return call["response"]["choices"][0]["message"]["content"]
     except Exception as e:
         return f"Error from OpenAI: {str(e)}"
 
+def stream_response(conversation_history, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Same as get_response, but yields the reply in chunks as OpenAI generates them (stream=True).
+    The stream holds an OpenAI concurrency slot until it has been read to the end.
+    """
+    messages = fit_messages(conversation_history, budget)
+    chunks = 0
+    try:
+        with openai_limit:
+            start = time.perf_counter()
+            response = openai.ChatCompletion.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            for chunk in response:
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    chunks += 1
+                    yield content
+        record_stream(start, messages, chunks)
+    except UpstreamBusy as e:
+        yield f"Error from OpenAI: {str(e)}"
+    except Exception as e:
+        record_stream(start, messages, chunks, status=getattr(e, "http_status", None) or "error")
+        telemetry.count_error("openai", e)
+        yield f"Error from OpenAI: {str(e)}"
+
 def parse_task_suggestion(user_message, ai_response=""):
     """
     Very simplistic example of how to detect an 'action'
@@ -64,86 +165,89 @@ def parse_task_suggestion(user_message, ai_response=""):
 
     return result
 
-def analyze_user_intent(user_message):
+def analyze_user_intent(user_message, version=INTENT_PROMPT_VERSION):
     """
     Uses GPT to classify the intent and extract structured info from a user's message.
-    Ensures that if action is update_status, the status is from the allowed values.
+    The prompt comes from prompts.intent_request (v2: a compact prompt with the
+    closest few-shot examples, answered through function calling, so the
+    status can only be one of the allowed values).
     """
-    valid_statuses = ["To Do", "In Progress", "Blocked", "Done", "Removed"]
-
-    prompt = f"""
-You are an intelligent assistant that helps manage tasks using Azure DevOps and also responds to friendly small talk.
-
-Classify this user message:
-"{user_message}"
-
-Return a JSON object with:
-- action: One of [create_task, update_time, update_assignment, update_status, list_all_tasks, show_my_tasks, delete_task, show_priority_tasks, summarize_tasks, show_pending_tasks, show_completed_tasks, smalltalk, unknown]
-- parameters: A dictionary of relevant fields (can be empty if not needed)
-
-⚠ IMPORTANT:
-If the action is "update_status", set the status to exactly one of the following:
-{valid_statuses}
-
-Only return the JSON. No explanations.
-
-Examples:
-{{
-  "action": "smalltalk",
-  "parameters": {{}}
-}}
-
-{{
-  "action": "create_task",
-  "parameters": {{
-    "title": "Fix login",
-    "description": "Bug in login flow"
-  }}
-}}
-
-{{
-  "action": "update_time",
-  "parameters": {{
-    "task_title": "Fix login",
-    "time_spent": 2,
-    "time_remaining": 3
-  }}
-}}
-
-{{
-  "action": "update_status",
-  "parameters": {{
-    "task_title": "Fix login",
-    "status": "In Progress"
-  }}
-}}
-
-{{
-  "action": "show_pending_tasks",
-  "parameters": {{}}
-}}
-
-{{
-  "action": "show_completed_tasks",
-  "parameters": {{}}
-}}
-{{
-  "action": "delete_task",
-  "parameters": {{
-    "task_title": "Fix login"
-  }}
-}}
-"""
+    messages, options = intent_request(user_message, version)
+    try:
+        with openai_limit, openai_call("intent", messages, variant=version) as call:
+            call["response"] = openai.ChatCompletion.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0,
+                **options
+            )
+        intent, json_output = parse_intent_reply(call["response"]["choices"][0]["message"])
+        return {
+            **intent,
+            "raw_response": json_output
+        }
+    except Exception as e:
+        return {
+            "action": "unknown",
+            "parameters": {},
+            "raw_response": f"Error: {str(e)}"
+        }
+
+# --- asyncio variants (openai.ChatCompletion.acreate) for the async chat server ---
 
+async def get_response_async(conversation_history, budget=PROMPT_TOKEN_BUDGET):
+    messages = fit_messages(conversation_history, budget)
     try:
-        res = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
-        )
-        json_output = res["choices"][0]["message"]["content"]
+        async with async_openai_limit:
+            with openai_call("reply", messages) as call:
+                call["response"] = await openai.ChatCompletion.acreate(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    temperature=0.7
+                )
+        return call["response"]["choices"][0]["message"]["content"]
+    except Exception as e:
+        return f"Error from OpenAI: {str(e)}"
+
+async def stream_response_async(conversation_history, budget=PROMPT_TOKEN_BUDGET):
+    messages = fit_messages(conversation_history, budget)
+    chunks = 0
+    try:
+        async with async_openai_limit:
+            start = time.perf_counter()
+            response = await openai.ChatCompletion.acreate(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in response:
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    chunks += 1
+                    yield content
+        record_stream(start, messages, chunks)
+    except UpstreamBusy as e:
+        yield f"Error from OpenAI: {str(e)}"
+    except Exception as e:
+        record_stream(start, messages, chunks, status=getattr(e, "http_status", None) or "error")
+        telemetry.count_error("openai", e)
+        yield f"Error from OpenAI: {str(e)}"
+
+async def analyze_user_intent_async(user_message, version=INTENT_PROMPT_VERSION):
+    messages, options = intent_request(user_message, version)
+    try:
+        async with async_openai_limit:
+            with openai_call("intent", messages, variant=version) as call:
+                call["response"] = await openai.ChatCompletion.acreate(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    temperature=0,
+                    **options
+                )
+        intent, json_output = parse_intent_reply(call["response"]["choices"][0]["message"])
         return {
-            **json.loads(json_output),
+            **intent,
             "raw_response": json_output
         }
     except Exception as e:
@@ -151,4 +255,4 @@ Examples:
             "action": "unknown",
             "parameters": {},
             "raw_response": f"Error: {str(e)}"
-        }
\ No newline at end of file
+        }
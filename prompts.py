@@ -0,0 +1,294 @@
+"""
+Prompt construction for the OpenAI calls: the versioned intent
+classification prompt (few-shot examples picked per message, answered
+through function calling) and conversation context trimmed to a token
+budget.
+
+Token counts use tiktoken when it is installed and about four characters
+per token otherwise.
+"""
+import json
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional, only makes the counts exact
+    tiktoken = None
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# Input tokens a chat prompt may use, history included
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+# Most recent chat messages considered as conversation context
+PROMPT_HISTORY_MESSAGES = int(os.getenv("PROMPT_HISTORY_MESSAGES", "20"))
+# "v2": compact prompt with function calling; "v1": the original long few-shot prompt
+INTENT_PROMPT_VERSION = os.getenv("INTENT_PROMPT_VERSION", "v2")
+INTENT_EXAMPLES = int(os.getenv("INTENT_EXAMPLES", "2"))
+
+VALID_STATUSES = ["To Do", "In Progress", "Blocked", "Done", "Removed"]
+ACTIONS = ["create_task", "update_time", "update_assignment", "update_status", "bulk_update_status", "bulk_reassign",
+           "bulk_update_time", "list_all_tasks", "show_my_tasks", "delete_task", "show_priority_tasks",
+           "summarize_tasks", "show_pending_tasks", "show_completed_tasks", "smalltalk", "unknown"]
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+    except Exception:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def message_tokens(messages):
+    """Prompt tokens of a chat message list, including the per-message overhead."""
+    total = 3
+    for message in messages:
+        total += 4 + count_tokens(message.get("content") or "")
+        if message.get("function_call"):
+            total += count_tokens(json.dumps(message["function_call"], separators=(",", ":")))
+    return total
+
+
+def truncate_text(text, max_tokens):
+    """Cuts text to about max_tokens, keeping the start."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens]) + "…"
+    return text[:max_tokens * 4] + "…"
+
+
+def fit_messages(messages, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Returns the messages that fit in `budget` prompt tokens: system messages
+    and the last message are always kept (the last one truncated if it alone
+    is too long), then as many of the most recent other messages as fit, in
+    their original order.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    if not messages:
+        return []
+    if message_tokens(messages) <= budget:
+        return list(messages)
+    system = [m for m in messages[:-1] if m.get("role") == "system"]
+    last = messages[-1]
+    remaining = budget - message_tokens(system + [last])
+    if remaining < 0:
+        room = max(1, budget - message_tokens(system + [{**last, "content": ""}]))
+        return system + [{**last, "content": truncate_text(last.get("content") or "", room)}]
+    kept = []
+    for message in reversed(messages[:-1]):
+        if message.get("role") == "system":
+            continue
+        cost = message_tokens([message]) - 3
+        if cost > remaining:
+            break
+        kept.append(message)
+        remaining -= cost
+    return system + kept[::-1] + [last]
+
+
+# --- Intent classification ---
+
+# (message, action, parameters); the closest ones to the user's message are shown to the model
+INTENT_EXAMPLES_POOL = [
+    ("hi, how are you today?", "smalltalk", {}),
+    ("create a task Fix login: bug in the login flow", "create_task",
+     {"title": "Fix login", "description": "Bug in the login flow"}),
+    ("update time for Fix login: spent 2 remaining 3", "update_time",
+     {"task_title": "Fix login", "time_spent": 2, "time_remaining": 3}),
+    ("mark Fix login as in progress", "update_status", {"task_title": "Fix login", "status": "In Progress"}),
+    ("assign task 42 to alice@example.com", "update_assignment", {"task_id": 42, "assignee": "alice@example.com"}),
+    ("mark all my overdue tasks as blocked", "bulk_update_status", {"status": "Blocked", "scope": "mine", "overdue": True}),
+    ("reassign everything from Alice to Bob", "bulk_reassign", {"from_assignee": "Alice", "to_assignee": "Bob"}),
+    ("log 1 hour each on Fix login and Update docs", "bulk_update_time",
+     {"task_titles": ["Fix login", "Update docs"], "hours": 1}),
+    ("list every task in the backlog", "list_all_tasks", {}),
+    ("what am I assigned to?", "show_my_tasks", {}),
+    ("delete the task Fix login", "delete_task", {"task_title": "Fix login"}),
+    ("what is urgent or due soon?", "show_priority_tasks", {}),
+    ("give me a summary of the sprint", "summarize_tasks", {}),
+    ("which tasks are still open?", "show_pending_tasks", {}),
+    ("which tasks are completed?", "show_completed_tasks", {}),
+]
+
+STOPWORDS = {"a", "an", "the", "to", "of", "on", "in", "for", "and", "is", "are", "my", "me", "i", "it", "what",
+             "which", "all", "as", "be", "can", "you", "please"}
+
+# The action's parameters sit next to it (flat) to keep the schema and the replies short
+INTENT_FUNCTION = {
+    "name": "classify_intent",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "action": {"type": "string", "enum": ACTIONS},
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "due_date": {"type": "string", "description": "YYYY-MM-DD"},
+            "task_title": {"type": "string"},
+            "task_titles": {"type": "array", "items": {"type": "string"}},
+            "task_id": {"type": "integer"},
+            "time_spent": {"type": "number"},
+            "time_remaining": {"type": "number"},
+            "hours": {"type": "number"},
+            "status": {"type": "string", "enum": VALID_STATUSES},
+            "assignee": {"type": "string"},
+            "scope": {"type": "string", "enum": ["mine", "all"]},
+            "overdue": {"type": "boolean"},
+            "from_assignee": {"type": "string"},
+            "to_assignee": {"type": "string"},
+        },
+        "required": ["action"],
+    },
+}
+
+INTENT_SYSTEM_PROMPT = ("Classify messages to an Azure DevOps task assistant with classify_intent. "
+                        "Friendly chat is smalltalk; unclear requests are unknown. Only set fields the message gives.")
+
+
+def _words(text):
+    return set(re.findall(r"[a-z]+", text.lower())) - STOPWORDS
+
+
+def _example_words(example):
+    # Only the phrasing counts, not the sample titles and names in the parameters
+    message, _, parameters = example
+    return _words(message) - _words(" ".join(str(value) for value in parameters.values()))
+
+
+def select_examples(message, limit=INTENT_EXAMPLES):
+    """The `limit` pool examples sharing the most words with the message (none when nothing overlaps)."""
+    words = _words(message)
+    scored = [(len(words & _example_words(example)), n, example) for n, example in enumerate(INTENT_EXAMPLES_POOL)]
+    scored = [entry for entry in scored if entry[0] > 0]
+    scored.sort(key=lambda entry: (-entry[0], entry[1]))
+    return [example for _, _, example in scored[:limit]]
+
+
+def intent_prompt(user_message):
+    """The v1 classification prompt: one long user message with fixed examples and a JSON answer."""
+    return f"""
+You are an intelligent assistant that helps manage tasks using Azure DevOps and also responds to friendly small talk.
+
+Classify this user message:
+"{user_message}"
+
+Return a JSON object with:
+- action: One of [{", ".join(ACTIONS)}]
+- parameters: A dictionary of relevant fields (can be empty if not needed)
+
+⚠ IMPORTANT:
+If the action is "update_status" or "bulk_update_status", set the status to exactly one of the following:
+{VALID_STATUSES}
+
+Only return the JSON. No explanations.
+
+Examples:
+{{
+  "action": "smalltalk",
+  "parameters": {{}}
+}}
+
+{{
+  "action": "create_task",
+  "parameters": {{
+    "title": "Fix login",
+    "description": "Bug in login flow"
+  }}
+}}
+
+{{
+  "action": "update_time",
+  "parameters": {{
+    "task_title": "Fix login",
+    "time_spent": 2,
+    "time_remaining": 3
+  }}
+}}
+
+{{
+  "action": "update_status",
+  "parameters": {{
+    "task_title": "Fix login",
+    "status": "In Progress"
+  }}
+}}
+
+{{
+  "action": "bulk_update_status",
+  "parameters": {{
+    "status": "Blocked",
+    "scope": "mine",
+    "overdue": true
+  }}
+}}
+
+{{
+  "action": "bulk_reassign",
+  "parameters": {{
+    "from_assignee": "Alice",
+    "to_assignee": "Bob"
+  }}
+}}
+
+{{
+  "action": "bulk_update_time",
+  "parameters": {{
+    "task_titles": ["Fix login", "Update docs"],
+    "hours": 1
+  }}
+}}
+
+{{
+  "action": "show_pending_tasks",
+  "parameters": {{}}
+}}
+
+{{
+  "action": "show_completed_tasks",
+  "parameters": {{}}
+}}
+{{
+  "action": "delete_task",
+  "parameters": {{
+    "task_title": "Fix login"
+  }}
+}}
+"""
+
+
+def intent_request(user_message, version=INTENT_PROMPT_VERSION):
+    """Returns (messages, extra ChatCompletion arguments) classifying user_message with the given prompt version."""
+    if version == "v1":
+        return [{"role": "user", "content": intent_prompt(user_message)}], {}
+    messages = [{"role": "system", "content": INTENT_SYSTEM_PROMPT}]
+    for example, action, parameters in select_examples(user_message):
+        messages.append({"role": "user", "content": example})
+        messages.append({"role": "assistant", "content": None, "function_call": {
+            "name": INTENT_FUNCTION["name"],
+            "arguments": json.dumps({"action": action, **parameters}, separators=(",", ":"))}})
+    messages.append({"role": "user", "content": user_message})
+    return messages, {"functions": [INTENT_FUNCTION], "function_call": {"name": INTENT_FUNCTION["name"]}}
+
+
+def parse_intent_reply(message):
+    """
+    Returns ({"action", "parameters"}, raw JSON text) from a classification
+    reply: a v2 function call (flat fields) or v1 JSON content.
+    """
+    function_call = message.get("function_call")
+    raw = function_call["arguments"] if function_call else message.get("content") or ""
+    intent = json.loads(raw)
+    if function_call:
+        return {"action": intent.pop("action", "unknown"), "parameters": intent}, raw
+    if not isinstance(intent.get("parameters"), dict):
+        intent["parameters"] = {}
+    return intent, raw
@@ -0,0 +1,154 @@
+"""
+Cache for OpenAI answers whose prompt is fully determined by a few inputs
+(task summaries, error explanations), keyed on a hash of those inputs.
+Concurrent misses for one key share a single OpenAI call through
+response_flights / async_response_flights.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+from flow_control import AsyncSingleFlight, SingleFlight
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Seconds an answer is reused; summaries are also invalidated by any change to their tasks
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+# Optional SQLite file that keeps answers across restarts and worker processes
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def cache_key(kind, *parts):
+    """Stable hash of the prompt inputs."""
+    raw = json.dumps([kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def task_snapshot(tasks):
+    """(id, rev) pairs identifying the exact version of the tasks a prompt was built from."""
+    return [(task.id, task.rev) for task in tasks]
+
+
+def error_signature(error_message):
+    """
+    The error with its variable parts (URLs, GUIDs, ids) replaced by
+    placeholders, so repeats of the same failure share a key. HTTP status
+    codes, TF error codes and quoted field names are kept.
+    """
+    signature = re.sub(r"https?://\S+", "<url>", str(error_message))
+    signature = re.sub(r"\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b", "<guid>", signature)
+    signature = re.sub(r"\b(?![1-5]\d\d\b)\d+\b", "<n>", signature)
+    return re.sub(r"\s+", " ", signature).strip()
+
+
+def is_error_reply(text):
+    """OpenAI failures come back as text from openai_utils; they are never cached."""
+    return text.startswith("Error from OpenAI")
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of answers with a TTL, in front of an optional SQLite
+    tier (`path`). Memory misses fall back to the file and promote what
+    they find. Hits and misses are counted in stats() and in the
+    chatbot_cache_requests_total metric (cache="responses").
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, path=RESPONSE_CACHE_DB):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            conn = self._connect()
+            conn.execute(SCHEMA)
+            conn.execute("DELETE FROM response WHERE created_at < ?", (time.time() - ttl,))
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, result):
+        with self._lock:
+            self._stats[result] += 1
+        telemetry.count_cache("responses", {"hits": "hit", "disk_hits": "disk_hit", "misses": "miss"}[result])
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            elif entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self._count("hits")
+            return entry[0]
+        if self.path:
+            try:
+                row = self._connect().execute("SELECT value, created_at FROM response WHERE key = ?", (key,)).fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            if row and now - row[1] < self.ttl:
+                self._remember(key, row[0], row[1])
+                self._count("disk_hits")
+                return row[0]
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        now = time.time()
+        self._remember(key, value, now)
+        if self.path:
+            try:
+                self._connect().execute("INSERT OR REPLACE INTO response (key, value, created_at) VALUES (?, ?, ?)",
+                                        (key, value, now))
+            except sqlite3.OperationalError:
+                pass
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._entries[key] = (value, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._connect().execute("DELETE FROM response")
+
+    def stats(self):
+        """Counts plus the share of lookups answered from memory or disk."""
+        with self._lock:
+            stats = dict(self._stats)
+        total = sum(stats.values()) or 1
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / total, 3)
+        return stats
+
+
+response_cache = ResponseCache()
+response_flights = SingleFlight("responses")
+async_response_flights = AsyncSingleFlight("responses")
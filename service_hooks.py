@@ -0,0 +1,117 @@
+"""
+Receiver for Azure DevOps service hooks (Web Hooks subscriptions) on
+work-item events, so edits made outside the chat reach the backlog cache
+when they happen instead of at the next poll.
+"""
+import hmac
+import threading
+from collections import OrderedDict
+
+import telemetry
+from work_item import WorkItem
+
+EVENT_TYPES = ("workitem.created", "workitem.updated", "workitem.deleted", "workitem.restored")
+
+
+def event_work_item_id(resource):
+    # workitem.updated resources are updates: their "id" is the update number
+    return resource.get("workItemId", resource.get("id"))
+
+
+def event_work_item(payload):
+    """
+    The work item a work-item event carries, in REST shape, or None when the
+    subscription only sends minimal resource details.
+    """
+    resource = payload.get("resource") or {}
+    if payload.get("eventType") == "workitem.updated":
+        item = resource.get("revision")
+    else:
+        item = resource
+    if not item or "fields" not in item or "id" not in item:
+        return None
+    return item
+
+
+class ServiceHookReceiver:
+    """
+    Applies service-hook events to a WorkItemCache at their revision
+    (WorkItemCache.apply orders them by rev). Event ids are remembered, so
+    a delivery retried by Azure DevOps is acknowledged without being applied
+    again. `fetch_item(id)` loads an item whose event came without details;
+    events from other projects are ignored. Outcomes are counted in the
+    chatbot_service_hook_events_total metric.
+    """
+
+    def __init__(self, cache, fetch_item, project=None, secret="", remember=10000):
+        self.cache = cache
+        self.fetch_item = fetch_item
+        self.project = project
+        self.secret = secret
+        self.remember = remember
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.secret)
+
+    def authorized(self, secret):
+        """Whether a request presented the shared secret (never true while no secret is configured)."""
+        return self.enabled and hmac.compare_digest(str(secret or "").encode(), self.secret.encode())
+
+    def _seen_before(self, event_id):
+        with self._lock:
+            if event_id in self._seen:
+                self._seen.move_to_end(event_id)
+                return True
+            return False
+
+    def _remember(self, event_id):
+        with self._lock:
+            self._seen[event_id] = True
+            while len(self._seen) > self.remember:
+                self._seen.popitem(last=False)
+
+    def handle(self, payload):
+        """
+        Applies one event payload; returns "applied", "duplicate" (event id
+        already handled), "stale" (an older revision than the cached one) or
+        "ignored" (other event types and projects, items that no longer exist).
+        """
+        event_type = payload.get("eventType")
+        event_id = payload.get("id")
+        if event_id and self._seen_before(event_id):
+            result = "duplicate"
+        elif event_type not in EVENT_TYPES:
+            result = "ignored"
+        else:
+            result = self._apply(event_type, payload)
+            if event_id:
+                self._remember(event_id)
+        telemetry.count_hook_event(event_type or "unknown", result)
+        return result
+
+    def _apply(self, event_type, payload):
+        resource = payload.get("resource") or {}
+        work_item_id = event_work_item_id(resource)
+        if work_item_id is None:
+            return "ignored"
+        item = event_work_item(payload)
+        deleted = event_type == "workitem.deleted"
+        if item is None and deleted and "rev" not in resource:
+            # Nothing to order it by; deletions are final until a restore
+            self.cache.remove(work_item_id)
+            return "applied"
+        if item is None and deleted:
+            item = {"id": work_item_id, "rev": resource["rev"]}
+        elif item is None:
+            item = self.fetch_item(int(work_item_id))
+            if item is None:
+                return "ignored"
+        project = item.get("fields", {}).get("System.TeamProject")
+        if self.project and project and project != self.project:
+            return "ignored"
+        applied = self.cache.apply(WorkItem.from_json(item), deleted=deleted,
+                                   restored=event_type == "workitem.restored")
+        return "applied" if applied else "stale"
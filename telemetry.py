@@ -0,0 +1,293 @@
+"""
+Lightweight request tracing and Prometheus metrics, with no external collector.
+
+Spans are timed blocks (`with span("intent"):`) nested under the current
+request's root span (`with trace("POST /"):`); the current span lives in a
+contextvar, so nesting follows threads and asyncio tasks. Each finished span
+is observed in the chatbot_span_seconds histogram, tagged with the request's
+classified action; the root is observed in chatbot_request_seconds with the
+HTTP status. Requests slower than SLOW_REQUEST_MS are logged with their span
+tree to the "chatbot.slow" logger.
+
+Counters and histograms are kept in-process and rendered in the Prometheus
+text format by render_metrics() (served at /metrics). With several worker
+processes each one reports its own numbers.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Log the span tree of requests slower than this many milliseconds (0 = off)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+slow_log = logging.getLogger("chatbot.slow")
+
+
+# --- Metrics ---
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+request_seconds = _register(Histogram(
+    "chatbot_request_seconds", "Time to serve a request.", ["route", "action", "status"]))
+span_seconds = _register(Histogram(
+    "chatbot_span_seconds", "Time spent in each stage of a request.", ["span", "action"]))
+upstream_requests = _register(Counter(
+    "chatbot_upstream_requests_total", "Calls to Azure DevOps and OpenAI.", ["service", "endpoint", "status"]))
+upstream_seconds = _register(Histogram(
+    "chatbot_upstream_seconds", "Latency of calls to Azure DevOps and OpenAI.", ["service", "endpoint"]))
+openai_tokens = _register(Counter(
+    "chatbot_openai_tokens_total", "OpenAI tokens (streamed replies count one token per chunk).", ["kind"]))
+cache_requests = _register(Counter(
+    "chatbot_cache_requests_total", "Cache lookups by cache and result (hit, miss, stale).", ["cache", "result"]))
+errors = _register(Counter(
+    "chatbot_errors_total", "Errors by stage and exception type.", ["stage", "type"]))
+coalesced_calls = _register(Counter(
+    "chatbot_coalesced_calls_total", "Calls that waited for an identical call in flight instead of making their own.",
+    ["call"]))
+upstream_rejected = _register(Counter(
+    "chatbot_upstream_rejected_total", "Upstream calls refused by admission control (queue_full, timeout).",
+    ["service", "reason"]))
+upstream_wait_seconds = _register(Histogram(
+    "chatbot_upstream_wait_seconds", "Time calls queued for an upstream concurrency slot.", ["service"]))
+hook_events = _register(Counter(
+    "chatbot_service_hook_events_total", "Azure DevOps service-hook events by type and outcome.",
+    ["event", "result"]))
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_upstream(service, endpoint, status, seconds):
+    upstream_requests.inc(service=service, endpoint=endpoint, status=status)
+    upstream_seconds.observe(seconds, service=service, endpoint=endpoint)
+
+
+def count_tokens(prompt=0, completion=0):
+    if prompt:
+        openai_tokens.inc(prompt, kind="prompt")
+    if completion:
+        openai_tokens.inc(completion, kind="completion")
+
+
+def count_usage(response):
+    """Adds the token usage of a (non-streamed) ChatCompletion response."""
+    usage = response.get("usage") or {}
+    count_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+
+def count_cache(cache, result):
+    cache_requests.inc(cache=cache, result=result)
+
+
+def count_coalesced(call):
+    coalesced_calls.inc(call=call)
+
+
+def count_rejected(service, reason):
+    upstream_rejected.inc(service=service, reason=reason)
+
+
+def observe_wait(service, seconds):
+    upstream_wait_seconds.observe(seconds, service=service)
+
+
+def count_hook_event(event, result):
+    hook_events.inc(event=event, result=result)
+
+
+def count_error(stage, exc):
+    errors.inc(stage=stage, type=type(exc).__name__ if isinstance(exc, BaseException) else str(exc))
+
+
+# --- Spans ---
+
+class Span:
+    __slots__ = ("name", "tags", "parent", "children", "start", "duration")
+
+    def __init__(self, name, tags, parent=None):
+        self.name = name
+        self.tags = tags
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self.duration = None
+
+    @property
+    def root(self):
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def format_tree(self, depth=0):
+        tags = " ".join(f"{key}={value}" for key, value in self.tags.items())
+        duration = (self.duration if self.duration is not None else time.perf_counter() - self.start) * 1000
+        lines = [f"{'  ' * depth}{self.name} {duration:.1f} ms {tags}".rstrip()]
+        for child in list(self.children):
+            lines.extend(child.format_tree(depth + 1))
+        return lines
+
+
+_current = contextvars.ContextVar("chatbot_span", default=None)
+
+
+def _reset(token, previous):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Closed from another context, e.g. a generator abandoned by its consumer
+        _current.set(previous)
+
+
+def current_span():
+    return _current.get()
+
+
+def tag(**tags):
+    """Adds tags to the current request's root span (e.g. the classified action)."""
+    span = _current.get()
+    if span is not None:
+        span.root.tags.update(tags)
+
+
+@contextmanager
+def span(name, **tags):
+    """Times a stage of the current request; a no-op parent is fine outside requests."""
+    parent = _current.get()
+    current = Span(name, tags, parent)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.tags.setdefault("error", type(exc).__name__)
+        raise
+    finally:
+        _reset(token, parent)
+        current.duration = time.perf_counter() - current.start
+        span_seconds.observe(current.duration, span=name, action=current.root.tags.get("action", ""))
+
+
+def add_span(name, duration, **tags):
+    """
+    Records an already finished stage (e.g. a streamed reply timed by its
+    generator, where a `with span()` would outlive the caller's context).
+    """
+    parent = _current.get()
+    finished = Span(name, tags, parent)
+    finished.start -= duration
+    finished.duration = duration
+    if parent is not None:
+        parent.children.append(finished)
+    span_seconds.observe(duration, span=name, action=finished.root.tags.get("action", ""))
+
+
+@contextmanager
+def trace(route, **tags):
+    """
+    Root span for one request. Set the HTTP status with
+    `root.tags["status"] = ...` (defaults to 200, or 500 on an exception).
+    """
+    root = Span(route, dict(tags))
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException:
+        root.tags.setdefault("status", 500)
+        raise
+    finally:
+        _reset(token, None)
+        root.duration = time.perf_counter() - root.start
+        root.tags.setdefault("status", 200)
+        request_seconds.observe(root.duration, route=route, action=root.tags.get("action", ""),
+                                status=root.tags["status"])
+        if SLOW_REQUEST_MS and root.duration * 1000 >= SLOW_REQUEST_MS:
+            slow_log.warning("Slow request:\n%s", "\n".join(root.format_tree()))
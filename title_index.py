@@ -0,0 +1,199 @@
+import re
+import threading
+from collections import defaultdict, namedtuple
+
+# Below this score a title is not considered a match at all
+MIN_MATCH_SCORE = 0.45
+# Candidates within this score of the best one make the lookup ambiguous
+AMBIGUITY_MARGIN = 0.05
+# A strict lookup (the target of a write) only accepts a title that has every
+# query token, or one scoring at least this with a clear lead over the runner-up
+STRICT_MATCH_SCORE = 0.85
+STRICT_MATCH_LEAD = 0.15
+# Vocabulary tokens at least this trigram-similar to a query token stand in for it (typos)
+FUZZY_TOKEN_SIMILARITY = 0.3
+# Upper bound on candidates scored per lookup, keeps common words cheap at 100k items
+MAX_CANDIDATES = 500
+# Candidates re-ranked with full-title trigram similarity
+RERANK_CANDIDATES = 25
+
+TitleMatch = namedtuple("TitleMatch", ["id", "title", "score"])
+TitleLookup = namedtuple("TitleLookup", ["match", "candidates", "ambiguous"])
+
+
+def normalize_title(title):
+    return " ".join(re.findall(r"[a-z0-9]+", title.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TitleIndex:
+    """
+    Fuzzy work-item title lookup.
+
+    Keeps a token -> item IDs inverted index and a trigram -> token index over
+    the title vocabulary, so a misspelled query token ("crerate") is expanded
+    to the closest known tokens instead of scanning every title. Candidates are
+    ranked by IDF-weighted token coverage and then by whole-title trigram
+    similarity. Kept up to date by WorkItemCache through rebuild/add/remove.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._titles = {}
+        self._postings = defaultdict(set)
+        self._token_trigrams = defaultdict(set)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def rebuild(self, items):
+        with self._lock:
+            self._titles = {}
+            self._postings = defaultdict(set)
+            self._token_trigrams = defaultdict(set)
+            for item in items:
+                self._add(item)
+
+    def add(self, item):
+        with self._lock:
+            self._remove(item.id)
+            self._add(item)
+
+    def remove(self, work_item_id):
+        with self._lock:
+            self._remove(int(work_item_id))
+
+    def _add(self, item):
+        title = item.title
+        if not title:
+            return
+        self._titles[item.id] = title
+        for token in set(normalize_title(title).split()):
+            if token not in self._postings:
+                for gram in trigrams(token):
+                    self._token_trigrams[gram].add(token)
+            self._postings[token].add(item.id)
+
+    def _remove(self, work_item_id):
+        title = self._titles.pop(work_item_id, None)
+        if title is None:
+            return
+        for token in set(normalize_title(title).split()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(work_item_id)
+            if not postings:
+                del self._postings[token]
+                for gram in trigrams(token):
+                    self._token_trigrams[gram].discard(token)
+
+    def _expand(self, token):
+        """Known tokens standing in for a query token, with their similarity (1.0 for exact)."""
+        if token in self._postings:
+            return {token: 1.0}
+        grams = trigrams(token)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for known in self._token_trigrams.get(gram, ()):
+                overlap[known] += 1
+        expanded = {}
+        for known, shared in overlap.items():
+            score = shared / (len(grams) + len(trigrams(known)) - shared)
+            if score >= FUZZY_TOKEN_SIMILARITY:
+                expanded[known] = score
+        return expanded
+
+    def search(self, query, limit=5):
+        """Returns up to `limit` TitleMatch results, best first."""
+        normalized = normalize_title(query)
+        tokens = normalized.split()
+        if not tokens:
+            return []
+        with self._lock:
+            total = len(self._titles) or 1
+            # Per query token: (weight, [(similarity, item IDs)], size); rarer tokens weigh more
+            terms = []
+            for token in dict.fromkeys(tokens):
+                postings = [(sim, self._postings[known]) for known, sim in self._expand(token).items()]
+                size = sum(len(ids) for _, ids in postings)
+                if size:
+                    terms.append((1.0 + (total / size) ** 0.5, postings, size))
+            if not terms:
+                return []
+            weight_total = sum(weight for weight, _, _ in terms) + len(dict.fromkeys(tokens)) - len(terms)
+
+            # Candidates come from the rarest tokens first so common words stay cheap;
+            # when even the rarest token is common, keep items that also have the next ones
+            ordered = sorted(terms, key=lambda term: term[2])
+            candidates = set()
+            for _, postings, size in ordered:
+                if candidates and len(candidates) + size > MAX_CANDIDATES:
+                    break
+                for _, ids in postings:
+                    candidates.update(ids)
+            for _, postings, _ in ordered[1:]:
+                if len(candidates) <= MAX_CANDIDATES:
+                    break
+                narrowed = set().union(*(candidates & ids for _, ids in postings))
+                if narrowed:
+                    candidates = narrowed
+
+            coverage = []
+            for work_item_id in candidates:
+                score = 0.0
+                for weight, postings, _ in terms:
+                    best = 0.0
+                    for sim, ids in postings:
+                        if sim > best and work_item_id in ids:
+                            best = sim
+                    score += weight * best
+                coverage.append((score / weight_total, work_item_id))
+            coverage.sort(reverse=True)
+
+            query_grams = trigrams(normalized)
+            results = []
+            for token_score, work_item_id in coverage[:RERANK_CANDIDATES]:
+                title = self._titles[work_item_id]
+                normalized_title = normalize_title(title)
+                score = 0.6 * token_score + 0.4 * similarity(query_grams, trigrams(normalized_title))
+                if normalized_title == normalized:
+                    score = 1.0
+                results.append(TitleMatch(work_item_id, title, round(min(score, 1.0), 4)))
+        results.sort(key=lambda match: match.score, reverse=True)
+        return results[:limit]
+
+    def lookup(self, query, limit=5, strict=False):
+        """
+        Returns TitleLookup(match, candidates, ambiguous).
+        match is the best TitleMatch when it is good enough and clearly ahead
+        of the runner-up; otherwise it is None and candidates lists the options.
+        With strict=True the best title must also contain every query token,
+        or score STRICT_MATCH_SCORE and lead the runner-up by STRICT_MATCH_LEAD;
+        a near miss leaves match None with the candidates (not ambiguous).
+        """
+        results = self.search(query, limit)
+        candidates = [c for c in results if c.score >= MIN_MATCH_SCORE]
+        if not candidates:
+            return TitleLookup(None, [], False)
+        best = candidates[0]
+        rivals = [c for c in candidates[1:] if c.score >= best.score - AMBIGUITY_MARGIN]
+        if rivals:
+            return TitleLookup(None, [best] + rivals, True)
+        if strict:
+            runner_up = results[1].score if len(results) > 1 else 0.0
+            has_tokens = set(normalize_title(query).split()) <= set(normalize_title(best.title).split())
+            if not has_tokens and (best.score < STRICT_MATCH_SCORE or best.score - runner_up < STRICT_MATCH_LEAD):
+                return TitleLookup(None, candidates, False)
+        return TitleLookup(best, candidates, False)
@@ -0,0 +1,82 @@
+"""
+Compiles backlog queries into WIQL so Azure DevOps does the filtering.
+
+WiqlBacklog answers the same queries as backlog_view.BacklogView
+(assigned_to, in_states, not_in_states, due_before) by sending one targeted
+WIQL query with [System.AssignedTo] / [System.State] /
+[Microsoft.VSTS.Scheduling.DueDate] predicates, then fetching only the
+matching items. Results are paged and returned by ID, so due_before sorts
+its items by due date itself. It is used while the backlog cache is not
+loaded, so a listing does not have to wait for the whole project.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+
+from backlog_view import assignee_key
+
+DUE_DATE = "[Microsoft.VSTS.Scheduling.DueDate]"
+
+
+def wiql_literal(value):
+    """A WIQL string literal (single quotes doubled)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@lru_cache(maxsize=64)
+def compile_plan(query, state_count=0, by_assignee=False):
+    """
+    The WIQL template for one query shape, with {project}, {assignee}, {due}
+    (the day after the last one) and {state0}... placeholders; cached, so
+    each shape is built once.
+    """
+    where = ["[System.TeamProject] = {project}"]
+    if by_assignee:
+        where.append("[System.AssignedTo] = {assignee}")
+    states = ", ".join(f"{{state{n}}}" for n in range(state_count))
+    if query == "in_states":
+        where.append(f"[System.State] IN ({states})")
+    elif query == "not_in_states" and state_count:
+        where.append(f"[System.State] NOT IN ({states})")
+    elif query == "due_before":
+        # "< next day" also includes items due later on the last day when times are compared
+        where.append(f"{DUE_DATE} < {{due}}")
+    return f"SELECT [System.Id] FROM WorkItems WHERE {' AND '.join(where)} ORDER BY [System.Id] ASC"
+
+
+def compile_query(query, project, assignee=None, states=(), due=None):
+    """Binds the cached plan for `query` to the given values; returns the WIQL text."""
+    states = sorted({state.lower() for state in states})
+    plan = compile_plan(query, len(states), assignee is not None)
+    values = {"project": wiql_literal(project), "assignee": wiql_literal(assignee_key(assignee) if assignee else ""),
+              "due": wiql_literal((due + timedelta(days=1)).isoformat() if due else "")}
+    values.update({f"state{n}": wiql_literal(state) for n, state in enumerate(states)})
+    return plan.format(**values)
+
+
+class WiqlBacklog:
+    """
+    BacklogView's query methods, answered by Azure DevOps. `run_query(wiql)`
+    returns the matching work items (work_item.WorkItem) by ID.
+    """
+
+    def __init__(self, run_query, project):
+        self.run_query = run_query
+        self.project = project
+
+    def _run(self, query, **values):
+        return self.run_query(compile_query(query, self.project, **values))
+
+    def due_before(self, last_day, assignee=None):
+        today = date.today().toordinal()
+        items = sorted((item for item in self._run("due_before", due=last_day, assignee=assignee)
+                        if item.due is not None), key=lambda item: (item.due, item.id))
+        return [(item, item.due - today) for item in items]
+
+    def assigned_to(self, assignee):
+        return self._run("assigned_to", assignee=assignee)
+
+    def in_states(self, states):
+        return self._run("in_states", states=states) if states else []
+
+    def not_in_states(self, states):
+        return self._run("not_in_states", states=states)
@@ -0,0 +1,81 @@
+"""
+Compact in-memory work items.
+
+The REST payload of a work item is a nested dict (fields, identity dicts,
+URLs) of a few KB. WorkItem keeps only what the app reads, in __slots__:
+state and assignee strings are interned so items share them, and the due
+date is a date ordinal. The cache, its indexes and the chat actions all work
+on WorkItem; raw payloads are converted with WorkItem.from_json().
+"""
+import sys
+from datetime import date
+
+from backlog_view import assignee_key, assignee_name, due_ordinal
+
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+class WorkItem:
+    __slots__ = ("id", "rev", "title", "state", "assignee", "assignee_name", "due", "changed", "remaining",
+                 "completed")
+
+    def __init__(self, id, rev=0, title=None, state=None, assignee="", assignee_name="", due=None, changed=None,
+                 remaining=None, completed=None):
+        self.id = id
+        self.rev = rev
+        self.title = title
+        self.state = _intern(state)
+        # Lowercase email (backlog_view.assignee_key) and display name
+        self.assignee = _intern(assignee)
+        self.assignee_name = _intern(assignee_name)
+        # Date ordinal, or None
+        self.due = due
+        # System.ChangedDate as sent by Azure DevOps (the cache's delta-sync watermark)
+        self.changed = changed
+        self.remaining = remaining
+        self.completed = completed
+
+    @classmethod
+    def from_json(cls, item):
+        """Builds a WorkItem from a REST work item (any subset of fields)."""
+        fields = item.get("fields", {})
+        assigned_to = fields.get("System.AssignedTo")
+        state = fields.get("System.State")
+        return cls(item["id"], item.get("rev", 0), fields.get("System.Title"),
+                   str(state) if state is not None else None,
+                   assignee_key(assigned_to), assignee_name(assigned_to), due_ordinal(item),
+                   fields.get("System.ChangedDate"), _number(fields.get("Microsoft.VSTS.Scheduling.RemainingWork")),
+                   _number(fields.get("Microsoft.VSTS.Scheduling.CompletedWork")))
+
+    def to_row(self):
+        """A JSON-serializable list, read back by from_row() (backlog_store)."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls.from_json(row) if isinstance(row, dict) else cls(*row)
+
+    @property
+    def due_date(self):
+        return date.fromordinal(self.due) if self.due is not None else None
+
+    @property
+    def assigned_to(self):
+        """"Display Name <email>", as System.AssignedTo is written."""
+        if self.assignee_name and self.assignee and self.assignee_name != self.assignee:
+            return f"{self.assignee_name} <{self.assignee}>"
+        return self.assignee_name or self.assignee
+
+    def __repr__(self):
+        return f"WorkItem(id={self.id!r}, rev={self.rev!r}, title={self.title!r}, state={self.state!r})"
+
+
+def as_work_item(item):
+    """item as a WorkItem (REST payloads are converted)."""
+    return item if isinstance(item, WorkItem) else WorkItem.from_json(item)
@@ -0,0 +1,384 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import telemetry
+from work_item import as_work_item
+
+# Seconds a loaded backlog is served before a background delta refresh is started
+WORK_ITEM_CACHE_TTL = float(os.getenv("WORK_ITEM_CACHE_TTL", "60"))
+# Seconds between full reloads; deleted items never show up in a ChangedDate query
+WORK_ITEM_CACHE_FULL_SYNC = float(os.getenv("WORK_ITEM_CACHE_FULL_SYNC", "3600"))
+
+
+def _changed_date(value):
+    """Parses System.ChangedDate (e.g. 2024-05-01T12:34:56.37Z) into a datetime for comparison."""
+    if not value:
+        return None
+    value = value.rstrip("Z")
+    if "." in value:
+        value, fraction = value.split(".", 1)
+        value = f"{value}.{fraction[:6].ljust(6, '0')}"
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+
+
+def _latest_change(items, current=None):
+    """Returns the newest System.ChangedDate string among items (or current if none is newer)."""
+    latest, latest_dt = current, None
+    if current:
+        latest_dt = _changed_date(current)
+    for item in items:
+        dt = _changed_date(item.changed)
+        if dt and (latest_dt is None or dt > latest_dt):
+            latest, latest_dt = item.changed, dt
+    return latest
+
+
+def _fresh(state, ttl):
+    """Whether a shared snapshot was published less than ttl seconds ago."""
+    return state.refreshed_at is not None and time.time() - state.refreshed_at < ttl
+
+
+class WorkItemCache:
+    """
+    In-memory copy of the project's work items, as compact work_item.WorkItem
+    records (loaders and upsert() may pass REST payloads).
+
+    The first get() loads the whole project. After that the cached items are
+    returned immediately; once they are older than `ttl` seconds a background
+    refresh asks Azure DevOps only for items changed since the watermark (the
+    newest System.ChangedDate seen so far) while callers keep getting the
+    previous snapshot. Local writes are applied with upsert()/remove().
+
+    `indexes` are derived views (e.g. title_index.TitleIndex) with
+    rebuild(items), add(item) and remove(id); they are rebuilt on full loads
+    and updated item by item afterwards.
+
+    With a `store` (backlog_store.BacklogStore) the worker processes share
+    one snapshot: a refresh first looks at the store, only the worker holding
+    its lease calls Azure DevOps, and everyone copies the rows published
+    since the version they hold. Local writes are published there too.
+
+    Changes pushed by Azure DevOps (service_hooks) go through apply(), which
+    orders them by revision and remembers deletions. When changes are pushed,
+    `sync_interval` (default: ttl) can be made much longer than ttl: stale
+    revalidations then only ask Azure DevOps every sync_interval seconds, as a
+    safety net for missed events, while shared workers keep pulling the
+    store every ttl.
+
+    With a `snapshot` (backlog_snapshot.BacklogSnapshot), the items and
+    watermark are saved to disk in the background after refreshes that
+    changed something, and a restarted process starts from the saved copy:
+    the first refresh then only asks for what changed since its watermark
+    (or, shared, pulls what was published since its store version).
+    """
+
+    def __init__(self, load_all, load_changed, ttl=WORK_ITEM_CACHE_TTL, full_sync=WORK_ITEM_CACHE_FULL_SYNC,
+                 indexes=(), store=None, sync_interval=None, snapshot=None):
+        self._load_all = load_all
+        self._load_changed = load_changed
+        self.indexes = list(indexes)
+        self.store = store
+        self.snapshot = snapshot
+        self.version = 0
+        self.ttl = ttl
+        self.sync_interval = sync_interval or ttl
+        self.full_sync = full_sync
+        self.watermark = None
+        self.refreshed_at = None
+        self.synced_at = None
+        self.full_synced_at = None
+        self._items = {}
+        # Revision at which pushed deletions happened, so late updates do not bring items back
+        self._deleted = {}
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._background = None
+        # When a first load started by load_in_background() last failed
+        self._load_failed_at = None
+        # Whether the items changed since the last snapshot save
+        self._dirty = False
+        self._snapshot_checked = False
+        self._saving = None
+
+    @property
+    def loaded(self):
+        return self.refreshed_at is not None
+
+    def ensure_loaded(self):
+        """Loads the backlog on first use and starts a background revalidation when stale."""
+        if self.refreshed_at is None:
+            telemetry.count_cache("work_items", "miss")
+            with self._refresh_lock:
+                if self.refreshed_at is None:
+                    self._refresh()
+        elif time.monotonic() - self.refreshed_at >= self.ttl:
+            telemetry.count_cache("work_items", "stale")
+            self._refresh_in_background()
+        else:
+            telemetry.count_cache("work_items", "hit")
+
+    def warm_start(self):
+        """
+        Loads the on-disk snapshot, if there is a usable one (run at startup).
+        It is served as a stale cache: get() returns it at once while a
+        background refresh catches up on what changed since it was saved.
+        """
+        if self.snapshot is None:
+            return
+        with self._refresh_lock:
+            if self.refreshed_at is not None or self._snapshot_checked or not self._load_snapshot():
+                return
+            self.refreshed_at = time.monotonic() - self.ttl
+        self._refresh_in_background()
+
+    def load_in_background(self):
+        """
+        Starts the first load in a background thread, without waiting for it
+        (a no-op once loaded, while loading and for `ttl` seconds after a
+        failed attempt). ensure_loaded() callers wait for that load.
+        """
+        if self.refreshed_at is not None:
+            return
+        if self._load_failed_at is not None and time.monotonic() - self._load_failed_at < self.ttl:
+            return
+        self._refresh_in_background()
+
+    def get(self):
+        """Returns the cached work items (see ensure_loaded)."""
+        self.ensure_loaded()
+        with self._lock:
+            return list(self._items.values())
+
+    def refresh(self, full=False):
+        """Synchronously brings the cache up to date (delta sync unless full=True)."""
+        with self._refresh_lock:
+            self._refresh(full)
+
+    def _refresh(self, full=False):
+        if self.snapshot is not None and not self._snapshot_checked and not full:
+            self._load_snapshot()
+        if self.store is not None:
+            self._refresh_shared(full)
+        else:
+            self._refresh_local(full)
+        if self.snapshot is not None and self._dirty:
+            self._save_in_background()
+
+    def _refresh_local(self, full=False):
+        now = time.monotonic()
+        if full or self.watermark is None or now - self.full_synced_at >= self.full_sync:
+            items = [as_work_item(item) for item in self._load_all()]
+            with self._lock:
+                self._replace(items)
+                self.watermark = _latest_change(items)
+            self.full_synced_at = self.synced_at = now
+        elif now - self.synced_at >= self.sync_interval:
+            changed = [as_work_item(item) for item in self._load_changed(self.watermark)]
+            with self._lock:
+                for item in changed:
+                    self._put(item)
+                self.watermark = _latest_change(changed, self.watermark)
+            self.synced_at = now
+        self.refreshed_at = now
+
+    def _refresh_shared(self, full=False):
+        now = time.monotonic()
+        store = self.store
+        while True:
+            state = store.state()
+            if not full and _fresh(state, self.sync_interval):
+                break
+            if store.acquire_lease():
+                try:
+                    state = store.state()
+                    if full or not _fresh(state, self.sync_interval):
+                        self._fetch_into_store(state, full)
+                finally:
+                    store.release_lease()
+                break
+            if self.refreshed_at is not None:
+                # Another worker is refreshing; keep the current snapshot until the next stale get()
+                break
+            # Cold start: wait for the worker that is loading the backlog (or for its lease to expire)
+            store.wait_for(state.version, store.lease_timeout)
+        state = self._pull()
+        # Age the local copy like the snapshot, so workers revalidate when it goes stale, not later
+        self.refreshed_at = now - (time.time() - state.refreshed_at) if _fresh(state, self.ttl) else now
+
+    def _fetch_into_store(self, state, full):
+        if full or state.watermark is None or time.time() - (state.full_synced_at or 0) >= self.full_sync:
+            items = [as_work_item(item) for item in self._load_all()]
+            self.store.publish(items, _latest_change(items), full=True)
+        else:
+            changed = [as_work_item(item) for item in self._load_changed(state.watermark)]
+            self.store.publish(changed, _latest_change(changed, state.watermark))
+
+    def _pull(self):
+        """Applies what was published to the store since self.version; returns the store's state."""
+        state, full, items, deleted = self.store.changes_since(self.version)
+        with self._lock:
+            if full:
+                self._replace(items)
+            else:
+                for item in items:
+                    self._put(item)
+                for work_item_id in deleted:
+                    self._remove(work_item_id)
+            self.version = state.version
+            self.watermark = state.watermark
+        return state
+
+    def _refresh_in_background(self):
+        if self._background and self._background.is_alive():
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._refresh()
+            except Exception as exc:
+                telemetry.count_error("work_items", exc)
+                if self.refreshed_at is None:
+                    # A failed first load: the next ensure_loaded() tries again itself
+                    self._load_failed_at = time.monotonic()
+                else:
+                    # Keep serving the old snapshot; the next stale get() retries.
+                    self.refreshed_at = time.monotonic()
+            finally:
+                self._refresh_lock.release()
+
+        self._background = threading.Thread(target=run, name="work-item-cache-refresh", daemon=True)
+        self._background.start()
+
+    def _load_snapshot(self):
+        """Starts from the on-disk snapshot, if there is a usable one; returns whether it was loaded."""
+        self._snapshot_checked = True
+        try:
+            with telemetry.span("backlog_snapshot load"):
+                snapshot = self.snapshot.load()
+        except Exception as exc:
+            # Corrupt or outdated: rebuilt from Azure DevOps and overwritten by the next save
+            telemetry.count_cache("backlog_snapshot", "invalid")
+            telemetry.count_error("backlog_snapshot", exc)
+            return False
+        # A store with an older version than the snapshot's was recreated since
+        if snapshot is None or self.store is not None and self.store.state().version < snapshot.version:
+            telemetry.count_cache("backlog_snapshot", "miss")
+            return False
+        telemetry.count_cache("backlog_snapshot", "hit")
+        now = time.monotonic()
+        with self._lock:
+            self._replace(snapshot.items)
+            self.watermark = snapshot.watermark
+            self.version = snapshot.version
+            self._dirty = False
+        # Catch up on changes right away; an overdue full reload waits for the first background revalidation
+        full_sync_age = time.time() - (snapshot.full_synced_at or 0)
+        self.full_synced_at = max(now - full_sync_age, now - self.full_sync + self.ttl)
+        self.synced_at = now - self.sync_interval
+        return True
+
+    def _save_in_background(self):
+        if self._saving and self._saving.is_alive():
+            return
+
+        def run():
+            with self._lock:
+                items = list(self._items.values())
+                watermark, version, self._dirty = self.watermark, self.version, False
+            full_synced_at = (time.time() - (time.monotonic() - self.full_synced_at)
+                              if self.full_synced_at is not None else None)
+            try:
+                self.snapshot.save(items, watermark, full_synced_at, version)
+            except Exception as exc:
+                self._dirty = True
+                telemetry.count_error("backlog_snapshot", exc)
+
+        self._saving = threading.Thread(target=run, name="backlog-snapshot-save", daemon=True)
+        self._saving.start()
+
+    def _replace(self, items):
+        self._dirty = True
+        self._items = {item.id: item for item in items}
+        self._deleted = {}
+        for index in self.indexes:
+            index.rebuild(self._items.values())
+
+    def _put(self, item):
+        current = self._items.get(item.id)
+        if current is not None and current.rev > item.rev or self._deleted.get(item.id, -1) >= item.rev:
+            return
+        self._dirty = True
+        self._items[item.id] = item
+        for index in self.indexes:
+            index.add(item)
+
+    def upsert(self, item):
+        """
+        Stores a work item returned by a write call.
+        The watermark is left alone so changes made by others since the last
+        sync are still picked up by the next delta refresh.
+        """
+        if not item or isinstance(item, dict) and "id" not in item:
+            return
+        item = as_work_item(item)
+        with self._lock:
+            self._put(item)
+        if self.store is not None:
+            self.store.put(item)
+
+    def _remove(self, work_item_id):
+        if self._items.pop(int(work_item_id), None) is not None:
+            self._dirty = True
+        for index in self.indexes:
+            index.remove(work_item_id)
+
+    def remove(self, work_item_id):
+        with self._lock:
+            self._remove(work_item_id)
+        if self.store is not None:
+            self.store.put(deleted_id=work_item_id)
+
+    def apply(self, item, deleted=False, restored=False):
+        """
+        Applies a change pushed by Azure DevOps: the work item at the event's
+        revision (for a deletion, the last revision before it). Returns False
+        when the cache already holds that or a newer revision, so duplicate
+        and out-of-order events are no-ops.
+        """
+        item = as_work_item(item)
+        with self._lock:
+            if restored and self._deleted.get(item.id, -1) <= item.rev:
+                self._deleted.pop(item.id, None)
+            current = self._items.get(item.id)
+            # A deletion carries the revision the cache holds
+            newer = current is not None and (current.rev > item.rev if deleted else current.rev >= item.rev)
+            if newer or self._deleted.get(item.id, -1) >= item.rev:
+                return False
+            if deleted:
+                self._deleted[item.id] = item.rev
+                self._remove(item.id)
+            else:
+                self._put(item)
+        if self.store is not None:
+            if deleted:
+                self.store.put(deleted_id=item.id, rev=item.rev)
+            else:
+                self.store.put(item)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._items = {}
+            for index in self.indexes:
+                index.rebuild([])
+            self._deleted = {}
+            self.watermark = None
+            self.refreshed_at = None
+            self.synced_at = None
+            self.full_synced_at = None
+            self.version = 0